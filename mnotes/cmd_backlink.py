@@ -1,9 +1,14 @@
+import os
+import sys
 import time
+from functools import partial
 from hashlib import md5
 
 import click
-from typing import List, Dict, Optional
-from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from typing import List, Optional
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line, save_global_index_data
+from mnotes.notes.markdown_notes import NoteInfo, LinkKind, mnote_section_fingerprint
+from mnotes.utility.writer import ParallelWriter, WriteResult
 
 
 @click.group(invoke_without_command=True, name="backlink")
@@ -21,49 +26,96 @@ def main(env: MnoteEnvironment, ctx: click.core.Context):
     echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
 
 
+def _backlink_section(env: MnoteEnvironment, note: NoteInfo, context: bool = False) -> str:
+    links: List[str] = env.global_index.backlinks_of(note.id)
+    if not links:
+        return "\nNo links to this file found in any of the indices.\n"
+
+    link_lines = [""]
+    for id_ in links:
+        linked_from = env.global_index.by_id[id_]
+        link_lines.append(f" * [[{linked_from.id}]] {linked_from.title}")
+        if context:
+            for link in linked_from.links or []:
+                if link.kind == LinkKind.ID and link.target == note.id and link.context:
+                    link_lines.append(f"    * {link.context}")
+    link_lines.append("")
+    return "\n".join(link_lines)
+
+
+def _render_backlinks(env: MnoteEnvironment, note: NoteInfo, section_text: str) -> Optional[str]:
+    """ The text of the note with the new backlink section, or None if the section is already up to date """
+    note_with_content = env.note_builder.load_note(note.file_path)
+    check_sum = md5(note_with_content.content.strip().encode()).hexdigest()
+    note_with_content.set_mnote_section(section_text)
+    updated = md5(note_with_content.content.strip().encode()).hexdigest()
+    return None if check_sum == updated else note_with_content.to_file_text()
+
+
 @main.command(name="gen")
+@click.option("--check", is_flag=True, help="Verify the backlink index against a full rebuild before generating")
+@click.option("--context", is_flag=True, help="Show the sentence around each link under the note it's from")
+@click.option("-j", "--jobs", type=int, default=None, help="Number of threads writing notes [default: CPUs + 4]")
 @pass_env
-def gen_backlinks(env: MnoteEnvironment):
+def gen_backlinks(env: MnoteEnvironment, check: bool, context: bool, jobs: Optional[int]):
+    """
+    Write the list of notes which link to each note into the generated section at the bottom of every note which has
+    backlinks turned on (see 'mnote backlink set').
+
+    The backlinks are looked up in the reverse link index which is kept in the index cache, and the new section is
+    compared with the fingerprint of the section each note had when it was last indexed, so only the notes whose
+    backlinks have changed are read and written. Use --check to first compare the index against a full rebuild from
+    the links of every note. With --context, the sentence around each link is listed under the note it comes from,
+    which is also taken from the index cache.
+
+    The notes which changed are rendered and written on a pool of threads. Each one is written to a temporary file next
+    to it which is flushed to disk and then renamed over the note, so an interruption never leaves a note half written.
+    """
     style = env.config.styles
     start = time.time()
-    back_links = env.global_index.backlinks()
+    if check:
+        mismatched = env.global_index.check_backlinks()
+        if mismatched:
+            echo_line(style.warning(f"The backlink index is inconsistent for {len(mismatched)} IDs, rebuilding it"))
+            for index in env.global_index.indices.values():
+                index.rebuild_links()
+            save_global_index_data(env.global_index)
+        else:
+            echo_line(style.success(" * backlink index is consistent"))
     bl_gen = time.time() - start
 
     echo_line()
     start = time.time()
-    changes = 0
+    write_jobs = []
     for note in filter(lambda n: n.has_backlink, env.global_index.by_id.values()):
-        note_with_content = env.note_builder.load_note(note.file_path)
-        check = md5(note_with_content.content.strip().encode()).hexdigest()
-
-        links: Optional[List[str]] = back_links.get(note.id, None)
-        if not links:
-            note_with_content.set_mnote_section("\nNo links to this file found in any of the indices.\n")
-        else:
-            link_lines = [""]
-            for id_ in links:
-                linked_from = env.global_index.by_id[id_]
-                link_lines.append(f" * [[{linked_from.id}]] {linked_from.title}")
-            link_lines.append("")
-
-            note_with_content.set_mnote_section("\n".join(link_lines))
+        section_text = _backlink_section(env, note, context)
+        if note.mnote_section == mnote_section_fingerprint(section_text):
+            continue
+        write_jobs.append((note.file_path, partial(_render_backlinks, env, note, section_text)))
 
-        updated = md5(note_with_content.content.strip().encode()).hexdigest()
+    result = WriteResult()
+    if write_jobs:
+        with click.progressbar(length=len(write_jobs), label="Writing backlinks", file=sys.stderr) as bar:
+            last = [0]
 
-        if check == updated:
-            continue
+            def progress(done: int, total: int):
+                bar.update(done - last[0])
+                last[0] = done
 
-        echo_line(f"Updating {note.file_name}")
-        changes += 1
+            result = ParallelWriter(env.provider, jobs, on_progress=progress).write(write_jobs)
 
-        with env.provider.write_file(note.file_path) as handle:
-            handle.write(note_with_content.to_file_text())
+    for path in sorted(result.written):
+        echo_line(f"Updated {os.path.basename(path)}")
+    for path, error in sorted(result.failed, key=lambda f: f[0]):
+        echo_line(style.fail(f"Failed to write {path}: {error}"))
 
     mod_time = time.time() - start
 
     echo_line()
-    echo_line("Backlink generation took ", style.success(f"{bl_gen:0.2f} seconds"))
-    echo_line("Modified ", style.visible(f"{changes}"), " files in ", style.success(f"{mod_time:0.2f} seconds"))
+    if check:
+        echo_line("Backlink check took ", style.success(f"{bl_gen:0.2f} seconds"))
+    echo_line("Read ", style.visible(f"{len(write_jobs)}"), " notes whose backlinks changed and modified ",
+              style.visible(f"{len(result.written)}"), " files in ", style.success(f"{mod_time:0.2f} seconds"))
 
 
 @main.command(name="set")
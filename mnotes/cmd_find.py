@@ -0,0 +1,45 @@
+"""
+    Commands for finding notes by their titles
+"""
+import time
+from typing import List
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+
+
+@click.command(name="find")
+@click.option("-n", default=10, show_default=True, help="Maximum number of results to display")
+@click.argument("query", type=str, nargs=-1, required=True)
+@pass_env
+def main(env: MnoteEnvironment, n: int, query: List[str]):
+    """
+    Find notes in the global directory by their titles
+
+    Ranks the notes by how similar their titles are to the query, ignoring case and word order and tolerating small
+    misspellings, e.g. mnote find budget meeting q3. The titles are taken from the index cache, so no note files are
+    read.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    start_time = time.time()
+    matches = env.global_index.titles.find(" ".join(query), n)
+    end_time = time.time()
+
+    echo_line()
+    if not matches:
+        echo_line(style.warning("No note titles matched"))
+    else:
+        echo_line(click.style(f"Title Matches ({len(matches)})", bold=True, underline=True))
+        for match in matches:
+            note = env.global_index.get_note_info(match.path)
+            id_ = note.id if note.id else "(no id)"
+            echo_line(f" * {match.score:0.2f} ", style.visible(id_), f" {match.title} ({note.rel_path(env.cwd)})")
+
+    echo_line()
+    echo_line(style.success(f"Lookup took {(end_time - start_time) * 1000:0.1f} ms"))
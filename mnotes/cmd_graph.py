@@ -0,0 +1,134 @@
+"""
+    Commands for analyzing the graph of links between notes
+"""
+import os
+import time
+from typing import List, Optional
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from mnotes.notes.export import GRAPH_FORMATS, export_graph
+from mnotes.notes.markdown_notes import NoteInfo
+
+
+@click.group(name="graph", invoke_without_command=True)
+@click.option("-n", default=10, show_default=True, help="Number of notes to display in each ranking")
+@click.pass_context
+@pass_env
+def main(env: MnoteEnvironment, ctx: click.core.Context, n: int):
+    """
+    Analyze the graph of ID links between notes
+
+    Builds the graph of links between all of the notes in the global directory which have a valid ID, and reports the
+    orphan notes (with no links in or out), the hubs with the most links, the connected components, and the notes with
+    the highest PageRank. The links are taken from the index cache, so no note files are read.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    if ctx.invoked_subcommand is not None:
+        return
+
+    start_time = time.time()
+    graph = env.global_index.graph
+    end_time = time.time()
+    echo_line(" * built link graph of ", style.visible(f"{graph.node_count}"), " notes and ",
+              style.visible(f"{graph.edge_count}"), f" links, took {end_time - start_time:0.2f} seconds")
+    if graph.dangling:
+        echo_line(" * links to unknown IDs: ", style.warning(f"{graph.dangling}"))
+
+    start_time = time.time()
+
+    orphans = graph.orphans()
+    echo_line()
+    echo_line(click.style(f"Orphan Notes ({len(orphans)})", bold=True, underline=True))
+    for id_ in orphans[:n]:
+        _echo_note(env, env.global_index.by_id[id_])
+    if len(orphans) > n:
+        echo_line(style.visible(f" ... and {len(orphans) - n} more"))
+
+    echo_line()
+    echo_line(click.style("Hubs", bold=True, underline=True))
+    for id_, in_degree, out_degree in graph.hubs(n):
+        _echo_note(env, env.global_index.by_id[id_], f"{in_degree} in, {out_degree} out")
+
+    components = graph.components()
+    echo_line()
+    echo_line(click.style(f"Connected Components ({len(components)})", bold=True, underline=True))
+    for i, component in enumerate(components[:n]):
+        if len(component) == 1:
+            break
+        echo_line(f" * component {i + 1}: ", style.visible(f"{len(component)}"), " notes")
+    echo_line(" * single notes: ", style.visible(f"{sum(1 for c in components if len(c) == 1)}"))
+
+    ranks = graph.pagerank()
+    echo_line()
+    echo_line(click.style("PageRank", bold=True, underline=True))
+    for id_ in sorted(ranks.keys(), key=lambda x: (-ranks[x], x))[:n]:
+        _echo_note(env, env.global_index.by_id[id_], f"{ranks[id_]:0.4f}")
+
+    end_time = time.time()
+    echo_line()
+    echo_line(style.success(f"Analysis took {end_time - start_time:0.2f} seconds"))
+
+
+@main.command(name="export")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("-f", "--format", "format_", type=click.Choice(sorted(GRAPH_FORMATS.keys())), default=None,
+              help="File format, taken from the extension of OUTPUT if not given")
+@click.option("-i", "--index", "index_names", multiple=True, help="Only export notes in this index (repeatable)")
+@click.option("-p", "--path", "path", default=None, type=click.Path(), help="Only export notes in or below this path")
+@pass_env
+def export(env: MnoteEnvironment, output: str, format_: Optional[str], index_names: List[str], path: Optional[str]):
+    """
+    Export the link graph to a file for visualization tools
+
+    Writes every note with a valid ID as a node, with its title, index and creation time, and the links between them
+    as directed edges, to OUTPUT in GraphML (.graphml), GEXF (.gexf) or JSON lines (.jsonl) format. Links to notes
+    which aren't exported are left out. The file is written as the notes are visited, so large graphs don't need to
+    fit in memory.
+    """
+    style = env.config.styles
+    master = env.global_index
+
+    if format_ is None:
+        format_ = os.path.splitext(output)[1].lstrip(".").lower()
+        if format_ not in GRAPH_FORMATS:
+            echo_line(style.fail(f"Can't tell the format from the file name '{output}', use --format to set it"))
+            return
+
+    unknown = [name for name in index_names if name not in master.indices]
+    if unknown:
+        echo_line(style.fail(f"Unknown index: {', '.join(unknown)}"))
+        return
+
+    indices = [master.indices[name] for name in index_names] if index_names else list(master.indices.values())
+    index_of = {}
+    for index in indices:
+        index_of.update({p: index.name for p in index.notes.keys()})
+
+    def notes():
+        for index in indices:
+            for note in (index.notes_in_path(path) if path else index.notes.values()):
+                if note.id is not None and master.by_id.get(note.id, None) is note:
+                    yield note
+
+    start_time = time.time()
+    with open(output, "w", encoding="utf-8") as handle:
+        node_count, edge_count = export_graph(notes, lambda n: index_of[n.file_path], GRAPH_FORMATS[format_](handle))
+    end_time = time.time()
+
+    echo_line(" * wrote ", style.visible(f"{node_count}"), " notes and ", style.visible(f"{edge_count}"),
+              f" links to {output}")
+    echo_line(style.success(f"Export took {end_time - start_time:0.2f} seconds"))
+
+
+def _echo_note(env: MnoteEnvironment, note: NoteInfo, detail: str = None):
+    style = env.config.styles
+    title = note.title if note.title else note.file_name
+    prefix = f" * {detail}: " if detail else " * "
+    echo_line(prefix, style.visible(note.id), f" {title} ({note.rel_path(env.cwd)})")
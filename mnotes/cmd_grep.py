@@ -0,0 +1,81 @@
+"""
+    Commands for substring and regular expression search of the notes in the global directory
+"""
+import re
+import time
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line, attach_content_indices, sync_content_indices
+from mnotes.notes.markdown_notes import body_lines
+from mnotes.notes.search import TrigramIndex
+
+TRIGRAM_KIND = "trigram"
+
+
+@click.command(name="grep")
+@click.option("-i", "--ignore-case", is_flag=True, help="Match without regard to case")
+@click.option("-F", "--fixed-strings", is_flag=True, help="Treat the pattern as a plain string, not a regex")
+@click.option("-l", "--files-with-matches", "files_only", is_flag=True, help="Only list the notes which match")
+@click.argument("pattern", type=str)
+@pass_env
+def main(env: MnoteEnvironment, ignore_case: bool, fixed_strings: bool, files_only: bool, pattern: str):
+    """
+    Search the text of the notes for a regular expression
+
+    Prints every line in the body of a note (not the front matter) which contains a match for the Python regular
+    expression PATTERN. Use -F to search for a plain string, such as a part number or a code snippet, without having to
+    escape it.
+
+    A trigram index which is stored next to the index cache is used to narrow the search down to the notes which could
+    contain a match, so that only those notes are read. The index is updated only for notes which have changed, and the
+    first search on an index will build it, which requires reading every note once.
+    """
+    style = env.config.styles
+
+    if fixed_strings:
+        pattern = re.escape(pattern)
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        echo_line(style.fail(f"Invalid regular expression: {e}"))
+        return
+
+    start_time = time.time()
+    loaded = attach_content_indices(env.global_index, TRIGRAM_KIND, TrigramIndex.deserialize, TrigramIndex)
+    env.global_index.load_all()
+    synced = sync_content_indices(env.global_index, TRIGRAM_KIND, loaded)
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+    if synced:
+        echo_line(" * re-indexed text of ", style.visible(f"{synced}"), " notes")
+    echo_line()
+
+    start_time = time.time()
+    total = 0
+    candidates = 0
+    matched = 0
+    for trigrams in loaded.values():
+        total += trigrams.doc_count
+        paths = trigrams.candidate_paths(compiled.pattern, compiled.flags)
+        candidates += len(paths)
+
+        for path in paths:
+            note = env.global_index.get_note_info(path)
+            with env.provider.read_file(path) as handle:
+                content = handle.read()
+
+            lines = [(n, line) for n, line in body_lines(content) if compiled.search(line)]
+            if not lines:
+                continue
+
+            matched += 1
+            if files_only:
+                echo_line(style.visible(note.rel_path(env.cwd)))
+                continue
+            for n, line in lines:
+                echo_line(style.visible(note.rel_path(env.cwd)), f":{n}: {line.strip()}")
+
+    end_time = time.time()
+    echo_line()
+    echo_line(" * matched ", style.visible(f"{matched}"), f" notes, read {candidates} of {total} notes")
+    echo_line(style.success(f"Search took {(end_time - start_time) * 1000:0.1f} ms"))
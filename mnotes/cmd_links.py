@@ -0,0 +1,102 @@
+"""
+    Commands for checking and listing the ID links between notes
+"""
+import sys
+import time
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+
+
+@click.group(name="links")
+@pass_env
+def main(env: MnoteEnvironment):
+    """ Check and list the ID links between notes """
+    pass
+
+
+@main.command(name="check")
+@pass_env
+def check(env: MnoteEnvironment):
+    """
+    Report every broken link in the global directory
+
+    A link is broken if no note has the ID it refers to, or ambiguous if the ID belongs to more than one note, which
+    can be resolved with 'mnote fix id'. The links are taken from the index cache, so no note files are read. The
+    command exits with a non-zero status if any broken or ambiguous links are found, so it can be used as a check in
+    scripts.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    broken = env.global_index.broken_links()
+    if not broken:
+        echo_line(style.success(" * no broken links found"))
+        return
+
+    echo_line()
+    current = None
+    for link in broken:
+        if link.source is not current:
+            current = link.source
+            title = current.title if current.title else current.file_name
+            echo_line(style.visible(current.rel_path(env.cwd)), f" ({title})")
+        if link.ambiguous:
+            count = len(env.global_index.conflicts[link.target])
+            echo_line("  -> ", style.warning(f"[[{link.target}]]"), f" is ambiguous, {count} notes have this ID")
+        else:
+            echo_line("  -> ", style.fail(f"[[{link.target}]]"), " does not match any note")
+
+    missing = sum(1 for link in broken if not link.ambiguous)
+    echo_line()
+    echo_line(style.fail(f"Found {missing} missing and {len(broken) - missing} ambiguous links in "
+                         f"{len({link.source.file_path for link in broken})} notes"))
+    sys.exit(1)
+
+
+@main.command(name="to")
+@click.argument("id_", metavar="ID", type=str)
+@pass_env
+def links_to(env: MnoteEnvironment, id_: str):
+    """
+    List every link to a note ID with the sentence around it
+
+    The links are listed by the note they're in, with the text around each link taken from the index cache, so no note
+    files are read.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    echo_line()
+    target = env.global_index.by_id.get(id_, None)
+    if target is not None:
+        title = target.title if target.title else target.file_name
+        echo_line(click.style(f"Links to {id_} ({title})", bold=True, underline=True))
+    elif id_ in env.global_index.conflicts:
+        echo_line(style.warning(f"The ID {id_} is ambiguous, {len(env.global_index.conflicts[id_])} notes have it"))
+    else:
+        echo_line(style.warning(f"The ID {id_} does not match any note"))
+
+    incoming = env.global_index.incoming_links(id_)
+    if not incoming:
+        echo_line(style.warning("No notes link to this ID"))
+        return
+
+    current = None
+    for note, link in incoming:
+        if note is not current:
+            current = note
+            title = note.title if note.title else note.file_name
+            echo_line(style.visible(note.rel_path(env.cwd)), f" ({title})")
+        echo_line(f"  {link.offset:>7}: {link.context}")
+
+    echo_line()
+    echo_line(f"Found {len(incoming)} links in {len({note.file_path for note, _ in incoming})} notes")
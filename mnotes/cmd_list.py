@@ -0,0 +1,60 @@
+"""
+    Commands for listing notes in the order they were created
+"""
+import time
+from datetime import datetime as DateTime
+from itertools import islice
+from typing import Optional
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from mnotes.notes.query import DATE_FORMATS as QUERY_DATE_FORMATS
+
+DATE_FORMATS = [fmt for fmt, _ in QUERY_DATE_FORMATS]
+
+
+@click.command(name="list")
+@click.option("--since", type=click.DateTime(DATE_FORMATS), default=None, help="List notes created at or after this")
+@click.option("--until", type=click.DateTime(DATE_FORMATS), default=None, help="List notes created before this")
+@click.option("-n", default=20, show_default=True, help="Number of notes to display on each page")
+@click.option("-p", "--page", default=1, show_default=True, help="Page of results to display")
+@pass_env
+def main(env: MnoteEnvironment, since: Optional[DateTime], until: Optional[DateTime], n: int, page: int):
+    """
+    List the notes in the global directory in the order they were created
+
+    Dates are in local time, as YYYY-MM-DD with an optional HH:MM or HH:MM:SS, and the range includes notes created at
+    the --since time but not at the --until time, so '--since 2021-03-01 --until 2021-04-01' lists the notes created in
+    March of 2021. The results are split into pages of -n notes, use --page to move through them.
+
+    The creation times are kept in a sorted index in the index cache, so no note files are read and only the notes on
+    the requested page are visited.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+    echo_line()
+
+    since = since.replace(tzinfo=env.local_tz) if since is not None else None
+    until = until.replace(tzinfo=env.local_tz) if until is not None else None
+    page = max(page, 1)
+
+    found = env.global_index.created_between(since, until)
+    notes = list(islice(found, (page - 1) * n, page * n + 1))
+    if not notes:
+        echo_line(style.warning("No notes were created in this range" if page == 1 else "No notes on this page"))
+        return
+
+    echo_line(click.style(f"Notes by Creation Time (page {page})", bold=True, underline=True))
+    for note in notes[:n]:
+        id_ = note.id if note.id else "(no id)"
+        title = note.title if note.title else note.file_name
+        echo_line(f" * {note.created.astimezone(env.local_tz):%Y-%m-%d %H:%M:%S} ", style.visible(id_),
+                  f" {title} ({note.rel_path(env.cwd)})")
+
+    if len(notes) > n:
+        echo_line()
+        echo_line(style.visible(f" (more notes on page {page + 1}, use --page {page + 1})"))
@@ -0,0 +1,81 @@
+"""
+    Commands for filtering notes by their metadata with a query expression
+"""
+import time
+from typing import List
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from mnotes.notes.query import CompiledQuery, QueryError
+
+
+@click.command(name="query")
+@click.option("-n", default=50, show_default=True, help="Maximum number of notes to display")
+@click.option("--explain", is_flag=True, help="Show how the query was parsed and which index was used")
+@click.argument("expression", type=str, nargs=-1, required=True)
+@pass_env
+def main(env: MnoteEnvironment, n: int, explain: bool, expression: List[str]):
+    """
+    Find notes in the global directory by their metadata
+
+    The query is made of conditions written as field:value, which must all match. They can be combined with 'or',
+    'not' and parentheses, and values with spaces are wrapped in double quotes. For example, to find the notes by an
+    author in the 'work' index which have backlinks turned on but no title:
+
+    mnote query 'author:"Eva Evanston" index:work backlink:true title:none'
+
+    \b
+    The fields are:
+     * author, title: contains the text, ignoring case
+     * id, links: has the ID, or links to the ID
+     * index: is in the named index
+     * path: is in or below the directory
+     * tag: carries the tag
+     * state: has the ID state ok, no_id or conflict
+     * backlink: has backlinks turned on (true) or not (false)
+     * created: created on the date, or with >, >=, < or <= before or after it
+
+    Use 'none' as the value to find notes where the field is missing, e.g. title:none. The query runs against the index
+    cache, so no note files are read.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    start_time = time.time()
+    try:
+        query = CompiledQuery(" ".join(expression), env.global_index, env.local_tz)
+    except QueryError as e:
+        echo_line(style.fail(f"Invalid query: {e}"))
+        return
+    notes, plan = query.run()
+    end_time = time.time()
+
+    if explain:
+        echo_line()
+        echo_line(click.style("Query Plan", bold=True, underline=True))
+        echo_line(" * parsed as: ", style.visible(str(query.tree)))
+        for access in sorted(plan.considered, key=lambda a: a.estimate):
+            marker = style.success("used") if access is plan.access else "skipped"
+            echo_line(f" * {marker}: {access.description} (estimated {access.estimate} notes)")
+        if plan.access is None:
+            echo_line(" * ", style.warning("no index applies"), ", scanning every note")
+        echo_line(" * checked ", style.visible(f"{plan.candidates}"), " notes against the full query")
+
+    echo_line()
+    if not notes:
+        echo_line(style.warning("No notes matched the query"))
+    else:
+        echo_line(click.style(f"Matching Notes ({len(notes)})", bold=True, underline=True))
+        for note in notes[:n]:
+            id_ = note.id if note.id else "(no id)"
+            title = note.title if note.title else note.file_name
+            echo_line(" * ", style.visible(id_), f" {title} ({note.rel_path(env.cwd)})")
+        if len(notes) > n:
+            echo_line(style.visible(f" ... and {len(notes) - n} more"))
+
+    echo_line()
+    echo_line(style.success(f"Query took {(end_time - start_time) * 1000:0.1f} ms"))
@@ -0,0 +1,57 @@
+"""
+    Commands for full text search of the notes in the global directory
+"""
+import time
+from typing import List
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line, attach_content_indices, sync_content_indices
+from mnotes.notes.search import SearchIndex, search_indices
+
+SEARCH_KIND = "search"
+
+
+@click.command(name="search")
+@click.option("-n", default=20, show_default=True, help="Maximum number of results to display")
+@click.option("--any", "match_any", is_flag=True, help="Match notes which contain any of the terms, not all of them")
+@click.argument("query", type=str, nargs=-1, required=True)
+@pass_env
+def main(env: MnoteEnvironment, n: int, match_any: bool, query: List[str]):
+    """
+    Search the text of the notes in the global directory
+
+    Finds the notes containing all of the words in the query (or any of them with --any) and ranks them by relevance.
+    Wrap words in double quotes to search for them as a phrase, e.g. mnote search bearing '"part number"'. Matching
+    is not case sensitive.
+
+    The search uses a full text index which is stored next to the index cache and is updated only for the notes which
+    have changed, so no note files are read to answer the query. The first search on an index will build it, which
+    requires reading every note once.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    loaded = attach_content_indices(env.global_index, SEARCH_KIND, SearchIndex.deserialize, SearchIndex)
+    env.global_index.load_all()
+    synced = sync_content_indices(env.global_index, SEARCH_KIND, loaded)
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+    if synced:
+        echo_line(" * re-indexed text of ", style.visible(f"{synced}"), " notes")
+
+    start_time = time.time()
+    results = search_indices(list(loaded.values()), " ".join(query), n, not match_any)
+    end_time = time.time()
+
+    echo_line()
+    if not results:
+        echo_line(style.warning("No notes matched the search"))
+    else:
+        echo_line(click.style(f"Search Results ({len(results)})", bold=True, underline=True))
+        for rank, result in enumerate(results):
+            note = env.global_index.get_note_info(result.path)
+            title = note.title if note.title else note.file_name
+            echo_line(f" {rank + 1:>2}. ", style.visible(f"{result.score:0.2f}"), f" {title} ({note.rel_path(env.cwd)})")
+
+    echo_line()
+    echo_line(style.success(f"Search took {(end_time - start_time) * 1000:0.1f} ms"))
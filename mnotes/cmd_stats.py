@@ -0,0 +1,125 @@
+"""
+    Commands for reporting statistics about the corpus of notes from the cached index information
+"""
+import time
+from typing import List, Optional, Dict
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from mnotes.notes.markdown_notes import NoteInfo
+
+
+@click.command(name="stats")
+@click.option("-n", default=5, show_default=True, help="Number of the largest notes to display")
+@click.argument("names", type=str, nargs=-1)
+@pass_env
+def main(env: MnoteEnvironment, n: int, names: List[str]):
+    """
+    Report content statistics on the notes in the global directory
+
+    Statistics like word counts, file sizes, headings, and links are computed when the notes are indexed and are stored
+    in the index cache, so this command does not need to open any of the note files. Specify one or more index names to
+    restrict the report to those indices, or leave the names blank to report on the entire global directory.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+
+    failed = False
+    for name in names:
+        if name not in env.global_index.indices:
+            echo_line(style.fail(f"There is no index named '{name}'"))
+            failed = True
+    if failed:
+        return
+
+    if not names:
+        names = list(env.global_index.indices.keys())
+
+    start_time = time.time()
+    notes: List[NoteInfo] = []
+    for name in names:
+        index_notes = list(env.global_index.indices[name].notes.values())
+        notes += index_notes
+        echo_line(" * ", style.visible(name), f": {len(index_notes)} notes")
+
+    with_stats = [note for note in notes if note.stats is not None]
+    missing = len(notes) - len(with_stats)
+
+    echo_line()
+    echo_line(click.style("Corpus Statistics", bold=True, underline=True))
+    echo_line(" * notes: ", style.visible(f"{len(notes)}"))
+    if missing:
+        echo_line(" * notes without statistics: ", style.warning(f"{missing}"),
+                  style.visible(" (use 'mnote index reload' to rebuild them)"))
+
+    if not with_stats:
+        return
+
+    words = [note.stats.words for note in with_stats]
+    sizes = [note.stats.bytes for note in with_stats]
+    echo_line(" * total words: ", style.visible(f"{sum(words)}"))
+    echo_line(" * total size: ", style.visible(_format_bytes(sum(sizes))))
+
+    echo_line()
+    echo_line(click.style("Distributions", bold=True, underline=True))
+    _echo_distribution(env, "words per note", words)
+    _echo_distribution(env, "bytes per note", sizes)
+    _echo_distribution(env, "headings per note", [note.stats.headings for note in with_stats])
+    _echo_distribution(env, "ID links per note", [note.stats.id_links for note in with_stats])
+    _echo_distribution(env, "file links per note", [note.stats.file_links for note in with_stats])
+    _echo_distribution(env, "resource links per note", [note.stats.resource_links for note in with_stats])
+
+    echo_line()
+    echo_line(click.style("Structure", bold=True, underline=True))
+    levels: Dict[int, int] = {}
+    for note in with_stats:
+        for heading in note.headings or []:
+            levels[heading.level] = levels.get(heading.level, 0) + 1
+    for level in sorted(levels):
+        echo_line(f" * level {level} headings ({'#' * level}): ", style.visible(f"{levels[level]}"))
+    echo_line(" * notes without headings: ", style.visible(f"{sum(1 for note in with_stats if not note.headings)}"))
+    echo_line(" * notes without links: ", style.visible(f"{sum(1 for note in with_stats if not note.links)}"))
+    echo_line(" * notes with no words: ", style.visible(f"{sum(1 for w in words if w == 0)}"))
+
+    if n > 0:
+        echo_line()
+        echo_line(click.style(f"Largest {min(n, len(with_stats))} Notes by Word Count", bold=True, underline=True))
+        for note in sorted(with_stats, key=lambda x: x.stats.words, reverse=True)[:n]:
+            title = note.title if note.title else note.file_name
+            echo_line(" * ", style.visible(f"{note.stats.words}"), f" words: {title} ",
+                      f"({note.rel_path(env.cwd)})")
+
+    end_time = time.time()
+    echo_line()
+    echo_line(style.success(f"Took {end_time - start_time:0.2f} seconds"))
+
+
+def percentile(ordered: List[int], fraction: float) -> Optional[int]:
+    """ Nearest-rank percentile of an already sorted list of values, None if the list is empty """
+    if not ordered:
+        return None
+    rank = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+def _echo_distribution(env: MnoteEnvironment, label: str, values: List[int]):
+    style = env.config.styles
+    ordered = sorted(values)
+    mean = sum(ordered) / len(ordered)
+    parts = [f"min={ordered[0]}"]
+    for name, fraction in (("p25", 0.25), ("median", 0.5), ("p75", 0.75), ("p90", 0.9), ("p99", 0.99)):
+        parts.append(f"{name}={percentile(ordered, fraction)}")
+    parts.append(f"max={ordered[-1]}")
+    echo_line(f" * {label}: ", style.visible(f"mean={mean:0.1f}"), " ", ", ".join(parts))
+
+
+def _format_bytes(value: int) -> str:
+    for unit in ("bytes", "KB", "MB"):
+        if value < 1024:
+            return f"{value:0.0f} {unit}" if unit == "bytes" else f"{value:0.1f} {unit}"
+        value /= 1024
+    return f"{value:0.1f} GB"
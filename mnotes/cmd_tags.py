@@ -0,0 +1,52 @@
+"""
+    Commands for listing the tags on notes from the cached index information
+"""
+import time
+from typing import List
+
+import click
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+
+
+@click.command(name="tags")
+@click.argument("tags", type=str, nargs=-1)
+@pass_env
+def main(env: MnoteEnvironment, tags: List[str]):
+    """
+    List tags and the notes which carry them
+
+    Tags are read from the 'tags' list in the front matter of each note when it is indexed, and are stored in the index
+    cache, so this command does not need to open any of the note files. Leave the tags blank to list every tag with the
+    number of notes carrying it, or specify one or more tags to list the notes carrying each of them.
+    """
+    style = env.config.styles
+
+    start_time = time.time()
+    env.global_index.load_all()
+    end_time = time.time()
+    echo_line(style.success(f" * updated global directory, took {end_time - start_time:0.2f} seconds"))
+    echo_line()
+
+    if not tags:
+        counts = env.global_index.tag_counts()
+        if not counts:
+            echo_line(style.warning("There are no tagged notes in the global directory"))
+            return
+
+        echo_line(click.style(f"Tags ({len(counts)})", bold=True, underline=True))
+        for tag, count in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+            echo_line(" * ", style.visible(tag), f": {count} notes")
+        return
+
+    for tag in tags:
+        notes = env.global_index.notes_with_tag(tag)
+        if not notes:
+            echo_line(style.fail(f"There are no notes tagged '{tag}'"))
+            continue
+
+        echo_line(click.style(f"Notes tagged '{tag}' ({len(notes)})", bold=True, underline=True))
+        for note in sorted(notes, key=lambda x: x.file_path):
+            title = note.title if note.title else note.file_name
+            id_text = note.id if note.id is not None else "no id"
+            echo_line(" * ", style.visible(id_text), f": {title} ({note.rel_path(env.cwd)})")
+        echo_line()
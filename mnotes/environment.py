@@ -6,8 +6,8 @@ import yaml
 from dataclasses import dataclass
 from dateutil.tz import tzlocal
 from datetime import tzinfo
-from typing import Optional, Dict, Tuple, List
-from mnotes.notes.index import GlobalIndices, NoteIndex
+from typing import Optional, Dict, Tuple, List, Callable
+from mnotes.notes.index import GlobalIndices, NoteIndex, ContentIndex
 from mnotes.notes.markdown_notes import NoteBuilder
 from mnotes.utility.file_system import FileSystemProvider
 
@@ -117,24 +117,14 @@ class MnoteEnvironment:
     @property
     def index_of_cwd(self) -> Optional[NoteIndex]:
         """ Look at the current working directory and determine what index we're inside """
-        # TODO: can this be cached? it shouldn't change once the program starts
         return self.get_index_of_path(self.cwd)
 
     @property
     def indices_in_cwd(self) -> List[NoteIndex]:
-        contained = []
-        check_abs = os.path.abspath(self.cwd)
-        for index in self.global_index.indices.values():
-            if os.path.abspath(index.path).startswith(check_abs):
-                contained.append(index)
-        return contained
+        return self.global_index.indices_in_path(self.cwd)
 
     def get_index_of_path(self, path: str) -> Optional[NoteIndex]:
-        check_abs = os.path.abspath(path)
-        for index in self.global_index.indices.values():
-            if check_abs.startswith(os.path.abspath(index.path)):
-                return index
-        return None
+        return self.global_index.index_of_path(path)
 
 
 pass_env = click.make_pass_decorator(MnoteEnvironment, ensure=True)
@@ -193,6 +183,56 @@ def save_global_index_data(master: GlobalIndices):
             handle.write(index.serialize())
 
 
+def _content_index_file(name: str, kind: str) -> str:
+    return os.path.join(click.get_app_dir(APPLICATION_NAME), f"index-{name}.{kind}.json")
+
+
+def attach_content_indices(master: GlobalIndices, kind: str, deserialize: Callable[[str], ContentIndex],
+                           create: Callable[[], ContentIndex]) -> Dict[str, ContentIndex]:
+    """
+    Load the stored content indices of one kind (see ContentIndex) for every index in the global directory and attach
+    them to the cached indices before GlobalIndices.load_all is run, so that the update will feed them the notes which
+    it re-parses. An index without a stored content index (or with an unreadable one) gets a new, empty one.
+    """
+    loaded = {}
+    for name in master.index_directory.keys():
+        content = None
+        content_file = _content_index_file(name, kind)
+        if os.path.exists(content_file):
+            try:
+                with open(content_file, "r") as handle:
+                    content = deserialize(handle.read())
+            except ValueError:
+                content = None
+
+        loaded[name] = content if content is not None else create()
+        if name in master.cached:
+            master.cached[name].content[kind] = loaded[name]
+
+    return loaded
+
+
+def sync_content_indices(master: GlobalIndices, kind: str, loaded: Dict[str, ContentIndex]) -> int:
+    """
+    After GlobalIndices.load_all has run, bring the content indices from attach_content_indices up to date with any
+    changes they missed and save the ones which have changed. Returns the number of notes which had to be re-read.
+    """
+    count = 0
+    for name, content in loaded.items():
+        index = master.indices.get(name, None)
+        if index is None:
+            continue
+
+        index.content[kind] = content
+        count += master.index_builder.sync_content(index, content)
+        if content.is_dirty:
+            with open(_content_index_file(name, kind), "w") as handle:
+                handle.write(content.serialize())
+            content.is_dirty = False
+
+    return count
+
+
 def load_config():
     config_root = click.get_app_dir(APPLICATION_NAME)
     config_file = os.path.join(config_root, CONFIG_FILE)
@@ -7,11 +7,12 @@ from typing import List, Optional, Callable
 
 import click
 import sys
-from mnotes.environment import MnoteEnvironment, pass_env, echo_line
+from mnotes.environment import MnoteEnvironment, pass_env, echo_line, save_global_index_data
 
-from .common import CreationFixer, AuthorFixer, TitleFixer, FilenameFixer, IdFixer, Fixer
+from .common import CreationFixer, AuthorFixer, TitleFixer, FilenameFixer, IdFixer, Fixer, BatchResult, run_batch
 from ..notes.markdown_notes import NoteInfo
-from ..utility.change import ChangeTransaction
+from ..utility.change import ChangeTransaction, TryChangeResult
+from ..utility.journal import ApplyError
 
 
 @click.group(name="fix", invoke_without_command=True)
@@ -87,7 +88,7 @@ def fix_created(env: MnoteEnvironment, files: List, n: Optional[int]):
 @click.argument("files", nargs=-1, type=click.Path())
 @pass_env
 def fix_id(env: MnoteEnvironment, files: List[click.Path], n: Optional[int], resolve: bool):
-    fixer = IdFixer(env.note_builder, resolve, env.config.styles)
+    fixer = IdFixer(env.note_builder, resolve, env.config.styles, created_seconds=env.global_index.created_seconds)
     process_fixes(single_core(fixer, n, False, env), env, files)
 
 
@@ -129,18 +130,36 @@ def fix_title(env: MnoteEnvironment, files: List[click.Path], n: Optional[int]):
 @click.option("-n", default=None, type=int, help="Max number of fixes to perform")
 @click.option("--complete", "complete", flag_value=True,
               help="Completely rewrite the filename from the title information")
+@click.option("--batch", is_flag=True, help="Fix every note, printing a summary instead of each change")
+@click.option("-y", "--yes", is_flag=True, help="Apply the changes without asking for confirmation")
 @pass_env
-def fix_all(env: MnoteEnvironment, files: List, n: Optional[int], complete: bool):
+def fix_all(env: MnoteEnvironment, files: List, n: Optional[int], complete: bool, batch: bool, yes: bool):
     """ Equivalent to fixing created, id, title, filename, author in sequence.
 
     This is a highly automated command that performs a sequence of fixes. It's not safe to run on large batches of
     notes at a time so it will only allow up to 5 notes to be run at once.
 
+    For migrating a large collection of notes, --batch runs the whole pipeline over every note in the working set with
+    no limit. Instead of every change it prints its progress, each note a fixer failed on, and a summary of the changes
+    by fixer. Changes which would conflict with another change in the batch are skipped. Add --yes to apply all of the
+    changes without asking.
+
     The --complete flag will rewrite the filename the same as running `mnote fix filename --complete`
     """
     complete = complete or env.config.filename_complete
     style = env.config.styles
 
+    if batch:
+        pipeline = [
+            CreationFixer(env.note_builder, env.local_tz, env.config.styles),
+            IdFixer(env.note_builder, True, env.config.styles, created_seconds=env.global_index.created_seconds),
+            AuthorFixer(env.note_builder, env.config.author, env.config.styles),
+            TitleFixer(env.note_builder, env.config.styles),
+            FilenameFixer(env.note_builder, complete, env.config.styles)
+        ]
+        process_batch(pipeline, env, files, yes)
+        return
+
     if n is None or n > 5:
         echo_line()
         echo_line(style.warning("This command is limited to processing five notes at a time."))
@@ -149,7 +168,7 @@ def fix_all(env: MnoteEnvironment, files: List, n: Optional[int], complete: bool
     def core(working: List[NoteInfo], transaction: ChangeTransaction) -> int:
         pipeline = [
             CreationFixer(env.note_builder, env.local_tz, env.config.styles),
-            IdFixer(env.note_builder, True, env.config.styles),
+            IdFixer(env.note_builder, True, env.config.styles, created_seconds=env.global_index.created_seconds),
             AuthorFixer(env.note_builder, env.config.author, env.config.styles),
             TitleFixer(env.note_builder, env.config.styles),
             FilenameFixer(env.note_builder, complete, env.config.styles)
@@ -188,7 +207,7 @@ def fix_all(env: MnoteEnvironment, files: List, n: Optional[int], complete: bool
                 changes += 1
         return changes
 
-    process_fixes(core, env, files)
+    process_fixes(core, env, files, yes)
 
 
 def single_core(fixer: Fixer, n: Optional[int], override_check: bool, env: MnoteEnvironment) -> Callable[
@@ -223,7 +242,8 @@ def single_core(fixer: Fixer, n: Optional[int], override_check: bool, env: Mnote
     return curried
 
 
-def process_fixes(core: Callable[[List[NoteInfo], ChangeTransaction], int], env: MnoteEnvironment, files: List):
+def process_fixes(core: Callable[[List[NoteInfo], ChangeTransaction], int], env: MnoteEnvironment, files: List,
+                  yes: bool = False):
     style = env.config.styles
     # Index is guaranteed to have a value, as if it didn't we would have exited on the main command
     index = env.index_of_cwd
@@ -240,8 +260,76 @@ def process_fixes(core: Callable[[List[NoteInfo], ChangeTransaction], int], env:
         echo_line(click.style("There were no potential fixes found", bold=True))
         return
 
-    if click.confirm(click.style(f"Apply these {changes} changes?", bold=True)):
+    if yes or click.confirm(click.style(f"Apply these {changes} changes?", bold=True)):
         echo_line(style.success("User accepted changes"))
-        env.global_index.apply_transaction(transaction)
+        apply_changes(env, transaction)
     else:
         echo_line(style.fail("User rejected changes"))
+
+
+def process_batch(pipeline: List[Fixer], env: MnoteEnvironment, files: List, yes: bool):
+    style = env.config.styles
+    index = env.index_of_cwd
+    working = index.load_working(env.cwd, files)
+    if not working:
+        echo_line()
+        echo_line(style.warning("No files to work on after checking the current directory against the index."))
+        return
+
+    echo_line()
+    echo_line(click.style(f"Batch Fix of {len(working)} Notes", bold=True, underline=True))
+    start_time = time.time()
+
+    def failure(note: NoteInfo, fixer: Fixer, result: TryChangeResult):
+        reason = "".join(result.message[-1]).strip(" *") if result.message else ""
+        echo_line(" ! ", style.visible(note.rel_path(env.cwd)), f" is {fixer.description}: {reason}")
+
+    def progress(totals: BatchResult):
+        echo_line(f" * checked {totals.checked}/{len(working)} notes, {totals.changed} with changes")
+
+    transaction = env.global_index.create_empty_transaction()
+    result = run_batch(pipeline, working, transaction, failure, progress)
+    end_time = time.time()
+
+    echo_line()
+    echo_line(f"Checked {result.checked} notes in {end_time - start_time:0.2f} seconds")
+    for fixer in pipeline:
+        # Notes the fixer's check passed over are counted as already correct, so each line adds up to the notes checked
+        d = fixer.description
+        correct = result.unchanged[d] + result.skipped[d]
+        echo_line(f" * {d}: ", style.success(f"{result.fixed[d]} fixed"), ", ",
+                  style.fail(f"{result.failed[d]} failed") if result.failed[d] else "0 failed",
+                  f", {correct} already correct")
+
+    echo_line()
+    if result.changed == 0:
+        echo_line(click.style("There were no potential fixes found", bold=True))
+        return
+
+    if yes or click.confirm(click.style(f"Apply the changes to {result.changed} notes?", bold=True)):
+        start_time = time.time()
+        if apply_changes(env, transaction):
+            echo_line(style.success(f"Applied the changes to {result.changed} notes in "
+                                    f"{time.time() - start_time:0.2f} seconds"))
+    else:
+        echo_line(style.fail("User rejected changes"))
+
+
+def apply_changes(env: MnoteEnvironment, transaction: ChangeTransaction) -> bool:
+    """
+    Apply the transaction to the notes, reporting what went wrong and returning False if it was rolled back. The index
+    is updated with the changed notes as they're applied, so it's saved straight away for the next command to use.
+    """
+    style = env.config.styles
+    try:
+        env.global_index.apply_transaction(transaction)
+        save_global_index_data(env.global_index)
+        return True
+    except ApplyError as e:
+        echo_line(style.fail(f"Could not apply the changes: {e}"))
+        for path, error in e.failures[:10]:
+            echo_line(" ! ", style.visible(os.path.relpath(path, env.cwd) if path else "(no file)"), f": {error}")
+        for path, error in e.rollback_failures:
+            echo_line(" ! ", style.fail("not restored"), " ", style.visible(os.path.relpath(path, env.cwd)),
+                      f": {error}")
+        return False
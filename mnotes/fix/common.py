@@ -3,10 +3,11 @@ import re
 import click
 
 from mnotes.environment import Styles
-from mnotes.notes.markdown_notes import NoteInfo, LONG_STAMP_PATTERN, ID_TIME_FORMAT, NoteBuilder
+from mnotes.notes.markdown_notes import NoteInfo, LONG_STAMP_PATTERN, ID_TIME_FORMAT, NoteBuilder, MetaData
 from mnotes.notes.index import NoteIndex
-from typing import Optional, Tuple, List, Set, Callable
-from mnotes.utility.change import NoteChanger, ChangeTransaction, TryChangeResult
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, List, Set, Callable, Dict, Iterable
+from mnotes.utility.change import NoteChanger, ChangeTransaction, TryChangeResult, IdAllocator
 
 from datetime import datetime as DateTime
 from datetime import timedelta as TimeDelta
@@ -83,6 +84,10 @@ class AuthorFixer(Fixer):
         return note_info.author is None
 
     def try_change(self, original_path: str, transaction: ChangeTransaction) -> TryChangeResult:
+        if self.author is None:
+            return TryChangeResult.failed([[" * there is ", self.warn("no author to set"),
+                                            ", use 'mnote config author' to set a default"]])
+
         desc = [[" * will set author to ", self.vis(f"'{self.author}'")]]
         note_with_content = transaction.get_note_state(original_path)
         note_with_content.info.author = self.author
@@ -131,9 +136,14 @@ class CreationFixer(Fixer):
 
 
 class IdFixer(Fixer):
-    def __init__(self, builder: NoteBuilder, resolve: bool, style: Styles = None):
+    def __init__(self, builder: NoteBuilder, resolve: bool, style: Styles = None,
+                 created_seconds: Optional[Callable[[], Iterable[int]]] = None):
         super().__init__(builder, style)
         self.resolve = resolve
+        # Optional source of the creation times of every note as epoch seconds (see GlobalIndices.created_seconds).
+        # When it's given they're blocked in the transaction's ID allocator once, so a conflict isn't resolved onto the
+        # creation time of another note, and each one is still a single bisection.
+        self.created_seconds = created_seconds
         self.description = "missing an id"
         self.hint = "try the 'mnote fix id' command"
 
@@ -141,24 +151,38 @@ class IdFixer(Fixer):
         return note_info.id is None
 
     @staticmethod
-    def _suggest_conflict_fix(note: NoteInfo, check: Callable[[str], bool]) -> DateTime:
+    def _suggest_conflict_fix(note: NoteInfo, check: Callable[[str], bool],
+                              allocator: Optional[IdAllocator] = None) -> DateTime:
+        """
+        Find the nearest creation time at or after the note's whose ID is free. With an allocator of the taken IDs this
+        is a single bisection, otherwise the IDs are checked one second at a time.
+        """
+        if allocator is not None:
+            return allocator.next_free(note.created)
+
         proposed = note.created
         while check(proposed.strftime(ID_TIME_FORMAT)):
             proposed = proposed + TimeDelta(seconds=1)
-
         return proposed
 
     def try_change(self, original_path: str, transaction: ChangeTransaction) -> TryChangeResult:
         desc = []
         note = transaction.get_note_state(original_path)
+        if note.info.created is None:
+            return TryChangeResult.failed([[" * cannot create an ID because the note ",
+                                            self.warn("has no creation time"), ", try the 'mnote fix created' command"]])
+
         new_id = note.info.created.strftime(ID_TIME_FORMAT)
         if new_id in transaction.ids:
             desc.append([f" * cannot create ID {new_id} because it ", self.warn("conflicts with an ID"),
                          " already in the global directory or the transaction"])
 
             if self.resolve:
-                new_c_time = self._suggest_conflict_fix(note.info, lambda id_: id_ in transaction.ids)
-                offset = abs((new_c_time - note.info.created).seconds)
+                allocator = transaction.ids.allocator
+                if self.created_seconds is not None:
+                    allocator.block_created(self.created_seconds, note.info.created.tzinfo)
+                new_c_time = self._suggest_conflict_fix(note.info, lambda id_: id_ in transaction.ids, allocator)
+                offset = int(abs((new_c_time - note.info.created).total_seconds()))
                 new_id = new_c_time.strftime(ID_TIME_FORMAT)
 
                 desc.append([f" * propose changing note creation time by ",
@@ -247,3 +271,73 @@ def complete_rewrite(note: NoteInfo) -> str:
     working = "-".join(enough_words)
 
     return f"{note.id}-{working}.md"
+
+
+@dataclass
+class BatchResult:
+    checked: int = 0  # Number of notes run through the pipeline
+    changed: int = 0  # Number of notes with at least one change added to the transaction
+    # Fixer descriptions mapped to the number of notes each one changed, failed on, or had nothing to do for, and the
+    # number of notes which its check passed over. The four add up to the number of notes checked.
+    fixed: Dict[str, int] = field(default_factory=dict)
+    failed: Dict[str, int] = field(default_factory=dict)
+    unchanged: Dict[str, int] = field(default_factory=dict)
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+
+def run_batch(pipeline: List[Fixer], notes: Iterable[NoteInfo], transaction: ChangeTransaction,
+              on_failure: Optional[Callable[[NoteInfo, Fixer, TryChangeResult], None]] = None,
+              on_progress: Optional[Callable[[BatchResult], None]] = None, progress_every: int = 1000) -> BatchResult:
+    """
+    Run every note through the pipeline of fixers without any interaction, adding the changes to the transaction. Each
+    fixer checks the state of the note in the transaction, so it sees the changes made by the fixers before it. A
+    change which would conflict with an ID or path already in the transaction is counted as a failure rather than
+    added. Failures are passed to on_failure as they happen, and on_progress is called with the running totals every
+    progress_every notes.
+    """
+    result = BatchResult()
+    for fixer in pipeline:
+        result.fixed[fixer.description] = 0
+        result.failed[fixer.description] = 0
+        result.unchanged[fixer.description] = 0
+        result.skipped[fixer.description] = 0
+
+    for note in notes:
+        has_change = False
+        unreadable = None
+        for fixer in pipeline:
+            if not fixer.check(transaction.get_note_info_state(note.file_path)):
+                result.skipped[fixer.description] += 1
+                continue
+
+            # The index doesn't keep whether the front matter failed to parse, so it's read from the note itself the
+            # first time a fixer wants to change it. Such a note can't be written back, so every fix to it fails here
+            # instead of failing the whole transaction when it's applied.
+            if unreadable is None:
+                unreadable = transaction.get_note_state(note.file_path).info.state == MetaData.FAILED
+            if unreadable:
+                change = TryChangeResult.failed([[" * the front matter ", fixer.warn("could not be parsed"),
+                                                  ", so the note can't be rewritten"]])
+            else:
+                change = fixer.try_change(note.file_path, transaction)
+            if change.is_ok and not transaction.verify(note.file_path, change.change):
+                change = TryChangeResult.failed([[" * the change ", fixer.warn("conflicts"),
+                                                  " with another change in the transaction"]])
+
+            if change.is_ok:
+                transaction.add_change(note.file_path, change.change)
+                result.fixed[fixer.description] += 1
+                has_change = True
+            elif change.is_failed:
+                result.failed[fixer.description] += 1
+                if on_failure is not None:
+                    on_failure(note, fixer, change)
+            else:
+                result.unchanged[fixer.description] += 1
+
+        result.checked += 1
+        result.changed += has_change
+        if on_progress is not None and result.checked % progress_every == 0:
+            on_progress(result)
+
+    return result
@@ -11,6 +11,15 @@ import mnotes.fix
 import mnotes.cmd_config
 import mnotes.cmd_index
 import mnotes.cmd_backlink
+import mnotes.cmd_stats
+import mnotes.cmd_tags
+import mnotes.cmd_search
+import mnotes.cmd_grep
+import mnotes.cmd_graph
+import mnotes.cmd_links
+import mnotes.cmd_find
+import mnotes.cmd_list
+import mnotes.cmd_query
 
 
 mnote_version = pkg_resources.require("m-notes")[0].version
@@ -62,5 +71,14 @@ main.add_command(mnotes.cmd_config.config)
 main.add_command(mnotes.fix.main)
 main.add_command(mnotes.cmd_index.main)
 main.add_command(mnotes.cmd_backlink.main)
+main.add_command(mnotes.cmd_stats.main)
+main.add_command(mnotes.cmd_tags.main)
+main.add_command(mnotes.cmd_search.main)
+main.add_command(mnotes.cmd_grep.main)
+main.add_command(mnotes.cmd_graph.main)
+main.add_command(mnotes.cmd_links.main)
+main.add_command(mnotes.cmd_find.main)
+main.add_command(mnotes.cmd_list.main)
+main.add_command(mnotes.cmd_query.main)
 
 
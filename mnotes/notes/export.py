@@ -0,0 +1,151 @@
+"""
+    Streaming export of the graph of ID links between notes to the file formats used by graph visualization tools
+"""
+import abc
+import json
+from typing import Iterable, TextIO, Callable, Set, Dict, Type, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from .markdown_notes import NoteInfo
+
+# Node attributes which are exported along with the ID of each note, in order
+NODE_ATTRIBUTES = ["title", "index", "created"]
+
+
+class GraphWriter(abc.ABC):
+    """
+    Base class for writing a graph to a text file one element at a time, so that nothing but the element being written
+    is held in memory. Writers are driven in a fixed order: start, every node, start_edges, every edge, and finish.
+    """
+
+    def __init__(self, handle: TextIO):
+        self.handle = handle
+        # Every edge repeats the IDs of two nodes, so the IDs are only quoted for the file format once
+        self._quoted: Dict[str, str] = {}
+
+    def quote(self, id_: str) -> str:
+        quoted = self._quoted.get(id_, None)
+        if quoted is None:
+            quoted = self._quote(id_)
+            self._quoted[id_] = quoted
+        return quoted
+
+    def _quote(self, id_: str) -> str:
+        return quoteattr(id_)
+
+    def start(self):
+        pass
+
+    @abc.abstractmethod
+    def node(self, id_: str, attributes: Dict[str, str]):
+        pass
+
+    def start_edges(self):
+        pass
+
+    @abc.abstractmethod
+    def edge(self, source: str, target: str):
+        pass
+
+    def finish(self):
+        pass
+
+
+class GraphMLWriter(GraphWriter):
+    def start(self):
+        self.handle.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for name in NODE_ATTRIBUTES:
+            self.handle.write(f'  <key id="{name}" for="node" attr.name="{name}" attr.type="string"/>\n')
+        self.handle.write('  <graph id="mnotes" edgedefault="directed">\n')
+
+    def node(self, id_: str, attributes: Dict[str, str]):
+        data = "".join(f'<data key="{k}">{escape(v)}</data>' for k, v in attributes.items() if v)
+        self.handle.write(f'    <node id={self.quote(id_)}>{data}</node>\n')
+
+    def edge(self, source: str, target: str):
+        self.handle.write(f'    <edge source={self.quote(source)} target={self.quote(target)}/>\n')
+
+    def finish(self):
+        self.handle.write('  </graph>\n</graphml>\n')
+
+
+class GEXFWriter(GraphWriter):
+    def __init__(self, handle: TextIO):
+        super().__init__(handle)
+        self.edge_count = 0
+
+    def start(self):
+        self.handle.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<gexf xmlns="http://gexf.net/1.3" version="1.3">\n'
+                          '  <graph defaultedgetype="directed">\n'
+                          '    <attributes class="node">\n')
+        for i, name in enumerate(NODE_ATTRIBUTES[1:]):
+            self.handle.write(f'      <attribute id="{i}" title="{name}" type="string"/>\n')
+        self.handle.write('    </attributes>\n    <nodes>\n')
+
+    def node(self, id_: str, attributes: Dict[str, str]):
+        # The title is the node label, and the rest are attribute values
+        values = "".join(f'<attvalue for="{i}" value={quoteattr(attributes[name])}/>'
+                         for i, name in enumerate(NODE_ATTRIBUTES[1:]) if attributes[name])
+        label = quoteattr(attributes["title"] or id_)
+        self.handle.write(f'      <node id={self.quote(id_)} label={label}><attvalues>{values}</attvalues></node>\n')
+
+    def start_edges(self):
+        self.handle.write('    </nodes>\n    <edges>\n')
+
+    def edge(self, source: str, target: str):
+        ends = f"source={self.quote(source)} target={self.quote(target)}"
+        self.handle.write(f'      <edge id="{self.edge_count}" {ends}/>\n')
+        self.edge_count += 1
+
+    def finish(self):
+        self.handle.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+class JSONLinesWriter(GraphWriter):
+    def _quote(self, id_: str) -> str:
+        return json.dumps(id_)
+
+    def node(self, id_: str, attributes: Dict[str, str]):
+        self.handle.write(json.dumps({"type": "node", "id": id_, **attributes}) + "\n")
+
+    def edge(self, source: str, target: str):
+        self.handle.write(f'{{"type": "edge", "source": {self.quote(source)}, "target": {self.quote(target)}}}\n')
+
+
+GRAPH_FORMATS: Dict[str, Type[GraphWriter]] = {
+    "graphml": GraphMLWriter,
+    "gexf": GEXFWriter,
+    "jsonl": JSONLinesWriter,
+}
+
+
+def export_graph(notes: Callable[[], Iterable[NoteInfo]], index_name: Callable[[NoteInfo], str],
+                 writer: GraphWriter) -> Tuple[int, int]:
+    """
+    Stream the graph of the given notes to a writer, returning the number of nodes and edges written. Every note is a
+    node, and the edges are the distinct links between them, leaving out links from a note to itself and links to IDs
+    which aren't one of the notes. The notes are given as a function which is called twice, once for the nodes and
+    once for the edges, so the only thing kept between the two passes is the set of node IDs (and the writer's quoted
+    copies of them).
+    """
+    writer.start()
+    ids: Set[str] = set()
+    for note in notes():
+        # The front matter can give a title as some other type, such as a number, and the writers expect text
+        title = str(note.title) if note.title is not None else ""
+        created = note.created.isoformat() if note.created is not None else ""
+        writer.node(note.id, {"title": title, "index": index_name(note), "created": created})
+        ids.add(note.id)
+
+    writer.start_edges()
+    edges = 0
+    for note in notes():
+        for target in sorted(set(note.links_to or [])):
+            if target != note.id and target in ids:
+                writer.edge(note.id, target)
+                edges += 1
+
+    writer.finish()
+    return len(ids), edges
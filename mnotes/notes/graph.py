@@ -0,0 +1,157 @@
+"""
+    Compact representation of the graph of ID links between notes, and the analytics built on top of it
+"""
+from __future__ import annotations
+
+from array import array
+from typing import List, Dict, Iterable, Tuple
+
+from .markdown_notes import NoteInfo
+
+
+class LinkGraph:
+    """
+    Directed graph of the ID links between notes, stored in compressed sparse row (CSR) form. Every note ID is mapped to
+    a dense integer node number, and the outgoing links of node i are the node numbers in
+    targets[offsets[i]:offsets[i + 1]]. The same structure is kept for the incoming links in sources/in_offsets, so
+    that both the links and backlinks of a node are a slice of an integer array.
+
+    Repeated links from one note to another are counted once, links from a note to itself are dropped, and links to IDs
+    which aren't nodes in the graph are counted in the dangling field but otherwise ignored.
+    """
+
+    def __init__(self, ids: List[str], offsets: array, targets: array, dangling: int = 0):
+        self.ids: List[str] = ids
+        self.index_of: Dict[str, int] = {id_: i for i, id_ in enumerate(ids)}
+        self.offsets: array = offsets
+        self.targets: array = targets
+        self.dangling: int = dangling
+
+        # Build the transposed structure with a counting sort of the targets
+        node_count = len(ids)
+        self.in_offsets = array("l", [0] * (node_count + 1))
+        for t in targets:
+            self.in_offsets[t + 1] += 1
+        for i in range(node_count):
+            self.in_offsets[i + 1] += self.in_offsets[i]
+
+        self.sources = array("l", [0] * len(targets))
+        cursor = array("l", self.in_offsets[:-1])
+        for source in range(node_count):
+            for t in targets[offsets[source]:offsets[source + 1]]:
+                self.sources[cursor[t]] = source
+                cursor[t] += 1
+
+    @staticmethod
+    def build(notes: Iterable[NoteInfo]) -> LinkGraph:
+        """ Build the graph from the links_to field of notes, every note with an ID becomes a node """
+        notes = [n for n in notes if n.id is not None]
+        ids = [n.id for n in notes]
+        index_of = {id_: i for i, id_ in enumerate(ids)}
+
+        offsets = array("l", [0])
+        targets = array("l")
+        dangling = 0
+        for i, note in enumerate(notes):
+            linked = set()
+            for target in note.links_to or []:
+                t = index_of.get(target, None)
+                if t is None:
+                    dangling += 1
+                elif t != i:
+                    linked.add(t)
+            targets.extend(sorted(linked))
+            offsets.append(len(targets))
+
+        return LinkGraph(ids, offsets, targets, dangling)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def successors(self, node: int) -> array:
+        """ Node numbers which the node links to """
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def predecessors(self, node: int) -> array:
+        """ Node numbers which link to the node """
+        return self.sources[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    def out_degrees(self) -> List[int]:
+        return [self.offsets[i + 1] - self.offsets[i] for i in range(self.node_count)]
+
+    def in_degrees(self) -> List[int]:
+        return [self.in_offsets[i + 1] - self.in_offsets[i] for i in range(self.node_count)]
+
+    def orphans(self) -> List[str]:
+        """ IDs of the notes which have no links to or from any other note """
+        out_degrees = self.out_degrees()
+        in_degrees = self.in_degrees()
+        return [self.ids[i] for i in range(self.node_count) if not out_degrees[i] and not in_degrees[i]]
+
+    def hubs(self, count: int) -> List[Tuple[str, int, int]]:
+        """ The most connected notes by total number of links in and out, as tuples of (id, in degree, out degree) """
+        out_degrees = self.out_degrees()
+        in_degrees = self.in_degrees()
+        ranked = sorted(range(self.node_count), key=lambda i: (-(in_degrees[i] + out_degrees[i]), self.ids[i]))
+        return [(self.ids[i], in_degrees[i], out_degrees[i]) for i in ranked[:count]]
+
+    def components(self) -> List[List[str]]:
+        """
+        Weakly connected components of the graph (link direction is ignored), as lists of IDs from the largest component
+        to the smallest. Uses a union-find over the edge arrays with path halving.
+        """
+        parent = array("l", range(self.node_count))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for source in range(self.node_count):
+            for target in self.successors(source):
+                a, b = find(source), find(target)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+        groups: Dict[int, List[str]] = {}
+        for node in range(self.node_count):
+            root = find(node)
+            if root not in groups:
+                groups[root] = []
+            groups[root].append(self.ids[node])
+
+        return sorted(groups.values(), key=lambda g: (-len(g), g[0]))
+
+    def pagerank(self, damping: float = 0.85, tolerance: float = 1.0e-6, max_iterations: int = 100) -> Dict[str, float]:
+        """
+        PageRank of every note by power iteration, pulling rank along the incoming links of each node. The rank of notes
+        without any outgoing links is spread evenly across all of the notes. Iteration stops when the total change in
+        rank falls below the tolerance, and the returned ranks sum to one.
+        """
+        n = self.node_count
+        if n == 0:
+            return {}
+
+        out_degrees = self.out_degrees()
+        sinks = [i for i in range(n) if not out_degrees[i]]
+        rank = [1.0 / n] * n
+
+        for _ in range(max_iterations):
+            contribution = [rank[i] / out_degrees[i] if out_degrees[i] else 0.0 for i in range(n)]
+            base = (1.0 - damping) / n + damping * sum(rank[i] for i in sinks) / n
+            get = contribution.__getitem__
+            updated = [base + damping * sum(map(get, self.sources[self.in_offsets[i]:self.in_offsets[i + 1]]))
+                       for i in range(n)]
+
+            change = sum(abs(a - b) for a, b in zip(rank, updated))
+            rank = updated
+            if change < tolerance:
+                break
+
+        return {self.ids[i]: rank[i] for i in range(n)}
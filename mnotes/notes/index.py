@@ -1,15 +1,30 @@
 from __future__ import annotations
 
+import abc
 import json
 import os
-from typing import List, Dict, Set, Callable, Optional
+import math
+import heapq
+from bisect import bisect_left, insort
+from datetime import datetime as DateTime
+from typing import List, Dict, Set, Callable, Optional, Tuple, Iterable, Iterator
 from dataclasses import dataclass
-from mnotes.utility.file_system import FileInfo, FileSystemProvider
-
-from .markdown_notes import NoteInfo, NoteBuilder, MetaData, Note
+from functools import partial
+from mnotes.utility.file_system import FileInfo, FileSystemProvider, text_checksum
+
+from .markdown_notes import NoteInfo, NoteBuilder, MetaData, Note, NoteLink, NoteHeading, LinkKind, heading_key, \
+    _strip_mnote_section
+from .graph import LinkGraph
+from .titles import TitleIndex
+from .note_cache import NoteCache, DEFAULT_NOTE_CACHE_BYTES
 from ..utility.change import ChangeTransaction
+from ..utility.journal import apply_changes
 from ..utility.json_encoder import MNotesEncoder, MNotesDecoder
 
+# Version of the serialized cache format. A cached index written with a different version has its file and note
+# information discarded on load, so that the next update re-parses every note and fills in any new fields.
+INDEX_CACHE_VERSION = 6
+
 
 @dataclass
 class IndexOperationResult:
@@ -24,6 +39,56 @@ class IndexConflict:
     conflicting: List[NoteInfo]
 
 
+@dataclass
+class BrokenLink:
+    source: NoteInfo
+    target: str
+    ambiguous: bool  # True if more than one note has the target ID, False if no note has it
+
+
+class ContentIndex(abc.ABC):
+    """
+    Base class for indices built from the body text of the notes in a NoteIndex, such as the full text search index.
+    Content indices are too large to keep in the index cache, so they are stored separately and only loaded by the
+    commands which need them.
+
+    A content index is attached to a NoteIndex by adding it to NoteIndex.content, after which IndexBuilder.update will
+    feed it the body of every note it re-parses and drop the notes which have disappeared. Because a content index can
+    miss updates made while it wasn't attached, it records the checksum each note was indexed with, and
+    IndexBuilder.sync_content uses these to bring it back up to date by re-reading only the notes which have changed.
+    """
+
+    def __init__(self, **kwargs):
+        self.checksums: Dict[str, str] = kwargs.get("checksums", {})
+        self.is_dirty: bool = False  # Has this index changed since it was loaded?
+
+    def add(self, path: str, check_sum: str, body: str):
+        """ Add or replace the body text for the note at the given path """
+        self.remove(path)
+        self._add(path, body)
+        self.checksums[path] = check_sum
+        self.is_dirty = True
+
+    def remove(self, path: str):
+        """ Remove the note at the given path from the index if it's present """
+        if path in self.checksums:
+            self._remove(path)
+            del self.checksums[path]
+            self.is_dirty = True
+
+    @abc.abstractmethod
+    def serialize(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def _add(self, path: str, body: str):
+        pass
+
+    @abc.abstractmethod
+    def _remove(self, path: str):
+        pass
+
+
 class NoteIndex:
 
     def __init__(self, **kwargs):
@@ -35,6 +100,24 @@ class NoteIndex:
         self.exceptions: Dict[str, IndexOperationResult] = {}
         self.is_merged: bool = False  # Has this index been merged into the global index?
 
+        # Inverted tag index, mapping each tag to the paths of the notes in this index which carry it, and the reverse
+        # link index, mapping each linked ID to the paths of the notes in this index whose links_to contains it. Both
+        # are maintained by add_note and remove_note and persisted with the cache, but are rebuilt from the notes if
+        # they're missing.
+        self.tags: Dict[str, Set[str]] = {}
+        self.linked_from: Dict[str, Set[str]] = {}
+
+        # Creation times of the notes as (epoch seconds, path) pairs, kept sorted so that time ranges can be found with
+        # bisect. Maintained by add_note and remove_note and persisted with the cache, but rebuilt if it's missing.
+        self.created: List[Tuple[int, str]] = []
+
+        # Attached content indices by kind, these are not part of the serialized cache (see ContentIndex)
+        self.content: Dict[str, ContentIndex] = {}
+
+        # Sorted paths of the notes for directory lookups, built by notes_in_path when first needed and dropped whenever
+        # a note is added or removed
+        self._sorted_paths: Optional[List[str]] = None
+
         for file_dict in kwargs.get("files", []):
             info = FileInfo(**file_dict)
             self.files[info.full_path] = info
@@ -43,17 +126,100 @@ class NoteIndex:
             note = NoteInfo(**note_dict)
             self.notes[note.file_path] = note
 
+        tags = kwargs.get("tags", None)
+        if tags is None:
+            for note in self.notes.values():
+                _add_path(self.tags, note.tags or [], note.file_path)
+        else:
+            self.tags = {tag: {p for p in paths if p in self.notes} for tag, paths in tags.items()}
+
+        linked_from = kwargs.get("linked_from", None)
+        if linked_from is None:
+            self.rebuild_links()
+        else:
+            self.linked_from = {id_: {p for p in paths if p in self.notes} for id_, paths in linked_from.items()}
+
+        created = kwargs.get("created", None)
+        if created is None:
+            self.created = sorted(k for k in map(_created_key, self.notes.values()) if k is not None)
+        else:
+            self.created = [(t, p) for t, p in created if p in self.notes]
+
+    def add_note(self, note: NoteInfo):
+        """
+        Add or replace the information for a note in the index, keeping the derived lookups up to date. When a note is
+        replaced only the differences between its old and new tags and links are applied.
+        """
+        path = note.file_path
+        old = self.notes.get(path, None)
+        for lookup, old_keys, new_keys in ((self.tags, old.tags if old else None, note.tags),
+                                           (self.linked_from, old.links_to if old else None, note.links_to)):
+            old_keys = set(old_keys or [])
+            new_keys = set(new_keys or [])
+            _discard_path(lookup, old_keys - new_keys, path)
+            _add_path(lookup, new_keys - old_keys, path)
+
+        old_created = _created_key(old) if old else None
+        new_created = _created_key(note)
+        if old_created != new_created:
+            if old_created is not None:
+                self._remove_created(old_created)
+            if new_created is not None:
+                insort(self.created, new_created)
+
+        if old is None:
+            self._sorted_paths = None
+        self.notes[path] = note
+
+    def remove_note(self, path: str) -> Optional[NoteInfo]:
+        """ Remove the information for the note at the given path from the index, returning it if it existed """
+        note = self.notes.pop(path, None)
+        if note is not None:
+            self._sorted_paths = None
+            _discard_path(self.tags, note.tags or [], path)
+            _discard_path(self.linked_from, note.links_to or [], path)
+            key = _created_key(note)
+            if key is not None:
+                self._remove_created(key)
+        return note
+
+    def _remove_created(self, key: Tuple[int, str]):
+        i = bisect_left(self.created, key)
+        if i < len(self.created) and self.created[i] == key:
+            del self.created[i]
+
+    def rebuild_links(self):
+        """ Rebuild the reverse link index from scratch from the links of every note """
+        self.linked_from = {}
+        for note in self.notes.values():
+            _add_path(self.linked_from, note.links_to or [], note.file_path)
+
+    def linking_to(self, id_: str) -> Set[str]:
+        """ Paths of the notes in this index which link to the given ID """
+        return self.linked_from.get(id_, set())
+
+    def created_between(self, since: Optional[int] = None, until: Optional[int] = None) -> List[Tuple[int, str]]:
+        """ The (epoch seconds, path) pairs of the notes created at or after since and before until, oldest first """
+        start = 0 if since is None else bisect_left(self.created, (since,))
+        end = len(self.created) if until is None else bisect_left(self.created, (until,), start)
+        return self.created[start:end]
+
     def notes_in_path(self, path: str) -> List[NoteInfo]:
-        """ Search the NoteIndex for notes which are in or below a specific directory. """
-        check_path = os.path.abspath(path)
-        return [n for n in self.notes.values() if n.file_path.startswith(check_path)]
+        """ Search the NoteIndex for notes which are in or below a specific directory, in order of their paths. """
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self.notes.keys())
+        return [self.notes[p] for p in _paths_under(self._sorted_paths, os.path.abspath(path))]
 
     def serialize(self) -> str:
         output = {
+            "version": INDEX_CACHE_VERSION,
             "name": self.name,
             "path": self.path,
             "files": [f.to_dict() for f in self.files.values()],
-            "notes": [n.to_dict() for n in self.notes.values()]
+            "notes": [n.to_dict() for n in self.notes.values()],
+            "tags": {tag: sorted(paths) for tag, paths in self.tags.items()},
+            "linked_from": {id_: sorted(paths) for id_, paths in self.linked_from.items()},
+            "created": self.created
         }
         return json.dumps(output, indent=4, cls=MNotesEncoder)
 
@@ -71,9 +237,56 @@ class NoteIndex:
     @staticmethod
     def deserialize(encoded: str) -> NoteIndex:
         dict_data = json.loads(encoded, cls=MNotesDecoder)
+        if dict_data.pop("version", None) != INDEX_CACHE_VERSION:
+            dict_data.pop("files", None)
+            dict_data.pop("notes", None)
+            dict_data.pop("tags", None)
+            dict_data.pop("linked_from", None)
+            dict_data.pop("created", None)
         return NoteIndex(**dict_data)
 
 
+def _paths_under(sorted_paths: List[str], path: str) -> List[str]:
+    """
+    Find the entries of a sorted list of absolute paths which are the given path itself or are below it as a directory.
+    Everything below the directory starts with the directory and a separator, and sorts before the directory followed by
+    the character after the separator, so the range is found by bisection and /notes/ab does not match /notes/abc.
+    """
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    start = bisect_left(sorted_paths, prefix)
+    end = bisect_left(sorted_paths, prefix[:-1] + chr(ord(os.sep) + 1), start)
+    found = sorted_paths[start:end]
+
+    i = bisect_left(sorted_paths, path)
+    if path != prefix and i < len(sorted_paths) and sorted_paths[i] == path:
+        found.insert(0, path)
+    return found
+
+
+def _created_key(note: NoteInfo) -> Optional[Tuple[int, str]]:
+    if note.created is None:
+        return None
+    return math.floor(note.created.timestamp()), note.file_path
+
+
+def _add_path(lookup: Dict[str, Set[str]], keys: Iterable[str], *paths: str):
+    for key in keys:
+        if not paths:
+            continue
+        if key not in lookup:
+            lookup[key] = set()
+        lookup[key].update(paths)
+
+
+def _discard_path(lookup: Dict[str, Set[str]], keys: Iterable[str], path: str):
+    for key in keys:
+        paths = lookup.get(key, None)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del lookup[key]
+
+
 class IndexBuilder:
     """ The IndexBuilder is a factory to build indices from a FileSystemProvider """
 
@@ -90,12 +303,13 @@ class IndexBuilder:
         self.update(index, True)
         return index
 
-    def update(self, index: NoteIndex, force_checksums: bool = False):
+    def update(self, index: NoteIndex, force_checksums: bool = False) -> List[str]:
         """
         Update a NoteIndex by what's currently visible on the filesystem provider.  Performs the update in place.
         :param index: the NoteIndex object to perform the update on
         :param force_checksums: force the update to recalculate checksums for all of the files vs using modified
         timestamp and size
+        :return: the paths of the files which were removed from the index or (re)loaded into it
         """
         raw_witnessed: List[FileInfo] = self.provider.get_all(index.path, self._markdown_filter)
         witnessed: Dict[str, FileInfo] = {w.full_path: w for w in raw_witnessed}
@@ -110,9 +324,12 @@ class IndexBuilder:
             if k not in witnessed:
                 to_remove.append(k)
 
+        changed = list(to_remove)
         for k in to_remove:
             del index.files[k]
-            del index.notes[k]
+            index.remove_note(k)
+            for content in index.content.values():
+                content.remove(k)
             if k in index.exceptions:
                 del index.exceptions[k]
 
@@ -124,13 +341,46 @@ class IndexBuilder:
                 if key in index.exceptions:
                     del index.exceptions[key]
 
+                changed.append(key)
                 index.files[key] = w
                 try:
                     index.files[key].check_sum = self.provider.checksum(key)
-                    index.notes[key] = self.note_builder.load_info(key)
+                    if index.content:
+                        info, body = self.note_builder.load_info_and_body(key)
+                        index.add_note(info)
+                        for content in index.content.values():
+                            content.add(key, index.files[key].check_sum, body)
+                    else:
+                        index.add_note(self.note_builder.load_info(key))
                 except Exception as e:
                     index.exceptions[key] = IndexOperationResult(w, e)
 
+        return changed
+
+    def sync_content(self, index: NoteIndex, content: ContentIndex) -> int:
+        """
+        Bring a content index up to date with a NoteIndex which has already been updated, re-reading the body of only
+        those notes whose file checksum differs from the one they were last indexed with, and removing the notes which
+        are no longer in the index. Returns the number of notes which were re-read.
+        """
+        for path in [p for p in content.checksums.keys() if p not in index.notes or p in index.exceptions]:
+            content.remove(path)
+
+        count = 0
+        for path in index.notes.keys():
+            info = index.files.get(path, None)
+            if info is None or path in index.exceptions or content.checksums.get(path, None) == info.check_sum:
+                continue
+
+            try:
+                _, body = self.note_builder.load_info_and_body(path)
+                content.add(path, info.check_sum, body)
+                count += 1
+            except Exception:
+                content.remove(path)
+
+        return count
+
 
 class GlobalIndices:
     """ The GlobalIndices is the master object for managing the entire collection of indices on the machine. The
@@ -156,6 +406,34 @@ class GlobalIndices:
         self.indices: Dict[str, NoteIndex] = {}
         self.conflicts: Dict[str, List[NoteInfo]] = {}
 
+        # Normalized heading keys (see heading_key) mapped to the notes which contain a heading with that key, by path
+        # so that unregistering a note is a constant time removal however many other notes share the key
+        self.by_heading: Dict[str, Dict[str, NoteInfo]] = {}
+
+        # Tags mapped to the notes which carry them, by path like by_heading
+        self.by_tag: Dict[str, Dict[str, NoteInfo]] = {}
+
+        # Absolute root directories of the loaded indices, both as a lookup and as a sorted list, and the memoized results
+        # of index_of_path. They're built on the first lookup after the indices are loaded.
+        self._roots: Optional[Dict[str, NoteIndex]] = None
+        self._sorted_roots: List[str] = []
+        self._index_of_path: Dict[str, Optional[NoteIndex]] = {}
+
+        # Linked IDs which don't resolve to exactly one note, either because no note has the ID or because it's in the
+        # conflicts, mapped to the paths of the notes which link to them. Maintained by register and unregister.
+        self.broken: Dict[str, Set[str]] = {}
+
+        # The link graph is built on first use after loading, see the graph property
+        self._graph: Optional[LinkGraph] = None
+
+        # Fuzzy title lookup, built from the registered notes when first used and then kept up to date by register and
+        # unregister until the next load
+        self._titles: Optional[TitleIndex] = None
+
+        # Parsed notes loaded by get_note, which are invalidated when their files change through an index update or an
+        # applied transaction
+        self.note_cache = NoteCache(kwargs.get("note_cache_bytes", DEFAULT_NOTE_CACHE_BYTES))
+
         # Callback to run after loading has finished
         self.on_load: Callable[[GlobalIndices], None] = kwargs.get("on_load", None)
 
@@ -163,26 +441,89 @@ class GlobalIndices:
         return self.by_path[path] if path in self.by_path else None
 
     def get_note(self, path: str) -> Optional[Note]:
-        if path in self.by_path:
+        """
+        Load a note with its content, going through the note cache. Since the cache is keyed by the checksum of the
+        file in the index, a note whose file was changed after the last update is still returned as it was then.
+        """
+        if path not in self.by_path:
+            return None
+
+        info = self._file_info(path)
+        if info is None:
             return self.index_builder.note_builder.load_note(path)
+        return self.note_cache.get(path, info.check_sum, info.size, self.index_builder.note_builder.load_note)
+
+    def _file_info(self, path: str) -> Optional[FileInfo]:
+        for index in self.indices.values():
+            if path in index.files:
+                return index.files[path]
         return None
 
+    def is_known_path(self, path: str) -> bool:
+        """ Whether the path is one of the files in the loaded indices """
+        return any(path in index.files for index in self.indices.values())
+
     def create_empty_transaction(self) -> ChangeTransaction:
-        file_paths = []
-        for index in self.indices.values():
-            file_paths += list(index.files.keys())
+        return ChangeTransaction(self.all_ids, self.is_known_path, self.get_note, self.get_note_info)
+
+    def apply_transaction(self, transaction: ChangeTransaction, workers: Optional[int] = None,
+                          on_progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Write the changes in the transaction to the file system as a unit (see apply_changes), so that if anything
+        fails an ApplyError is raised and the notes are left as they were. The new contents of the notes are rendered
+        and staged on a thread pool of the given number of workers, with on_progress called as they are staged.
 
-        empty = ChangeTransaction(self.all_ids, file_paths, self.get_note, self.get_note_info)
-        return empty
+        Once the changes are written the indices and the global lookups are updated in place from the notes in the
+        transaction, so the changed files don't have to be found and parsed again by the next update.
+        """
+        rendered: Dict[str, str] = {}
+
+        def render(original: str) -> str:
+            rendered[original] = transaction.by_path[original].to_file_text()
+            return rendered[original]
 
-    def apply_transaction(self, transaction: ChangeTransaction):
+        changes = []
         for original, moved in transaction.file_moves.items():
-            if original != moved:
-                self.index_builder.provider.move_file(original, moved)
+            self.note_cache.invalidate(original)
+            self.note_cache.invalidate(moved)
+            changes.append((original, moved, partial(render, original)))
 
-            if transaction.by_path[original] is not None:
-                with self.index_builder.provider.write_file(moved) as handle:
-                    handle.write(transaction.by_path[original].to_file_text())
+        apply_changes(self.index_builder.provider, changes, workers, on_progress)
+        self._update_applied(transaction, rendered)
+
+    def _update_applied(self, transaction: ChangeTransaction, rendered: Dict[str, str]):
+        """
+        Replace the index entries of the notes changed by an applied transaction with the new ones, using the text which
+        was written to each file for its checksum. Every changed note is removed before any is added back, since notes
+        can have moved onto each other's paths.
+        """
+        for original in transaction.file_moves:
+            note = self.by_path.get(original, None)
+            if note is not None:
+                self.unregister(note)
+            for index in self.indices.values():
+                if original in index.files:
+                    del index.files[original]
+                    index.remove_note(original)
+                    index.exceptions.pop(original, None)
+                    for content in index.content.values():
+                        content.remove(original)
+
+        provider = self.index_builder.provider
+        for original, moved in transaction.file_moves.items():
+            index = self.index_of_path(moved)
+            if index is None:
+                continue
+
+            note = transaction.by_path[original]
+            info = self.index_builder.note_builder.info_from_note(note)
+            file_info = provider.file_info(moved)
+            file_info.check_sum = text_checksum(rendered[original])
+            index.files[moved] = file_info
+            index.add_note(info)
+            for content in index.content.values():
+                content.add(moved, file_info.check_sum, _strip_mnote_section(note.content.rstrip()))
+            self.register(info)
 
     def find_conflicts(self, path: str) -> Dict[str, IndexConflict]:
         """ Detect conflicts between the existing global index and the contents of a new directory """
@@ -227,15 +568,97 @@ class GlobalIndices:
 
         return new_conflicts
 
+    def find_headings(self, text: str, exact: bool = True) -> List[Tuple[NoteInfo, NoteHeading]]:
+        """
+        Find every note in the global index with a heading matching the given text, using the heading information
+        stored in the index rather than reading any files. Matching is done on the normalized heading key, so it is
+        insensitive to case and punctuation. If exact is False, any heading whose key contains the key of the text will
+        match.
+        """
+        key = heading_key(text)
+        if exact:
+            keys = [key] if key in self.by_heading else []
+        else:
+            keys = [k for k in self.by_heading.keys() if key in k]
+
+        results = []
+        for k in keys:
+            for note in self.by_heading[k].values():
+                results += [(note, h) for h in note.headings if h.key == k]
+        return results
+
+    def resolve_link(self, link: NoteLink) -> Optional[Tuple[NoteInfo, Optional[NoteHeading]]]:
+        """
+        Resolve an ID link to the note it refers to and, if the link has an anchor like [[id#Heading]], to the heading
+        in that note. Returns None if the ID doesn't uniquely identify a note or the anchor doesn't match any heading.
+        """
+        if link.kind != LinkKind.ID or link.target not in self.by_id:
+            return None
+
+        note = self.by_id[link.target]
+        if not link.anchor:
+            return note, None
+
+        key = heading_key(link.anchor)
+        for heading in note.headings or []:
+            if heading.key == key:
+                return note, heading
+        return None
+
+    def tag_counts(self) -> Dict[str, int]:
+        """ Count the number of notes carrying each tag across the global index """
+        return {tag: len(notes) for tag, notes in self.by_tag.items()}
+
+    def notes_with_tag(self, tag: str) -> List[NoteInfo]:
+        """ Get the notes which carry a tag, a leading '#' on the tag is ignored """
+        return list(self.by_tag.get(tag.lstrip("#"), {}).values())
+
+    def tag_ids(self, tag: str) -> List[str]:
+        """ Get the IDs of the notes which carry a tag, skipping notes which have no ID """
+        return [n.id for n in self.notes_with_tag(tag) if n.id is not None]
+
+    @property
+    def graph(self) -> LinkGraph:
+        """ The graph of ID links between the notes with valid (unique) IDs, built once after each load """
+        if self._graph is None:
+            self._graph = LinkGraph.build(self.by_id.values())
+        return self._graph
+
+    @property
+    def titles(self) -> TitleIndex:
+        """ The fuzzy title index of all of the notes in the global directory """
+        if self._titles is None:
+            self._titles = TitleIndex()
+            for note in self.by_path.values():
+                if note.title:
+                    self._titles.add(note.file_path, note.title)
+        return self._titles
+
     def has_id(self, check_id: str) -> bool:
         """ Check if the ID exists anywhere in the global index, including in the current conflicts """
         return check_id in self.by_id or check_id in self.conflicts
 
+    def backlinks_of(self, id_: str) -> List[str]:
+        """
+        Get the IDs of the notes which link to the given ID, from the reverse link index of each NoteIndex. Only notes
+        with a valid (non-conflicting) ID are included, each one only once, in order of their IDs.
+        """
+        sources = set()
+        for index in self.indices.values():
+            for path in index.linking_to(id_):
+                note = self.by_path.get(path, None)
+                if note is not None and note.id is not None and self.by_id.get(note.id, None) is note:
+                    sources.add(note.id)
+        return sorted(sources)
+
     def backlinks(self) -> Dict[str, List[str]]:
         """
         Generate all backlinks for the entire global index in a single pass through all note information objects,
         creating a dictionary of lists in which the key is the ID for each note and the list is a list of IDs that
-        link to this note. Notes with conflicting IDs do not get backlinks generated for them
+        link to this note. Notes with conflicting IDs do not get backlinks generated for them.
+
+        This rebuilds everything from scratch, use backlinks_of to look up the backlinks of a single note. It serves as
+        the reference for check_backlinks.
         """
         bk_links: Dict[str, List[str]] = {}
         for note in filter(lambda n: n.links_to is not None, self.by_id.values()):
@@ -247,6 +670,182 @@ class GlobalIndices:
 
         return bk_links
 
+    def incoming_links(self, id_: str) -> List[Tuple[NoteInfo, NoteLink]]:
+        """
+        Every ID link to the given ID along with the note it's in, ordered by the path of the note and then by the
+        position of the link. The offsets and context of the links come from the index cache, so no files are read.
+        """
+        results = []
+        for path in sorted(self._paths_linking_to(id_)):
+            note = self.by_path[path]
+            for link in note.links or []:
+                if link.kind == LinkKind.ID and link.target == id_:
+                    results.append((note, link))
+        return results
+
+    def check_backlinks(self) -> List[str]:
+        """
+        Consistency check of the incrementally maintained reverse link indices against a full rebuild with backlinks.
+        Returns the IDs whose backlinks differ between the two, which should always be empty.
+        """
+        rebuilt = {k: sorted(set(v)) for k, v in self.backlinks().items()}
+        targets = set(rebuilt.keys())
+        for index in self.indices.values():
+            targets.update(index.linked_from.keys())
+
+        return sorted(t for t in targets if rebuilt.get(t, []) != self.backlinks_of(t))
+
+    def register(self, note: NoteInfo):
+        """
+        Add a note to the global lookups and the ID registry. If another note already has the same ID, both are moved
+        out of by_id and into the conflicts, since neither is privileged over the other, and the links to that ID
+        become broken. Links from the note to IDs which don't resolve to a single note are added to the broken links.
+        """
+        self.by_path[note.file_path] = note
+        self._graph = None
+        if self._titles is not None and note.title:
+            self._titles.add(note.file_path, note.title)
+        for key in {h.key for h in note.headings or []}:
+            if key not in self.by_heading:
+                self.by_heading[key] = {}
+            self.by_heading[key][note.file_path] = note
+        for tag in note.tags or []:
+            if tag not in self.by_tag:
+                self.by_tag[tag] = {}
+            self.by_tag[tag][note.file_path] = note
+
+        _add_path(self.broken, [t for t in set(note.links_to or []) if t not in self.by_id], note.file_path)
+
+        if note.id is None:
+            note.state = MetaData.NO_ID
+            return
+
+        self.all_ids.add(note.id)
+        if note.id in self.conflicts:
+            self.conflicts[note.id].append(note)
+            note.state = MetaData.CONFLICT
+        elif note.id in self.by_id:
+            existing = self.by_id.pop(note.id)
+            self.conflicts[note.id] = [existing, note]
+            existing.state = MetaData.CONFLICT
+            note.state = MetaData.CONFLICT
+            _add_path(self.broken, [note.id], *self._paths_linking_to(note.id))
+        else:
+            self.by_id[note.id] = note
+            note.state = MetaData.OK
+            self.broken.pop(note.id, None)
+
+    def unregister(self, note: NoteInfo):
+        """
+        Remove a note from the global lookups and the ID registry, the reverse of register. If this leaves only one note
+        with a conflicting ID, that note is moved back into by_id and the links to it are no longer broken, while if it
+        leaves no note with the ID at all the links to it become broken.
+        """
+        if self.by_path.get(note.file_path, None) is not note:
+            return
+
+        del self.by_path[note.file_path]
+        self._graph = None
+        if self._titles is not None:
+            self._titles.remove(note.file_path)
+        for lookup, keys in ((self.by_heading, {h.key for h in note.headings or []}), (self.by_tag, note.tags or [])):
+            for key in keys:
+                notes = lookup.get(key, None)
+                if notes is not None and notes.get(note.file_path, None) is note:
+                    del notes[note.file_path]
+                    if not notes:
+                        del lookup[key]
+
+        _discard_path(self.broken, set(note.links_to or []), note.file_path)
+
+        if note.id is None:
+            return
+
+        if note.id in self.conflicts:
+            remaining = [n for n in self.conflicts[note.id] if n is not note]
+            if len(remaining) == 1:
+                del self.conflicts[note.id]
+                self.by_id[note.id] = remaining[0]
+                remaining[0].state = MetaData.OK
+                self.broken.pop(note.id, None)
+            else:
+                self.conflicts[note.id] = remaining
+        elif self.by_id.get(note.id, None) is note:
+            del self.by_id[note.id]
+            self.all_ids.discard(note.id)
+            _add_path(self.broken, [note.id], *self._paths_linking_to(note.id))
+
+    def created_between(self, since: Optional[DateTime] = None,
+                        until: Optional[DateTime] = None) -> Iterator[NoteInfo]:
+        """
+        The notes in all of the indices which were created at or after since and before until, in chronological order.
+        The ranges of the sorted creation index of each NoteIndex are merged lazily, so taking the first page of a large
+        range doesn't visit the rest of it.
+        """
+        since = None if since is None else math.floor(since.timestamp())
+        until = None if until is None else math.ceil(until.timestamp())
+        ranges = [index.created_between(since, until) for index in self.indices.values()]
+        for _, path in heapq.merge(*ranges):
+            yield self.by_path[path]
+
+    def created_seconds(self) -> Iterator[int]:
+        """
+        The epoch seconds in which at least one note in the global directory was created, each once per index, for
+        IdAllocator.block_created
+        """
+        for index in self.indices.values():
+            previous = None
+            for second, _ in index.created:
+                if second != previous:
+                    yield second
+                    previous = second
+
+    def index_of_path(self, path: str) -> Optional[NoteIndex]:
+        """
+        Find the index which contains the given path by walking up through its parent directories until one of them is
+        the root of an index, so the cost depends on the depth of the path rather than the number of indices. Results
+        are memoized until the indices are loaded again.
+        """
+        check_abs = os.path.abspath(path)
+        if check_abs in self._index_of_path:
+            return self._index_of_path[check_abs]
+
+        roots = self._index_roots()
+        found = None
+        current = check_abs
+        while found is None:
+            found = roots.get(current, None)
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+
+        self._index_of_path[check_abs] = found
+        return found
+
+    def indices_in_path(self, path: str) -> List[NoteIndex]:
+        """ Find the indices whose root directory is the given path or is below it """
+        roots = self._index_roots()
+        return [roots[p] for p in _paths_under(self._sorted_roots, os.path.abspath(path))]
+
+    def _index_roots(self) -> Dict[str, NoteIndex]:
+        if self._roots is None:
+            self._roots = {os.path.abspath(index.path): index for index in self.indices.values()}
+            self._sorted_roots = sorted(self._roots.keys())
+        return self._roots
+
+    def _paths_linking_to(self, id_: str) -> List[str]:
+        """ Paths of the registered notes in all indices which link to the given ID """
+        return [p for index in self.indices.values() for p in index.linking_to(id_) if p in self.by_path]
+
+    def broken_links(self) -> List[BrokenLink]:
+        """ Every link to an ID which doesn't resolve to exactly one note, ordered by the path of the linking note """
+        results = []
+        for target, paths in self.broken.items():
+            for path in paths:
+                results.append(BrokenLink(self.by_path[path], target, target in self.conflicts))
+        return sorted(results, key=lambda x: (x.source.file_path, x.target))
+
     def load_all(self, force_checksum: bool = False):
         """
         Load all indices globally. This will attempt to start from pre-loaded indices which only need to be
@@ -259,46 +858,27 @@ class GlobalIndices:
         self.all_ids.clear()
         self.conflicts.clear()
         self.by_path.clear()
-
-        # Update all of the indices
+        self.by_heading.clear()
+        self.by_tag.clear()
+        self.broken.clear()
+        self._graph = None
+        self._titles = None
+        self._roots = None
+        self._index_of_path.clear()
+
+        # Update all of the indices and register each of their notes, which merges the unique ids and detects the
+        # conflicts between them
         for name, info in self.index_directory.items():
             index = self.cached.get(name, None)
             if index is None:
                 index = self.index_builder.create(name, info["path"])
 
-            self.index_builder.update(index, force_checksum)
+            for path in self.index_builder.update(index, force_checksum):
+                self.note_cache.invalidate(path)
 
             self.indices[name] = index
-
-            # Go through each note and detect any conflicts against the global ID registry, and if there are none add
-            # the note to the unified id dictionary.  If there is a conflict we'll add this note to the conflict
-            # dictionary, but we will not remove the conflicting note yet, as this would prevent further conflicts
-            # from being detected. Instead we'll handle the original conflict after all of the indices have been
-            # merged.
-            for note in self.indices[name].notes.values():
-                self.by_path[note.file_path] = note
-                if note.id is not None:
-                    self.all_ids.add(note.id)
-                    if note.id in self.by_id:
-                        if note.id not in self.conflicts:
-                            self.conflicts[note.id] = []
-                        self.conflicts[note.id].append(note)
-                    else:
-                        self.by_id[note.id] = note
-                else:
-                    note.state = MetaData.NO_ID
-
-        # Now that we're done merging all indices we'll go through all of the conflicts and remove the original note
-        # which was first merged into the global dictionary, since it was added based on the happenstance of what
-        # order things occurred in, and is not actually privileged over the other notes.
-        for id_, conflict_list in self.conflicts.items():
-            conflict_list.append(self.by_id[id_])
-            del self.by_id[id_]
-            for note in conflict_list:
-                note.state = MetaData.CONFLICT
-
-        for id_, note in self.by_id.items():
-            note.state = MetaData.OK
+            for note in index.notes.values():
+                self.register(note)
 
         if self.on_load is not None:
             self.on_load(self)
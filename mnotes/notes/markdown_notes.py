@@ -6,17 +6,53 @@ import re
 import yaml
 
 from io import StringIO
+from copy import copy
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from typing import List, Dict, Optional, Tuple, Set, Any, Union
 from datetime import datetime as DateTime
 from datetime import tzinfo
+from functools import lru_cache
+from hashlib import md5
 
 from ..utility.file_system import FileSystemProvider
 
 ID_TIME_FORMAT = "%Y%m%d%H%M%S"
+MNOTE_SECTION_HEADER = "---\n# M-Note References\n*This section is automatically generated, any text placed in or " \
+                       "below it will be lost on the next update.*\n"
+DATE_TIME_CACHE_SIZE = 16384
 ID_LINK_PATTERN = re.compile(r"\[\[[^\]\[\n]*(\d{14})[^\]\[\n]*\]\]")
 LONG_STAMP_PATTERN = re.compile(r"20\d{12}")
+LINK_CONTEXT_WIDTH = 80  # The most characters of text kept on either side of an ID link in its context
+
+# The rest of a bare ID after its leading digit, which has to have the shape of an ID_TIME_FORMAT time stamp so that
+# other long numbers in the text (phone numbers, order numbers) aren't taken for links
+_BARE_ID_TAIL = r"\d{3}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])(?:[01]\d|2[0-3])[0-5]\d[0-5]\d(?!\w)"
+
+# A single combined pattern which tokenizes everything of interest in the body of a note in one pass.  Fenced code
+# blocks and inline code spans are matched (and then ignored) so that link-like text inside of them is consumed before
+# any of the link alternatives get a chance to see it.  Every alternative deliberately begins with a literal character
+# so that the regex engine can skip quickly over plain text, which is why fences and headings are anchored on the
+# preceding newline and bare IDs are split by their leading digit.  Scan text must therefore be prefixed with a newline.
+# Heading text is captured in a lookahead so that links on a heading line are still found.
+CONTENT_SCAN_PATTERN = re.compile(
+    r"\n[ \t]{0,3}(?P<fence>`{3,}|~{3,})[^\n]*(?:\n[\s\S]*?)?(?:\n[ \t]{0,3}(?P=fence)[ \t]*$|\Z)"
+    r"|\n(?P<level>#{1,6})[ \t]+(?=(?P<heading>[^\n]*))"
+    r"|`(?P<code>[^`\n]+)`"
+    r"|\[\[(?P<wiki>[^\]\[\n]*)\]\]"
+    r"|!\[[^\]\n]*\]\((?P<image>[^)\s]+)(?:[ \t]+\"[^\"\n]*\")?\)"
+    r"|\[[^\]\n]*\]\((?P<href>[^)\s]+)(?:[ \t]+\"[^\"\n]*\")?\)"
+    r"|1" + _BARE_ID_TAIL + r"(?P<bare1>)|2" + _BARE_ID_TAIL + r"(?P<bare2>)",
+    re.MULTILINE)
+_WIKI_ID_PATTERN = re.compile(r".*(\d{14})")
+_URL_SCHEME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.\-]*:")
+_ID_ONLY_PATTERN = re.compile(r"^\d{14}$")
+_WORD_CHAR_PATTERN = re.compile(r"\w")
+_HEADING_KEY_PATTERN = re.compile(r"\w+")
+_SENTENCE_END_PATTERN = re.compile(r"[.!?](?=\s)")
+_LEADING_WORD_PATTERN = re.compile(r"^\S+")
+_TRAILING_WORD_PATTERN = re.compile(r"\S+$")
+_LINE_MARKER_PATTERN = re.compile(r"^\s*(?:#{1,6}\s+|>\s*|[*+\-]\s+|\d+[.)]\s+)*")
 
 
 class FailedMetadataException(Exception):
@@ -24,6 +60,12 @@ class FailedMetadataException(Exception):
     pass
 
 
+class LinkKind(Enum):
+    ID = 0  # A link to another note by its unique ID, either a [[wiki]] link or a bare ID in the text
+    FILE = 1  # A link to another markdown file by its path or name
+    RESOURCE = 2  # A link or an embed of a non-markdown file, such as an image or a pdf
+
+
 class MetaData(Enum):
     UNKNOWN = 0  # Initial, unknown state
     MISSING = 1  # The note was missing metadata completely
@@ -33,6 +75,37 @@ class MetaData(Enum):
     OK = 5  # The metadata has a validated unique ID
 
 
+@dataclass
+class NoteLink:
+    kind: LinkKind
+    target: str
+    anchor: Optional[str] = None  # The heading fragment of a link like [[id#Heading]] or [text](file.md#heading)
+    # Where the link was found, which doesn't take part in comparing two links
+    offset: Optional[int] = field(default=None, compare=False)  # UTF-8 byte offset of the link in the note body
+    context: Optional[str] = field(default=None, compare=False)  # For ID links, the sentence around the link
+
+
+@dataclass
+class NoteHeading:
+    level: int
+    text: str
+    offset: int = 0  # Byte offset (UTF-8) of the start of the heading line in the body of the note
+
+    @property
+    def key(self) -> str:
+        return heading_key(self.text)
+
+
+@dataclass
+class NoteStats:
+    words: int  # Number of whitespace separated words in the body of the note
+    bytes: int  # Size of the body of the note encoded as UTF-8, not including front matter or the M-Notes section
+    headings: int
+    id_links: int
+    file_links: int
+    resource_links: int
+
+
 @dataclass
 class NoteInfo:
     file_path: str
@@ -44,6 +117,20 @@ class NoteInfo:
     info: Optional[str] = None
     links_to: Optional[List[str]] = None
     backlink: Optional[bool] = None
+    links: Optional[List[NoteLink]] = None
+    headings: Optional[List[NoteHeading]] = None
+    stats: Optional[NoteStats] = None
+    tags: Optional[List[str]] = None
+    mnote_section: Optional[str] = None  # Fingerprint of the generated mnote section at the end of the note, if any
+
+    def __post_init__(self):
+        # Nested dataclasses come back from the serialized cache as plain dictionaries
+        if self.links:
+            self.links = [NoteLink(**x) if isinstance(x, dict) else x for x in self.links]
+        if self.headings:
+            self.headings = [NoteHeading(**x) if isinstance(x, dict) else x for x in self.headings]
+        if isinstance(self.stats, dict):
+            self.stats = NoteStats(**self.stats)
 
     def to_dict(self) -> Dict:
         return asdict(self)
@@ -83,24 +170,34 @@ class Note:
 
         assert isinstance(self.front_matter, Dict)
 
-        # Copy certain keys from the NodeInfo object to the dictionary about to be written
+        # Copy certain keys from the NodeInfo object to a copy of the dictionary about to be written, leaving the front
+        # matter itself untouched since it may be shared with copies of this note (see Note.copy)
+        front_matter = dict(self.front_matter)
         info_dict = self.info.to_dict()
         for key in ("id", "title", "author", "created"):
-            self.front_matter[key] = info_dict[key]
+            front_matter[key] = info_dict[key]
 
         if self.info.backlink:
-            self.front_matter["backlink"] = True
-        elif "backlink" in self.front_matter:
-            del self.front_matter["backlink"]
+            front_matter["backlink"] = True
+        elif "backlink" in front_matter:
+            del front_matter["backlink"]
 
         with StringIO() as writer:
             writer.write("---\n")
-            yaml.dump(self.front_matter, writer)
+            yaml.dump(front_matter, writer)
             writer.write("---\n")
             writer.write(self.content)
 
             return writer.getvalue()
 
+    def copy(self) -> "Note":
+        """
+        A copy of the note which can be changed without affecting this one, as long as its fields are assigned rather
+        than modified in place. The NoteInfo is copied shallowly, and the front matter and content are shared, since
+        the content is an immutable string and the front matter is never modified by the note.
+        """
+        return Note(info=copy(self.info), front_matter=self.front_matter, content=self.content)
+
     def set_mnote_section(self, section_text: str):
         """
         Set the mnote section content at the end of the note.  If the note already has a section it will be replaced
@@ -110,9 +207,7 @@ class Note:
         stripped_content = _end_with_two_blank_lines(_strip_mnote_section(self.content))
         if not stripped_content.endswith("\n"):
             stripped_content += "\n"
-        stripped_content += "---\n# M-Note References\n*This section is automatically generated, any text placed in " \
-                            "or below it will be lost on the next update.*\n"
-        stripped_content += section_text
+        stripped_content += MNOTE_SECTION_HEADER + section_text
         self.content = stripped_content
 
 
@@ -123,22 +218,38 @@ class NoteBuilder:
         self.local_zone = local_tz
         self.provider = provider
 
+        # Parsing the ISO string and converting it into the local zone is memoized per builder, since the conversion
+        # through the local zone is comparatively expensive and bulk imported notes often share a creation time
+        self._parse_iso_cached = lru_cache(maxsize=DATE_TIME_CACHE_SIZE)(self._parse_iso)
+
     def parse_date_time(self, value) -> Optional[DateTime]:
         """
         Create an optional datetime from one of the three possible values that the front matter might contain: a None,
         an ISO formatted representation, or an already parsed datetime. If the value is a string but cannot be parsed,
         a ValueError will be raised.
+
+        String values are parsed through a bounded cache. Datetimes which YAML has already parsed are returned as they
+        are without going through the cache, since there is no work to save and two equal instants in different zones
+        would otherwise share a cache entry.
         """
+        if isinstance(value, str):
+            return self._parse_iso_cached(value)
+        return self._parse_date_time_uncached(value)
+
+    def _parse_date_time_uncached(self, value) -> Optional[DateTime]:
         if value is None:
             return None
 
         if isinstance(value, str):
-            return DateTime.fromisoformat(value).astimezone(self.local_zone)
+            return self._parse_iso(value)
         if isinstance(value, DateTime):
             return value
 
         raise ValueError(f"Could not decipher creation date from data: '{value}'")
 
+    def _parse_iso(self, value: str) -> DateTime:
+        return DateTime.fromisoformat(value).astimezone(self.local_zone)
+
     def _load_info_and_content(self, file_path: str) -> Tuple[NoteInfo, Optional[Dict], Optional[str]]:
         """
         Load a note's information and textual content from the file provider.
@@ -168,6 +279,7 @@ class NoteBuilder:
                 "title": meta_data.get("title", None),
                 "author": meta_data.get("author", None),
                 "backlink": meta_data.get("backlink", None),
+                "tags": _normalize_tags(meta_data.get("tags", None)),
             })
 
             # The parsing of the creation date is somewhat complicated and has the potential to fail
@@ -178,13 +290,32 @@ class NoteBuilder:
                 info_data["info"] = "Failed to parse creation time stamp"
                 info_data["state"] = MetaData.FAILED
 
-        # Search for links
-        links = ID_LINK_PATTERN.findall(_strip_mnote_section(markdown_content))
-        if links:
-            info_data["links_to"] = [e for e in links]
-
+        info_data.update(_content_info(markdown_content))
         return NoteInfo(**info_data), meta_data, markdown_content
 
+    def info_from_note(self, note: Note) -> NoteInfo:
+        """
+        Create the NoteInfo which load_info would give for a file containing the note's to_file_text, without writing
+        or parsing that text. The metadata comes from the note's info and front matter, and the links, headings and
+        statistics are scanned from its content, so this is used to update the index with notes which have just been
+        written.
+        """
+        info = note.info
+        info_data = {
+            "file_path": info.file_path,
+            "state": MetaData.UNKNOWN,
+            "created": info.created,
+            "id": None if info.id is None else str(info.id),
+            "title": info.title,
+            "author": info.author,
+            "backlink": True if info.backlink else None,
+            "tags": _normalize_tags(note.front_matter.get("tags", None)),
+        }
+
+        # Loading strips the trailing whitespace from the whole file before splitting off the front matter
+        info_data.update(_content_info(note.content.rstrip()))
+        return NoteInfo(**info_data)
+
     def load_info(self, file_path: str) -> NoteInfo:
         """
         Load a note and create a NoteInfo object from its contents. The NoteInfo.state field will be set based on the
@@ -201,6 +332,15 @@ class NoteBuilder:
         info, _, _ = self._load_info_and_content(file_path)
         return info
 
+    def load_info_and_body(self, file_path: str) -> Tuple[NoteInfo, str]:
+        """
+        Load a note's information as with load_info, along with the body text of the note which is the markdown content
+        without the front matter or the generated mnote section. This is the text which the content indices are built on.
+        :param file_path: must be a valid path to a file the provider can reach
+        """
+        info, _, markdown_content = self._load_info_and_content(file_path)
+        return info, _strip_mnote_section(markdown_content)
+
     def load_note(self, file_path: str) -> Note:
         """
         Load and create a Note object from a file path. The Note.info field will contain a standard NoteInfo object
@@ -263,14 +403,258 @@ def _extract_yaml_front_matter(content: str) -> Tuple[MetaData, Optional[Dict],
         return MetaData.FAILED, None, content
 
 
+def _content_info(markdown_content: str) -> Dict:
+    """
+    The NoteInfo fields which come from the markdown content of a note: the links and headings, and the content
+    statistics, all from the same body with the generated section stripped. The generated section is fingerprinted so
+    that it can be compared with a regenerated one without reading the note.
+    """
+    info_data = {}
+    body, section = _split_mnote_section(markdown_content)
+    if section is not None:
+        info_data["mnote_section"] = section_fingerprint(section)
+    links, headings = _scan_content(body)
+    if links:
+        info_data["links"] = links
+        to_ids = [link.target for link in links if link.kind == LinkKind.ID]
+        if to_ids:
+            info_data["links_to"] = to_ids
+    if headings:
+        info_data["headings"] = headings
+
+    kinds = [link.kind for link in links]
+    info_data["stats"] = NoteStats(words=len(body.split()),
+                                   bytes=len(body.encode("utf-8")),
+                                   headings=len(headings),
+                                   id_links=kinds.count(LinkKind.ID),
+                                   file_links=kinds.count(LinkKind.FILE),
+                                   resource_links=kinds.count(LinkKind.RESOURCE))
+    return info_data
+
+
 def _strip_mnote_section(content: str) -> str:
+    return _split_mnote_section(content)[0]
+
+
+def _split_mnote_section(content: str) -> Tuple[str, Optional[str]]:
+    """ Split the content of a note into the text before the generated mnote section and the section itself, if any """
     lines = content.split("\n")
     searchable = list(enumerate(line.strip() for line in lines))
     for i, line in searchable[:-1]:
         if line.startswith("---") and searchable[i + 1][1].startswith("# M-Note"):
-            return "\n".join(lines[:i]) + "\n"
+            return "\n".join(lines[:i]) + "\n", "\n".join(lines[i:])
 
-    return content
+    return content, None
+
+
+def mnote_section_fingerprint(section_text: str) -> str:
+    """ The fingerprint of the mnote section which Note.set_mnote_section would write with the given text """
+    return section_fingerprint(MNOTE_SECTION_HEADER + section_text)
+
+
+def section_fingerprint(section: str) -> str:
+    """
+    Fingerprint of the complete text of a generated mnote section, including its header. Whitespace at the ends of the
+    lines and of the section is ignored, so line endings and trailing blank lines don't change it.
+    """
+    normalized = "\n".join(line.rstrip() for line in section.strip().split("\n"))
+    return md5(normalized.encode("utf-8")).hexdigest()
+
+
+def body_lines(content: str) -> List[Tuple[int, str]]:
+    """
+    Split the full text of a note file into lines numbered from 1, and return only the lines which make up the body of
+    the note (see NoteBuilder.load_info_and_body), skipping the front matter and the generated mnote section. This lets
+    a match found in the body be reported with its line number in the file.
+    """
+    lines = content.split("\n")
+    valid_tokens = ["...", "---"]
+
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    if start < len(lines) and lines[start].strip() in valid_tokens:
+        for i in range(start + 1, len(lines)):
+            if lines[i].strip() in valid_tokens:
+                start = i + 1
+                break
+        else:
+            start = 0
+    else:
+        start = 0
+
+    end = len(lines)
+    for i in range(start, len(lines) - 1):
+        if lines[i].strip().startswith("---") and lines[i + 1].strip().startswith("# M-Note"):
+            end = i
+            break
+
+    return [(i + 1, lines[i]) for i in range(start, end)]
+
+
+def _normalize_tags(value) -> Optional[List[str]]:
+    """
+    Normalize the tags front matter value into a list of unique tag strings in their original order. The value may be a
+    YAML list, or a single string with the tags separated by commas or whitespace. Leading '#' characters are dropped
+    so that "#python" and "python" are the same tag. Returns None if there are no tags.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    elif not isinstance(value, (list, tuple, set)):
+        value = [value]
+
+    tags = []
+    for item in value:
+        if item is None:
+            continue
+        tag = str(item).strip().lstrip("#").strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags if tags else None
+
+
+def heading_key(text: str) -> str:
+    """
+    Normalize heading text or a link anchor into a key for comparison, so that "Some Heading!", "some heading" and
+    "some-heading" are all considered to refer to the same heading.
+    """
+    return "-".join(_HEADING_KEY_PATTERN.findall(text.lower()))
+
+
+def _scan_links(content: str) -> List[NoteLink]:
+    """ Scan the body of a markdown note and return only the typed links, see _scan_content """
+    links, _ = _scan_content(content)
+    return links
+
+
+def _scan_content(content: str) -> Tuple[List[NoteLink], List[NoteHeading]]:
+    """
+    Scan the body of a markdown note a single time with the combined CONTENT_SCAN_PATTERN and produce a list of typed
+    links and a list of ATX (# style) headings in the order in which they appear. Links and headings inside of fenced
+    code blocks and inline code spans are ignored. Heading offsets are UTF-8 byte offsets into the content given.
+
+    * [[wiki]] links containing a 14 digit ID, markdown links whose target is an ID, and bare 14 digit IDs in the text
+      which are valid ID_TIME_FORMAT times are all links of kind ID
+    * [[wiki]] links without an ID, and markdown links to files ending in .md are links of kind FILE
+    * image embeds and markdown links to any other local file are links of kind RESOURCE
+
+    Markdown links with a URL scheme (http:, mailto:, etc) are external and are not recorded.
+    """
+    links = []
+    headings = []
+    text = "\n" + content
+    offsets = _ByteOffsets(content)
+    for match in CONTENT_SCAN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "heading":
+            heading = match.group("heading").strip().rstrip("#").rstrip()
+            if heading:
+                # The match starts on the newline which was prepended, so the heading line begins at the same index
+                # in the original content
+                offset = offsets.at(match.start())
+                headings.append(NoteHeading(len(match.group("level")), heading, offset))
+            continue
+
+        link = None
+        if kind == "wiki":
+            inner, _, anchor = match.group("wiki").partition("#")
+            anchor = anchor.strip() or None
+            found = _WIKI_ID_PATTERN.match(inner)
+            if found:
+                link = NoteLink(LinkKind.ID, found.group(1), anchor)
+            elif inner.strip():
+                link = NoteLink(LinkKind.FILE, inner.strip(), anchor)
+        elif kind == "bare1" or kind == "bare2":
+            # An ID embedded in a longer word or number is not a link, and neither is a number which isn't a real time
+            if not _WORD_CHAR_PATTERN.match(text, match.start() - 1) and _is_id_time(match.group(0)):
+                link = NoteLink(LinkKind.ID, match.group(0))
+        elif kind == "image":
+            link = NoteLink(LinkKind.RESOURCE, match.group("image"))
+        elif kind == "href":
+            target = match.group("href")
+            if _URL_SCHEME_PATTERN.match(target) or target.startswith("#"):
+                continue
+            target, _, anchor = target.partition("#")
+            anchor = anchor or None
+            if _ID_ONLY_PATTERN.match(target):
+                link = NoteLink(LinkKind.ID, target, anchor)
+            elif target.lower().endswith(".md"):
+                link = NoteLink(LinkKind.FILE, target, anchor)
+            else:
+                link = NoteLink(LinkKind.RESOURCE, target, anchor)
+
+        if link is not None:
+            # Positions in the scanned text are one ahead of the content because of the prepended newline
+            link.offset = offsets.at(match.start() - 1)
+            if link.kind == LinkKind.ID:
+                link.context = _link_context(text, match.start(), match.end())
+            links.append(link)
+
+    return links, headings
+
+
+def _is_id_time(text: str) -> bool:
+    try:
+        DateTime.strptime(text, ID_TIME_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def _link_context(text: str, start: int, end: int) -> str:
+    """
+    The context of the link between start and end in the text: the sentence containing it, limited to its line and to
+    LINK_CONTEXT_WIDTH characters on either side, with list, quote and heading markers removed and runs of whitespace
+    collapsed. Text cut off by the width limit loses its partial word and is marked with an ellipsis.
+    """
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    line_end = len(text) if line_end < 0 else line_end
+
+    lo = max(line_start, start - LINK_CONTEXT_WIDTH)
+    hi = min(line_end, end + LINK_CONTEXT_WIDTH)
+    before = text[lo:start]
+    after = text[end:hi]
+
+    sentence_ends = list(_SENTENCE_END_PATTERN.finditer(before))
+    if sentence_ends:
+        before = before[sentence_ends[-1].end():]
+    elif lo > line_start:
+        before = "..." + (before if text[lo - 1].isspace() else _LEADING_WORD_PATTERN.sub("", before)).lstrip()
+    else:
+        before = _LINE_MARKER_PATTERN.sub("", before)
+
+    sentence_end = _SENTENCE_END_PATTERN.search(after + " ")
+    if sentence_end:
+        after = after[:sentence_end.end()]
+    elif hi < line_end:
+        after = (after if text[hi].isspace() else _TRAILING_WORD_PATTERN.sub("", after)).rstrip() + "..."
+
+    return " ".join((before + text[start:end] + after).split())
+
+
+class _ByteOffsets:
+    """
+    Converts increasing character offsets in a string into UTF-8 byte offsets, encoding only the text between the
+    previous offset and the next one so that the total work over a whole scan is linear in the length of the string.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.is_ascii = content.isascii()
+        self.char_pos = 0
+        self.byte_pos = 0
+
+    def at(self, char_pos: int) -> int:
+        if self.is_ascii:
+            return char_pos
+        if char_pos < self.char_pos:
+            return len(self.content[:char_pos].encode("utf-8"))
+        self.byte_pos += len(self.content[self.char_pos:char_pos].encode("utf-8"))
+        self.char_pos = char_pos
+        return self.byte_pos
 
 
 def _end_with_two_blank_lines(content: str) -> str:
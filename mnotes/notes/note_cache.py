@@ -0,0 +1,67 @@
+"""
+    A bounded cache of parsed notes, so that the notes which are loaded several times in a single run, such as by each
+    of the fixers in turn, are only read from the file system once
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .markdown_notes import Note
+
+# The default limit on the total size of the cached note files
+DEFAULT_NOTE_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class NoteCache:
+    """
+    Least recently used cache of parsed notes keyed by file path and checksum, limited by the total size in bytes of
+    the files the notes were loaded from. A note is only returned for the checksum it was loaded with, so a file which
+    has changed since it was cached is loaded again rather than returned stale. Notes are returned as copies (see
+    Note.copy) so that changing one doesn't change the cached note.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_NOTE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[str, int, Note]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path: str, check_sum: Optional[str], size: int, load: Callable[[str], Note]) -> Note:
+        """
+        Get the note at the path with the given checksum, loading it with the load function if it isn't cached. Notes
+        without a checksum, or which are larger than the whole cache, are loaded without being cached.
+        """
+        entry = self._entries.get(path, None)
+        if entry is not None and check_sum is not None and entry[0] == check_sum:
+            self.hits += 1
+            self._entries.move_to_end(path)
+            return entry[2].copy()
+
+        self.misses += 1
+        self.invalidate(path)
+        note = load(path)
+        if check_sum is not None and size <= self.max_bytes:
+            self._entries[path] = (check_sum, size, note)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.size -= evicted
+        return note.copy()
+
+    def invalidate(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """ The hits and misses so far, and the number of notes and bytes of note files currently held """
+        return {"hits": self.hits, "misses": self.misses, "notes": len(self._entries), "bytes": self.size}
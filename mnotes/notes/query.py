@@ -0,0 +1,343 @@
+"""
+    A small filter language over the indexed note metadata. A query such as
+
+        author:eva tag:project created>=2021-01-01 not title:none
+
+    is parsed into a tree of conditions, which is compiled once into plain predicate functions on NoteInfo along with
+    the access paths of the conditions that can be answered from the indices of the GlobalIndices (index, path prefix,
+    creation time, tags, state, IDs and links). Running the query fetches the candidates from the most selective usable
+    access path and checks them against the full predicate, falling back to a scan of every note when no condition can
+    use an index.
+
+    Conditions are written as field:value, with created also accepting the comparisons >, >=, < and <=. Conditions
+    next to each other must all match, and can be combined with 'and', 'or', 'not' and parentheses. Values containing
+    spaces are wrapped in double quotes.
+"""
+from __future__ import annotations
+
+import os
+import re
+import math
+from bisect import bisect_left
+from datetime import datetime as DateTime, timedelta as TimeDelta, tzinfo
+from dataclasses import dataclass
+from typing import List, Optional, Callable, Tuple, Iterable
+
+from .index import GlobalIndices
+from .markdown_notes import NoteInfo, MetaData
+
+# Fields matched case insensitively against part of their text, and the fields which only accept ':'
+TEXT_FIELDS = {"author", "title"}
+FIELDS = TEXT_FIELDS | {"id", "index", "path", "tag", "state", "backlink", "links", "created"}
+
+# The states a note can have in the global registry, which sets them from its ID when the note is registered
+QUERY_STATES = [MetaData.OK, MetaData.NO_ID, MetaData.CONFLICT]
+
+# The formats a date can be written in, shared with the 'list' command, with the interval of time each one covers
+DATE_FORMATS = [("%Y-%m-%d", TimeDelta(days=1)), ("%Y-%m-%d %H:%M", TimeDelta(minutes=1)),
+                ("%Y-%m-%dT%H:%M", TimeDelta(minutes=1)), ("%Y-%m-%d %H:%M:%S", TimeDelta(seconds=1)),
+                ("%Y-%m-%dT%H:%M:%S", TimeDelta(seconds=1))]
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\(|\))|([A-Za-z_]+)(:|>=|<=|>|<)("[^"]*"|[^\s()]*)|("[^"]*"|[^\s()]+))')
+
+Predicate = Callable[[NoteInfo], bool]
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass
+class Access:
+    """ A way to get the candidate notes for a condition from an index, with an estimate of how many there will be """
+    description: str
+    estimate: int
+    fetch: Callable[[], Iterable[str]]
+
+
+@dataclass
+class QueryPlan:
+    access: Optional[Access]  # The access path the candidates came from, or None for a scan of every note
+    considered: List[Access]  # Every usable access path for the query as a whole
+    candidates: int  # The number of notes which were checked against the predicate
+
+
+@dataclass
+class Condition:
+    field: str
+    op: str
+    value: str
+
+    def __str__(self):
+        value = f'"{self.value}"' if not self.value or " " in self.value else self.value
+        return f"{self.field}{self.op}{value}"
+
+
+@dataclass
+class Combined:
+    kind: str  # One of "and", "or", "not"
+    children: List
+
+    def __str__(self):
+        if self.kind == "not":
+            return f"not {self.children[0]}"
+        return "(" + f" {self.kind} ".join(str(c) for c in self.children) + ")"
+
+
+class CompiledQuery:
+    """ A parsed query compiled against a GlobalIndices, which has been loaded and must not change while it's used """
+
+    def __init__(self, text: str, indices: GlobalIndices, local_tz: tzinfo):
+        self.text = text
+        self.indices = indices
+        self.local_tz = local_tz
+        self.tree = _Parser(text).parse()
+        self.predicate, self._access = self._compile(self.tree)
+
+    def matches(self, note: NoteInfo) -> bool:
+        return self.predicate(note)
+
+    def run(self) -> Tuple[List[NoteInfo], QueryPlan]:
+        """ The notes matching the query in order of their paths, and the plan that was used to find them """
+        considered = self._access()
+        access = min(considered, key=lambda a: a.estimate) if considered else None
+        if access is None:
+            candidates = list(self.indices.by_path.values())
+        else:
+            candidates = [self.indices.by_path[p] for p in set(access.fetch()) if p in self.indices.by_path]
+
+        found = sorted(filter(self.predicate, candidates), key=lambda n: n.file_path)
+        return found, QueryPlan(access, considered, len(candidates))
+
+    def _compile(self, node) -> Tuple[Predicate, Callable[[], List[Access]]]:
+        """
+        Compile a node of the tree into its predicate and a function giving its usable access paths. Every access path
+        of an 'and' is usable since each one covers all of the matches, while an 'or' needs one from each of its
+        children and a 'not' can't use an index at all.
+        """
+        if isinstance(node, Condition):
+            return self._compile_condition(node)
+
+        compiled = [self._compile(c) for c in node.children]
+        predicates = [p for p, _ in compiled]
+
+        if node.kind == "not":
+            inner = predicates[0]
+            return (lambda n: not inner(n)), (lambda: [])
+
+        if node.kind == "and":
+            def access_and():
+                return [a for _, get in compiled for a in get()]
+            return (lambda n: all(p(n) for p in predicates)), access_and
+
+        def access_or():
+            best = []
+            for _, get in compiled:
+                options = get()
+                if not options:
+                    return []
+                best.append(min(options, key=lambda a: a.estimate))
+            fetches = [a.fetch for a in best]
+            return [Access(" + ".join(a.description for a in best), sum(a.estimate for a in best),
+                           lambda: {p for f in fetches for p in f()})]
+        return (lambda n: any(p(n) for p in predicates)), access_or
+
+    def _compile_condition(self, c: Condition) -> Tuple[Predicate, Callable[[], List[Access]]]:
+        indices = self.indices
+        value = c.value
+        lowered = value.lower()
+        none = lowered == "none"
+
+        if c.field in TEXT_FIELDS:
+            get = (lambda n: n.author) if c.field == "author" else (lambda n: n.title)
+            if none:
+                return (lambda n: not get(n)), _no_access
+            # The front matter can give these as other types, such as a number or a list, which are matched as text
+            return (lambda n: get(n) is not None and lowered in str(get(n)).lower()), _no_access
+
+        if c.field == "id":
+            if none:
+                return (lambda n: n.id is None), _no_access
+
+            def access_id():
+                notes = indices.conflicts.get(value, [indices.by_id[value]] if value in indices.by_id else [])
+                return [Access(f"id registry for {value}", len(notes), lambda: [n.file_path for n in notes])]
+            return (lambda n: n.id == value), access_id
+
+        if c.field == "index":
+            if value not in indices.indices:
+                raise QueryError(f"There is no index named '{value}'")
+            notes = indices.indices[value].notes
+            return (lambda n: n.file_path in notes), (lambda: [Access(f"index {value}", len(notes), notes.keys)])
+
+        if c.field == "path":
+            directory = os.path.abspath(value)
+            prefix = directory if directory.endswith(os.sep) else directory + os.sep
+
+            def access_path():
+                found = [n.file_path for index in indices.indices.values() for n in index.notes_in_path(directory)]
+                return [Access(f"sorted paths under {directory}", len(found), lambda: found)]
+            return (lambda n: n.file_path == directory or n.file_path.startswith(prefix)), access_path
+
+        if c.field == "tag":
+            if none:
+                return (lambda n: not n.tags), _no_access
+            tag = value.lstrip("#")
+
+            def access_tag():
+                notes = list(indices.by_tag.get(tag, {}).values())
+                return [Access(f"tag index for {tag}", len(notes), lambda: [n.file_path for n in notes])]
+            return (lambda n: tag in (n.tags or [])), access_tag
+
+        if c.field == "state":
+            state = next((s for s in QUERY_STATES if s.name.lower() == lowered), None)
+            if state is None:
+                names = ", ".join(s.name.lower() for s in QUERY_STATES)
+                raise QueryError(f"Unknown state '{value}', expected one of: {names}")
+
+            def access_state():
+                if state == MetaData.OK:
+                    notes = list(indices.by_id.values())
+                elif state == MetaData.CONFLICT:
+                    notes = [n for group in indices.conflicts.values() for n in group]
+                else:
+                    return []
+                return [Access(f"id registry for state {state.name.lower()}", len(notes),
+                               lambda: [n.file_path for n in notes])]
+            return (lambda n: n.state == state), access_state
+
+        if c.field == "backlink":
+            if lowered not in ("true", "false"):
+                raise QueryError(f"Expected true or false for backlink, not '{value}'")
+            wanted = lowered == "true"
+            return (lambda n: n.has_backlink == wanted), _no_access
+
+        if c.field == "links":
+            def access_links():
+                paths = [p for index in indices.indices.values() for p in index.linking_to(value)]
+                return [Access(f"reverse link index for {value}", len(paths), lambda: paths)]
+            return (lambda n: value in (n.links_to or [])), access_links
+
+        # The only field left is created, where the value covers an interval of time that depends on how precisely it
+        # was written, e.g. a date is a whole day. Each comparison is a half-open range [since, until) of that interval.
+        if none:
+            return (lambda n: n.created is None), _no_access
+        lo, hi = self._parse_time(value)
+        since, until = {":": (lo, hi), ">": (hi, None), ">=": (lo, None), "<": (None, lo), "<=": (None, hi)}[c.op]
+
+        start = None if since is None else math.floor(since.timestamp())
+        end = None if until is None else math.ceil(until.timestamp())
+
+        def in_range(n: NoteInfo) -> bool:
+            # Compared as epoch seconds the same way as the creation time index, so a naive creation time is read as
+            # local time rather than failing to compare with the zoned range
+            if n.created is None:
+                return False
+            second = math.floor(n.created.timestamp())
+            return (start is None or second >= start) and (end is None or second < end)
+
+        def access_created():
+            estimate = 0
+            for index in indices.indices.values():
+                first = 0 if start is None else bisect_left(index.created, (start,))
+                last = len(index.created) if end is None else bisect_left(index.created, (end,))
+                estimate += max(last - first, 0)
+            return [Access(f"creation time index for {c}", estimate,
+                           lambda: [p for index in indices.indices.values()
+                                    for _, p in index.created_between(start, end)])]
+        return in_range, access_created
+
+    def _parse_time(self, value: str) -> Tuple[DateTime, DateTime]:
+        for fmt, span in DATE_FORMATS:
+            try:
+                parsed = DateTime.strptime(value, fmt).replace(tzinfo=self.local_tz)
+                return parsed, parsed + span
+            except ValueError:
+                continue
+        raise QueryError(f"Could not read '{value}' as a date, expected YYYY-MM-DD with an optional HH:MM[:SS]")
+
+
+def _no_access() -> List[Access]:
+    return []
+
+
+class _Parser:
+    """ Recursive descent parser for the query text, where 'and' binds more tightly than 'or' """
+
+    def __init__(self, text: str):
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = _TOKEN_PATTERN.match(text, position)
+            if match is None or match.end() == position:
+                raise QueryError(f"Could not read the query at '{text[position:]}'")
+            position = match.end()
+
+            paren, field, op, value, word = match.groups()
+            if paren:
+                self.tokens.append(paren)
+            elif field:
+                self.tokens.append(self._condition(field.lower(), op, value.strip('"')))
+            else:
+                if word.lower() not in ("and", "or", "not"):
+                    raise QueryError(f"Expected a condition like field:value, not '{word}'")
+                self.tokens.append(word.lower())
+        self.position = 0
+
+    @staticmethod
+    def _condition(field: str, op: str, value: str) -> Condition:
+        if field not in FIELDS:
+            raise QueryError(f"Unknown field '{field}', expected one of: {', '.join(sorted(FIELDS))}")
+        if op != ":" and field != "created":
+            raise QueryError(f"The field '{field}' can only be matched with ':'")
+        if not value:
+            raise QueryError(f"Missing a value for '{field}'")
+        return Condition(field, op, value)
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("The query is empty")
+        tree = self._or()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected '{self.tokens[self.position]}' in the query")
+        return tree
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _or(self):
+        children = [self._and()]
+        while self._peek() == "or":
+            self.position += 1
+            children.append(self._and())
+        return children[0] if len(children) == 1 else Combined("or", children)
+
+    def _and(self):
+        children = [self._not()]
+        while self._peek() not in (None, "or", ")"):
+            if self._peek() == "and":
+                self.position += 1
+            children.append(self._not())
+        return children[0] if len(children) == 1 else Combined("and", children)
+
+    def _not(self):
+        if self._peek() == "not":
+            self.position += 1
+            return Combined("not", [self._not()])
+        return self._atom()
+
+    def _atom(self):
+        token = self._peek()
+        if token is None:
+            raise QueryError("The query ended early")
+        self.position += 1
+        if token == "(":
+            inner = self._or()
+            if self._peek() != ")":
+                raise QueryError("Missing a closing parenthesis")
+            self.position += 1
+            return inner
+        if isinstance(token, Condition):
+            return token
+        raise QueryError(f"Unexpected '{token}' in the query")
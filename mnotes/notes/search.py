@@ -0,0 +1,485 @@
+"""
+    Searching the body text of notes. The SearchIndex is a full text inverted index with positional postings which is
+    ranked with BM25, and the TrigramIndex narrows down substring and regular expression searches to the notes which
+    could possibly match. Both are a ContentIndex, so they are kept up to date incrementally by the IndexBuilder and are
+    stored separately from the index cache.
+"""
+from __future__ import annotations
+
+import re
+import sys
+import json
+import math
+import zlib
+import base64
+import operator
+from array import array
+from itertools import accumulate
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Set, Tuple, Union
+
+from .index import ContentIndex
+
+SEARCH_INDEX_VERSION = 1
+TRIGRAM_INDEX_VERSION = 1
+
+# BM25 parameters, the usual defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_QUERY_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+
+try:
+    from re import _parser as _sre_parse, _constants as _sre_constants
+except ImportError:  # Python versions before 3.11
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+_REPEATS = {_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT, getattr(_sre_constants, "POSSESSIVE_REPEAT", None)}
+
+# A query for the trigram index, which is either a single trigram or a tuple of ("and" | "or", [sub queries])
+TrigramQuery = Union[str, Tuple[str, List]]
+
+
+def tokenize(text: str) -> List[str]:
+    """ Split text into the lowercase word tokens which are indexed and searched for """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclass
+class SearchQuery:
+    """
+    A parsed search query. Every element is a phrase, which is a list of tokens that must appear consecutively in a
+    note, and a plain search term is just a phrase with a single token.
+    """
+    phrases: List[List[str]]
+
+    @staticmethod
+    def parse(text: str) -> SearchQuery:
+        """ Parse a query string in which phrases are wrapped in double quotes, e.g. 'bearing "part number" 4140' """
+        phrases = []
+        for quoted, plain in _QUERY_PATTERN.findall(text):
+            # An unquoted word like 'ball-bearing' tokenizes to more than one token, so it's also treated as a phrase
+            tokens = tokenize(quoted if quoted else plain)
+            if tokens:
+                phrases.append(tokens)
+        return SearchQuery(phrases)
+
+
+@dataclass
+class SearchResult:
+    path: str
+    score: float
+
+
+class SearchIndex(ContentIndex):
+    """
+    Positional inverted index over the body text of the notes in a NoteIndex. Notes are given dense integer document
+    numbers, and the postings for each term map document numbers to the token positions where the term occurs.
+
+    Postings are persisted per term as base64 encoded arrays of unsigned 32 bit integers ([doc, count, positions...]
+    for each document) and are only decoded when a term is first searched for, so loading the index and answering a
+    query only costs time in proportion to the terms involved. Adding a note appends its postings to the pending arrays
+    of terms which haven't been decoded, which are joined to the encoded arrays when saving, so an update doesn't need
+    to decode anything either. Removed notes leave a tombstone in the list of document paths, their postings are skipped
+    when searching and dropped the next time the term is decoded, and the document numbers are compacted when there are
+    more removed documents than live ones.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.paths: List[Optional[str]] = kwargs.get("paths", [])
+        self.lengths: List[int] = kwargs.get("lengths", [])
+        self.docs: Dict[str, int] = {p: i for i, p in enumerate(self.paths) if p is not None}
+        self.total_length: int = sum(self.lengths)
+
+        self._encoded: Dict[str, str] = kwargs.get("postings", {})
+        self._pending: Dict[str, array] = {}
+        self._decoded: Dict[str, Dict[int, array]] = {}
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.docs)
+
+    @property
+    def terms(self) -> Set[str]:
+        return set(self._encoded.keys()) | set(self._pending.keys()) | set(self._decoded.keys())
+
+    def postings(self, term: str) -> Dict[int, array]:
+        """ Get the postings of a term, mapping live document numbers to the positions of the term in the document """
+        if term in self._decoded:
+            return self._decoded[term]
+        if term not in self._encoded and term not in self._pending:
+            return {}
+
+        values = _from_little_endian(base64.b64decode(self._encoded.pop(term, "")))
+        values.extend(self._pending.pop(term, array("I")))
+
+        decoded: Dict[int, array] = {}
+        i = 0
+        while i < len(values):
+            doc, count = values[i], values[i + 1]
+            if self.paths[doc] is not None:
+                decoded[doc] = values[i + 2:i + 2 + count]
+            i += 2 + count
+
+        self._decoded[term] = decoded
+        return decoded
+
+    def phrase_postings(self, phrase: List[str]) -> Dict[int, int]:
+        """ Find the live documents containing a phrase, mapped to the number of times the phrase occurs in each """
+        if not phrase:
+            return {}
+
+        first = self.postings(phrase[0])
+        if len(phrase) == 1:
+            return {d: len(p) for d, p in first.items() if self.paths[d] is not None}
+
+        rest = [self.postings(t) for t in phrase[1:]]
+        candidates = [d for d in first.keys() if self.paths[d] is not None and all(d in r for r in rest)]
+
+        results = {}
+        for doc in candidates:
+            following = [set(r[doc]) for r in rest]
+            count = sum(1 for p in first[doc] if all(p + i + 1 in s for i, s in enumerate(following)))
+            if count:
+                results[doc] = count
+        return results
+
+    def search(self, query: str, limit: Optional[int] = 20, match_all: bool = True) -> List[SearchResult]:
+        """ Search only this index, see search_indices """
+        return search_indices([self], query, limit, match_all)
+
+    def _add(self, path: str, body: str):
+        doc = len(self.paths)
+        self.paths.append(path)
+        self.docs[path] = doc
+
+        tokens = tokenize(body)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+        positions: Dict[str, List[int]] = {}
+        for i, token in enumerate(tokens):
+            if token not in positions:
+                positions[token] = []
+            positions[token].append(i)
+
+        for term, term_positions in positions.items():
+            if term in self._decoded:
+                self._decoded[term][doc] = array("I", term_positions)
+            else:
+                if term not in self._pending:
+                    self._pending[term] = array("I")
+                self._pending[term].append(doc)
+                self._pending[term].append(len(term_positions))
+                self._pending[term].extend(term_positions)
+
+    def _remove(self, path: str):
+        doc = self.docs.pop(path)
+        self.paths[doc] = None
+        self.total_length -= self.lengths[doc]
+        self.lengths[doc] = 0
+
+    def _compact(self):
+        """ Decode every term to drop the postings of removed documents, then renumber the live documents densely """
+        for term in list(self._encoded.keys()) + list(self._pending.keys()):
+            self.postings(term)
+
+        renumber = {}
+        paths, lengths = [], []
+        for doc, path in enumerate(self.paths):
+            if path is not None:
+                renumber[doc] = len(paths)
+                paths.append(path)
+                lengths.append(self.lengths[doc])
+
+        for term in list(self._decoded.keys()):
+            postings = {renumber[d]: p for d, p in self._decoded[term].items() if d in renumber}
+            if postings:
+                self._decoded[term] = postings
+            else:
+                del self._decoded[term]
+
+        self.paths = paths
+        self.lengths = lengths
+        self.docs = {p: i for i, p in enumerate(paths)}
+
+    def serialize(self) -> str:
+        if len(self.paths) - len(self.docs) > len(self.docs):
+            self._compact()
+
+        postings = dict(self._encoded)
+        for term, pending in self._pending.items():
+            joined = base64.b64decode(postings.get(term, "")) + _to_little_endian(pending)
+            postings[term] = base64.b64encode(joined).decode("ascii")
+
+        for term, decoded in self._decoded.items():
+            values = array("I")
+            for doc, positions in decoded.items():
+                if self.paths[doc] is not None:
+                    values.append(doc)
+                    values.append(len(positions))
+                    values.extend(positions)
+            if values:
+                postings[term] = base64.b64encode(_to_little_endian(values)).decode("ascii")
+
+        output = {
+            "version": SEARCH_INDEX_VERSION,
+            "checksums": self.checksums,
+            "paths": self.paths,
+            "lengths": self.lengths,
+            "postings": postings
+        }
+        return json.dumps(output)
+
+    @staticmethod
+    def deserialize(encoded: str) -> SearchIndex:
+        dict_data = json.loads(encoded)
+        if dict_data.pop("version", None) != SEARCH_INDEX_VERSION:
+            return SearchIndex()
+        return SearchIndex(**dict_data)
+
+
+class TrigramIndex(ContentIndex):
+    """
+    Index of the three character sequences (trigrams) in the body text of the notes in a NoteIndex, which is used to
+    narrow a substring or regular expression search down to the notes which contain every trigram the pattern requires,
+    so that only those notes need to be read and checked. Trigrams are taken from the case folded text, so the same
+    index serves both case sensitive and insensitive searches.
+
+    Notes are given dense document numbers in the same way as the SearchIndex, with removed notes left as tombstones
+    until the document numbers are compacted. The sorted document numbers for each trigram are persisted as delta
+    encoded, zlib compressed arrays and are only decoded when a search needs them, while the documents added since the
+    index was loaded are kept in pending arrays which are joined to the encoded ones when saving.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.paths: List[Optional[str]] = kwargs.get("paths", [])
+        self.docs: Dict[str, int] = {p: i for i, p in enumerate(self.paths) if p is not None}
+
+        self._encoded: Dict[str, str] = kwargs.get("trigrams", {})
+        self._pending: Dict[str, array] = {}
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.docs)
+
+    def doc_ids(self, trigram: str) -> array:
+        """ Get the sorted document numbers of the documents containing a trigram, including removed documents """
+        values = array("I")
+        if trigram in self._encoded:
+            deltas = _from_little_endian(zlib.decompress(base64.b64decode(self._encoded[trigram])))
+            values = array("I", accumulate(deltas))
+        if trigram in self._pending:
+            values.extend(self._pending[trigram])
+        return values
+
+    def candidates(self, query: Optional[TrigramQuery]) -> Optional[Set[int]]:
+        """ Evaluate a trigram query to a set of document numbers, or None if the query could match any document """
+        if query is None:
+            return None
+        if isinstance(query, str):
+            return set(self.doc_ids(query))
+
+        operation, parts = query
+        results = [self.candidates(q) for q in parts]
+        if operation == "or":
+            if any(r is None for r in results):
+                return None
+            return set().union(*results)
+
+        results = sorted((r for r in results if r is not None), key=len)
+        if not results:
+            return None
+        matched = results[0]
+        for r in results[1:]:
+            if not matched:
+                break
+            matched = matched & r
+        return matched
+
+    def candidate_paths(self, pattern: str, flags: int = 0) -> List[str]:
+        """
+        Find the paths of the notes which could contain a match for a regular expression, which will be every note in
+        the index if the pattern doesn't require any particular trigram (like '\\d+' or 'ab'). The notes still need to
+        be checked, as containing the trigrams doesn't guarantee a match.
+        """
+        matched = self.candidates(regex_trigrams(pattern, flags))
+        if matched is None:
+            return sorted(self.docs.keys())
+        return sorted(self.paths[d] for d in matched if self.paths[d] is not None)
+
+    def _add(self, path: str, body: str):
+        doc = len(self.paths)
+        self.paths.append(path)
+        self.docs[path] = doc
+
+        text = body.casefold()
+        for trigram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            if trigram not in self._pending:
+                self._pending[trigram] = array("I")
+            self._pending[trigram].append(doc)
+
+    def _remove(self, path: str):
+        doc = self.docs.pop(path)
+        self.paths[doc] = None
+
+    def _compact(self):
+        renumber = array("I", [0] * len(self.paths))
+        paths = []
+        for doc, path in enumerate(self.paths):
+            if path is not None:
+                renumber[doc] = len(paths)
+                paths.append(path)
+
+        for trigram in set(self._encoded.keys()) | set(self._pending.keys()):
+            values = array("I", (renumber[d] for d in self.doc_ids(trigram) if self.paths[d] is not None))
+            self._encoded.pop(trigram, None)
+            self._pending.pop(trigram, None)
+            if values:
+                self._pending[trigram] = values
+
+        self.paths = paths
+        self.docs = {p: i for i, p in enumerate(paths)}
+
+    def serialize(self) -> str:
+        if len(self.paths) - len(self.docs) > len(self.docs):
+            self._compact()
+
+        trigrams = dict(self._encoded)
+        for trigram, pending in self._pending.items():
+            if trigram in trigrams:
+                deltas = _from_little_endian(zlib.decompress(base64.b64decode(trigrams[trigram])))
+                last = sum(deltas)
+            else:
+                deltas, last = array("I"), 0
+            deltas.append(pending[0] - last)
+            deltas.extend(map(operator.sub, pending[1:], pending[:-1]))
+            trigrams[trigram] = base64.b64encode(zlib.compress(_to_little_endian(deltas), 1)).decode("ascii")
+
+        output = {
+            "version": TRIGRAM_INDEX_VERSION,
+            "checksums": self.checksums,
+            "paths": self.paths,
+            "trigrams": trigrams
+        }
+        return json.dumps(output)
+
+    @staticmethod
+    def deserialize(encoded: str) -> TrigramIndex:
+        dict_data = json.loads(encoded)
+        if dict_data.pop("version", None) != TRIGRAM_INDEX_VERSION:
+            return TrigramIndex()
+        return TrigramIndex(**dict_data)
+
+
+def regex_trigrams(pattern: str, flags: int = 0) -> Optional[TrigramQuery]:
+    """
+    Work out which trigrams a piece of text must contain in order to match a regular expression, as a query for the
+    TrigramIndex. Every run of three or more literal characters in the pattern contributes its trigrams, alternations
+    become an "or" of their branches, and groups and repetitions which must match at least once contribute the
+    trigrams of their contents. Anything else is treated as matching any text, so the query is always a superset of the
+    real matches. Returns None if the pattern doesn't require any trigrams at all.
+    """
+    return _trigram_query(_sre_parse.parse(pattern, flags))
+
+
+def _trigram_query(parsed) -> Optional[TrigramQuery]:
+    required: List[TrigramQuery] = []
+    run: List[str] = []
+
+    def flush():
+        if len(run) >= 3:
+            text = "".join(run).casefold()
+            required.extend(sorted({text[i:i + 3] for i in range(len(text) - 2)}))
+        run.clear()
+
+    for op, av in parsed:
+        if op is _sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+
+        if op in _REPEATS:
+            low, high, sub = av
+            if low == high and len(sub) == 1 and sub[0][0] is _sre_constants.LITERAL:
+                # A fixed repetition of a single character like 'x{3}' is the same as writing the character out
+                run.extend(chr(sub[0][1]) * low)
+                continue
+
+        flush()
+        if op is _sre_constants.SUBPATTERN:
+            sub_query = _trigram_query(av[-1])
+            if sub_query is not None:
+                required.append(sub_query)
+        elif op is _sre_constants.BRANCH:
+            branches = [_trigram_query(b) for b in av[1]]
+            if all(b is not None for b in branches):
+                required.append(("or", branches))
+        elif op in _REPEATS and av[0] >= 1:
+            sub_query = _trigram_query(av[2])
+            if sub_query is not None:
+                required.append(sub_query)
+
+    flush()
+    if not required:
+        return None
+    return required[0] if len(required) == 1 else ("and", required)
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(data: bytes) -> array:
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def search_indices(indices: List[SearchIndex], query: str, limit: Optional[int] = 20,
+                   match_all: bool = True) -> List[SearchResult]:
+    """
+    Search one or more indices and rank the matching notes with BM25. The document frequencies and average document
+    length are computed across all of the indices together, so that the scores are comparable between them.
+
+    :param indices: the search indices to query
+    :param query: the query string, see SearchQuery.parse
+    :param limit: the maximum number of results to return, or None for all of them
+    :param match_all: if True a note must contain every term and phrase in the query to match, otherwise a note which
+    contains any of them will match
+    :return: the matching notes, from the highest score to the lowest
+    """
+    phrases = SearchQuery.parse(query).phrases
+    doc_count = sum(i.doc_count for i in indices)
+    if not phrases or not doc_count:
+        return []
+
+    average_length = sum(i.total_length for i in indices) / doc_count
+    matches = [[index.phrase_postings(phrase) for phrase in phrases] for index in indices]
+
+    results = []
+    for index, index_matches in zip(indices, matches):
+        scores: Dict[int, float] = {}
+        hits: Dict[int, int] = {}
+        for k, phrase_matches in enumerate(index_matches):
+            frequency = sum(len(m[k]) for m in matches)
+            idf = math.log(1 + (doc_count - frequency + 0.5) / (frequency + 0.5))
+            for doc, count in phrase_matches.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * index.lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * count * (BM25_K1 + 1) / (count + norm)
+                hits[doc] = hits.get(doc, 0) + 1
+
+        for doc, score in scores.items():
+            if not match_all or hits[doc] == len(phrases):
+                results.append(SearchResult(index.paths[doc], score))
+
+    results.sort(key=lambda r: (-r.score, r.path))
+    return results if limit is None else results[:limit]
@@ -0,0 +1,100 @@
+"""
+    Fuzzy lookup of notes by their titles
+"""
+from __future__ import annotations
+
+import re
+import heapq
+from collections import Counter
+from itertools import chain
+from dataclasses import dataclass
+from typing import List, Dict, Set
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def title_grams(text: str) -> Set[str]:
+    """
+    The set of character trigrams of the words in a title, lowercased. Each word is padded with a space on either side so
+    that its start and end form trigrams of their own and short words like 'q3' still produce trigrams. Two spaces of
+    padding in front would give every word a trigram for its first letter alone, which matches a large fraction of all
+    titles and makes candidate generation slow without improving the ranking much.
+    """
+    grams = set()
+    for word in _WORD_PATTERN.findall(text.lower()):
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class TitleMatch:
+    path: str
+    title: str
+    score: float
+
+
+class TitleIndex:
+    """
+    Inverted index from the trigrams of note titles to the paths of the notes. A query is answered by counting the
+    trigrams each title shares with the query through the postings, which generates the candidates without looking at
+    the titles which share nothing, and then ranking the candidates by the Dice coefficient of the two trigram sets.
+    Word order and small typos have little effect on the score.
+    """
+
+    def __init__(self):
+        self.titles: Dict[str, str] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+
+    def add(self, path: str, title: str):
+        """
+        Add or replace the title of the note at the given path. A title the front matter gave as some other type, such
+        as a number, is indexed as its text.
+        """
+        self.remove(path)
+        title = str(title)
+        grams = title_grams(title)
+        if not grams:
+            return
+
+        self.titles[path] = title
+        self._gram_counts[path] = len(grams)
+        postings = self.postings
+        for gram in grams:
+            if gram not in postings:
+                postings[gram] = set()
+            postings[gram].add(path)
+
+    def remove(self, path: str):
+        """ Remove the note at the given path from the index if it's present """
+        title = self.titles.pop(path, None)
+        if title is None:
+            return
+
+        del self._gram_counts[path]
+        for gram in title_grams(title):
+            paths = self.postings.get(gram, None)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.postings[gram]
+
+    def find(self, query: str, limit: int = 10, threshold: float = 0.2) -> List[TitleMatch]:
+        """ The best matching titles for the query with a score of at least the threshold, best first """
+        grams = title_grams(query)
+        if not grams:
+            return []
+
+        # Counting across the chained postings keeps the tally of the shared trigrams out of the interpreter loop
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+
+        scored = []
+        counts = self._gram_counts
+        for path, count in shared.items():
+            score = 2.0 * count / (len(grams) + counts[path])
+            if score >= threshold:
+                scored.append((score, path))
+
+        best = heapq.nsmallest(limit, scored, key=lambda x: (-x[0], x[1]))
+        return [TitleMatch(path, self.titles[path], score) for score, path in best]
@@ -4,45 +4,233 @@
 from __future__ import annotations
 
 import abc
-from copy import deepcopy
+from copy import copy
 from enum import Enum
 from dataclasses import dataclass
-from typing import Callable, List, Set, Tuple, Optional, Dict
+from bisect import bisect_right
+from datetime import datetime as DateTime, timedelta as TimeDelta, tzinfo
+from itertools import chain
+from typing import Callable, List, Set, Tuple, Optional, Dict, Iterable
 from mnotes.notes.markdown_notes import NoteInfo, Note
 
 
+class SecondRuns:
+    """
+    A set of whole seconds kept as sorted runs of consecutive seconds, so that the first second at or after a given one
+    which isn't in the set is found with a single bisection no matter how many seconds in a row are taken.
+    """
+
+    def __init__(self, seconds: Iterable[int] = ()):
+        # The first and last second of each run, where runs never touch since neighbouring runs are merged
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._merge(seconds)
+
+    def __contains__(self, second: int) -> bool:
+        return self._run_of(second) >= 0
+
+    def _run_of(self, second: int) -> int:
+        """ Position of the run containing the second, or -1 if it's free """
+        i = bisect_right(self._starts, second) - 1
+        return i if i >= 0 and self._ends[i] >= second else -1
+
+    def _merge(self, seconds: Iterable[int]):
+        """ Add many seconds at once, rebuilding the runs in one pass rather than inserting them one at a time """
+        runs = sorted(chain(zip(self._starts, self._ends), ((s, s) for s in seconds)))
+        self._starts, self._ends = [], []
+        for start, end in runs:
+            if self._ends and start <= self._ends[-1] + 1:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def add_second(self, second: int):
+        if self._run_of(second) >= 0:
+            return
+
+        i = bisect_right(self._starts, second)
+        joins_before = i > 0 and self._ends[i - 1] == second - 1
+        joins_after = i < len(self._starts) and self._starts[i] == second + 1
+        if joins_before and joins_after:
+            self._ends[i - 1] = self._ends[i]
+            del self._starts[i]
+            del self._ends[i]
+        elif joins_before:
+            self._ends[i - 1] = second
+        elif joins_after:
+            self._starts[i] = second
+        else:
+            self._starts.insert(i, second)
+            self._ends.insert(i, second)
+
+    def remove_second(self, second: int):
+        i = self._run_of(second)
+        if i < 0:
+            return
+
+        start, end = self._starts[i], self._ends[i]
+        if start == end:
+            del self._starts[i]
+            del self._ends[i]
+        elif second == start:
+            self._starts[i] = second + 1
+        elif second == end:
+            self._ends[i] = second - 1
+        else:
+            self._ends[i] = second - 1
+            self._starts.insert(i + 1, second + 1)
+            self._ends.insert(i + 1, end)
+
+    def next_free_second(self, second: int) -> int:
+        """ The first second at or after the given one which isn't in the set """
+        i = self._run_of(second)
+        return second if i < 0 else self._ends[i] + 1
+
+
+class IdAllocator(SecondRuns):
+    """
+    The occupied IDs which are times (see ID_TIME_FORMAT) kept as runs of the seconds they show, so the first free ID
+    at or after a time is found with a single bisection. IDs which aren't valid times can never be made from a time, so
+    they're ignored.
+
+    Creation times of existing notes can also be blocked (see block_created), since a new ID shouldn't reuse one of
+    them either. Blocked seconds stay taken when an ID with the same time is removed.
+    """
+
+    def __init__(self, ids: Iterable[str]):
+        super().__init__(s for s in map(_id_seconds, ids) if s is not None)
+        self._blocked: Set[int] = set()
+        self._blocked_zones: List[Optional[tzinfo]] = []
+
+    def add(self, id_: str):
+        second = _id_seconds(id_)
+        if second is not None:
+            self.add_second(second)
+
+    def remove(self, id_: str):
+        second = _id_seconds(id_)
+        if second is not None and second not in self._blocked:
+            self.remove_second(second)
+
+    def block_created(self, epochs: Callable[[], Iterable[int]], zone: Optional[tzinfo]):
+        """
+        Block the creation times of existing notes, given as epoch seconds, as the times an ID made in the given zone
+        would show. The epochs are only fetched and merged the first time a zone is blocked, so this is cheap to call
+        before every allocation.
+        """
+        if zone in self._blocked_zones:
+            return
+        self._blocked_zones.append(zone)
+        seconds = {_time_seconds(DateTime.fromtimestamp(e, zone)) for e in epochs()}
+        self._blocked.update(seconds)
+        self._merge(seconds)
+
+    def next_free(self, time: DateTime) -> DateTime:
+        """ The first time at or after the given one, in whole seconds, whose ID isn't taken """
+        second = _time_seconds(time)
+        return time + TimeDelta(seconds=self.next_free_second(second) - second)
+
+
+def _time_seconds(time: DateTime) -> int:
+    """ Seconds since the start of the calendar of the wall clock time, the same time that an ID made from it shows """
+    return time.toordinal() * 86400 + time.hour * 3600 + time.minute * 60 + time.second
+
+
+def _id_seconds(id_: str) -> Optional[int]:
+    if len(id_) != 14 or not id_.isdigit():
+        return None
+    try:
+        return _time_seconds(DateTime(int(id_[0:4]), int(id_[4:6]), int(id_[6:8]), int(id_[8:10]), int(id_[10:12]),
+                                      int(id_[12:14])))
+    except ValueError:
+        return None
+
+
+class IdOverlay:
+    """
+    A set of IDs layered over a base set which it never modifies, keeping only the IDs added and removed on top of it.
+    Supports the parts of the set interface that a ChangeTransaction uses, and an IdAllocator of the IDs which is built
+    on first use and kept up to date from then on.
+    """
+
+    def __init__(self, base: Set[str]):
+        self.base = base
+        self.added: Set[str] = set()
+        self.removed: Set[str] = set()
+        self._allocator: Optional[IdAllocator] = None
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self.added or (id_ in self.base and id_ not in self.removed)
+
+    @property
+    def allocator(self) -> IdAllocator:
+        if self._allocator is None:
+            self._allocator = IdAllocator(chain(self.added, (i for i in self.base if i not in self.removed)))
+        return self._allocator
+
+    def add(self, id_: str):
+        self.removed.discard(id_)
+        if id_ not in self.base:
+            self.added.add(id_)
+        if self._allocator is not None:
+            self._allocator.add(id_)
+
+    def remove(self, id_: str):
+        if id_ not in self:
+            raise KeyError(id_)
+        if id_ in self.added:
+            self.added.remove(id_)
+        else:
+            self.removed.add(id_)
+        if self._allocator is not None:
+            self._allocator.remove(id_)
+
+
 class ChangeTransaction:
     """
     The ChangeTransaction is an entirely in-memory representation of a set of changes to a global corpus of notes. It
     tracks the state of what has changed by its original filename.  All changes need to be checked against the
     transaction itself and not against the actual state on the filesystem, since changes set to occur before any
     specific change may alter the same note.
+
+    The transaction is a sparse overlay on the index: it only holds the notes which have been changed, and looks
+    everything else up through the functions it's given, so creating one and checking a change against it take the
+    same time no matter how many notes there are.
     """
 
-    def __init__(self, ids: Set[str], paths: List[str], get_note_by_file: Callable[[str], Optional[Note]],
+    def __init__(self, ids: Set[str], is_known_path: Callable[[str], bool],
+                 get_note_by_file: Callable[[str], Optional[Note]],
                  get_note_info_by_file: Callable[[str], Optional[NoteInfo]]):
+        self._is_known_path = is_known_path
         self._get_note_from_index = get_note_by_file
         self._get_note_info_from_index = get_note_info_by_file
 
-        # Note data mapped to the *original* file path that the note was at. If the note data is None, it means the
-        # transaction doesn't affect this note
-        self.by_path: Dict[str, Optional[Note]] = {}
+        # Updated note data mapped to the *original* file path that the note was at, only for the notes which the
+        # transaction changes
+        self.by_path: Dict[str, Note] = {}
 
-        # Note new path mapped to the note *original* path. If the two are equal, the note is not being moved. Checking
-        # for a conflict in the file names involves checking for a conflict against the *values*, not the keys
+        # Note new path mapped to the note *original* path, only for the notes which the transaction changes. If the
+        # two are equal, the note is not being moved
         self.file_moves: Dict[str, str] = {}
 
-        # This needs to be set externally when this object is created
-        self.ids: Set[str] = ids
+        # The original path of each note being moved mapped by the path it's being moved to, so that a path can be
+        # checked for a conflict without looking through every move
+        self._destinations: Dict[str, str] = {}
 
-        # Construct the by_path and file_moves dictionaries
-        for path in paths:
-            self.file_moves[path] = path
-            self.by_path[path] = None
+        # The IDs in the index along with the changes made to them by the transaction, which leaves the given set as
+        # it is
+        self.ids: IdOverlay = IdOverlay(ids)
+
+    def _check_known(self, original_path: str):
+        if original_path not in self.by_path and not self._is_known_path(original_path):
+            raise KeyError(f"File {original_path} was not found as a known file in the index")
 
     def _path_conflict(self, path: str) -> bool:
-        # TODO: this can probably be cached when updated
-        return path in set(self.file_moves.values())
+        """ A path conflicts if a note is being moved to it, or a file is there and isn't being moved away """
+        if path in self._destinations:
+            return True
+        return self.file_moves.get(path, path) == path and self._is_known_path(path)
 
     def verify(self, original_path: str, update: Note) -> bool:
         original = self.get_note_info_state(original_path)
@@ -59,29 +247,34 @@ class ChangeTransaction:
         return True
 
     def get_note_info_state(self, original_path: str) -> Optional[NoteInfo]:
-        """ Get the note information """
+        """
+        Get the note information at this stage in the transaction, as a shallow copy whose fields can be assigned
+        without changing the transaction or the index. The lists inside of it are shared and must not be modified in
+        place.
+        """
+        self._check_known(original_path)
         if original_path not in self.by_path:
-            raise KeyError(f"File {original_path} was not found as a known file in the index")
-
-        if self.by_path[original_path] is None:
             # This is the first time we're touching this file in the transaction
-            return deepcopy(self._get_note_info_from_index(original_path))
+            return copy(self._get_note_info_from_index(original_path))
 
-        return deepcopy(self.by_path[original_path].info)
+        return copy(self.by_path[original_path].info)
 
     def get_note_state(self, original_path: str) -> Optional[Note]:
         """
         Get the state of a note at this particular stage in the transaction. We'll refer to the note by the original
         filename before any renames occur.
+
+        The note is a copy-on-write view (see Note.copy): its info is copied, while its content and front matter are
+        shared with the state it came from, since a change replaces them rather than modifying them. This keeps fixers
+        which look at every note in a large batch from duplicating the whole note on every call.
         """
+        self._check_known(original_path)
         if original_path not in self.by_path:
-            raise KeyError(f"File {original_path} was not found as a known file in the index")
-
-        if self.by_path[original_path] is None:
             # This is the first time we're touching this file in the transaction
-            return deepcopy(self._get_note_from_index(original_path))
+            note = self._get_note_from_index(original_path)
+            return note.copy() if note is not None else None
 
-        return deepcopy(self.by_path[original_path])
+        return self.by_path[original_path].copy()
 
     def add_change(self, original_path: str, update: Note):
         if not self.verify(original_path, update):
@@ -96,9 +289,12 @@ class ChangeTransaction:
                 self.ids.remove(original.id)
             self.ids.add(update.info.id)
 
-        # Verify that the file path does not collide
+        # Move the note's destination, if it had one, to its new path
         if original.file_path != update.info.file_path:
-            self.file_moves[original_path] = update.info.file_path
+            self._destinations.pop(self.file_moves.get(original_path, original_path), None)
+            if update.info.file_path != original_path:
+                self._destinations[update.info.file_path] = original_path
+        self.file_moves[original_path] = update.info.file_path
 
         self.by_path[original_path] = update
 
@@ -6,7 +6,9 @@ from __future__ import annotations
 
 import os
 import shutil
+import stat
 import abc
+import tempfile
 from datetime import datetime as DateTime
 from dataclasses import dataclass, asdict
 from typing import List, Optional, Callable, Dict, TextIO, Tuple
@@ -17,6 +19,23 @@ def _always_true(x):
     return True
 
 
+def _current_umask() -> int:
+    # The umask can only be read by setting it, so this is done once when the module is loaded rather than while other
+    # threads may be creating files
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# The permissions a newly created file gets from open(), which files created with mkstemp are given as well
+NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+
+def text_checksum(text: str) -> str:
+    """ The checksum FileSystemProvider.checksum gives for a file which was written with the given text """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
 @dataclass
 class FileInfo:
     directory: str
@@ -68,12 +87,39 @@ class FileSystemProvider(abc.ABC):
     def checksum(self, path: str) -> str:
         pass
 
+    def file_info(self, path: str) -> FileInfo:
+        """ The FileInfo of a single file, as get_all would give it, without the checksum """
+        pass
+
     def move_file(self, source: str, dest: str):
         pass
 
     def file_c_time(self, file_path: str) -> Tuple[DateTime, bool]:
         pass
 
+    def stage_file(self, path: str, content: str, mode_from: Optional[str] = None) -> str:
+        """
+        Write the content to a new temporary file next to the path, returning the path of the temporary file. The file
+        takes its permissions from mode_from if it's given, otherwise from the path, and if neither exists it gets the
+        permissions of a newly created file.
+        """
+        pass
+
+    def sync_files(self, paths: List[str]):
+        """ Flush the contents of the files all the way to the storage device """
+        pass
+
+    def replace_file(self, source: str, dest: str):
+        """ Atomically replace the destination file with the source, overwriting it if it exists """
+        pass
+
+    def link_file(self, source: str, dest: str):
+        """ Make the destination a second name for the source file, or a copy of it if links aren't supported """
+        pass
+
+    def remove_file(self, path: str):
+        pass
+
 
 class FileSystem(FileSystemProvider):
     """ Concrete implementation of a cross-platform FileSystemProvider based on Python's os and shutil module. """
@@ -107,6 +153,12 @@ class FileSystem(FileSystemProvider):
                 sha.update(data)
         return sha.hexdigest()
 
+    def file_info(self, path: str) -> FileInfo:
+        file_path = os.path.abspath(path)
+        directory, file_name = os.path.split(file_path)
+        f_stat = os.stat(file_path)
+        return FileInfo(directory, file_name, f_stat.st_mtime, f_stat.st_size)
+
     def move_file(self, source: str, dest: str):
         if os.path.exists(dest):
             raise FileExistsError(f"The file {dest} already exists! Aborting rather than overwrite")
@@ -125,3 +177,44 @@ class FileSystem(FileSystemProvider):
         except AttributeError:
             c_time = DateTime.fromtimestamp(f_stat.st_mtime)
         return c_time, False
+
+    def stage_file(self, path: str, content: str, mode_from: Optional[str] = None) -> str:
+        directory, file_name = os.path.split(path)
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", prefix=f".{file_name}.", dir=directory)
+        try:
+            # Written as exactly the UTF-8 bytes of the content, so the file's checksum matches text_checksum(content)
+            with os.fdopen(handle, "w", encoding="utf-8", newline="") as temp:
+                temp.write(content)
+            # mkstemp creates the file readable only by its owner, so the note keeps the permissions of the file it
+            # replaces or was moved from
+            source = mode_from if mode_from is not None else path
+            if os.path.exists(source):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(source).st_mode))
+            else:
+                os.chmod(temp_path, NEW_FILE_MODE)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path
+
+    def sync_files(self, paths: List[str]):
+        for path in paths:
+            handle = os.open(path, os.O_RDWR)
+            try:
+                os.fsync(handle)
+            finally:
+                os.close(handle)
+
+    def replace_file(self, source: str, dest: str):
+        os.replace(source, dest)
+
+    def link_file(self, source: str, dest: str):
+        try:
+            os.link(source, dest)
+        except FileExistsError:
+            raise
+        except OSError:
+            shutil.copy2(source, dest)
+
+    def remove_file(self, path: str):
+        os.remove(path)
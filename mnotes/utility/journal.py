@@ -0,0 +1,166 @@
+"""
+    Applying a set of file changes as a unit: the new contents are all staged first, then renamed into place while a
+    journal records every step, so that a failure at any point can be rolled back to leave the files as they were. The
+    original files stay in place until they're replaced, so a process which dies part way through never leaves a note
+    missing from both its old and new paths.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .file_system import FileSystemProvider
+from .writer import ParallelWriter
+
+# A file to change: its current path, the path it will have afterwards, and the function which renders its content
+FileChange = Tuple[str, str, Callable[[], str]]
+
+
+class ApplyError(Exception):
+    """
+    Applying a set of file changes failed and was rolled back. The failures are the files (or steps) which failed, and
+    the rollback failures are any files which couldn't be restored, which is only empty if the rollback was complete.
+    """
+
+    def __init__(self, message: str, failures: List[Tuple[str, Exception]],
+                 rollback_failures: List[Tuple[str, Exception]]):
+        super().__init__(message)
+        self.failures = failures
+        self.rollback_failures = rollback_failures
+
+
+@dataclass
+class JournalEntry:
+    # "backup" when an existing file was linked to a backup, "commit" when a staged file was moved into place, and
+    # "remove" when an original file which nothing replaces was removed
+    action: str
+    path: str
+    backup: Optional[str] = None
+
+
+class Journal:
+    """
+    Record of the steps taken while committing staged files. Every existing file which will be overwritten or moved
+    away is first linked to a backup next to it, which leaves the file itself in place. Each staged file is then renamed
+    over its destination, so a path always holds either its old or its new file, and the originals which were moved
+    away are removed last. Undoing the entries in reverse removes the new files and puts the backups back over the
+    changed paths, and once everything has been committed the backups are removed.
+    """
+
+    def __init__(self, provider: FileSystemProvider):
+        self.provider = provider
+        self.entries: List[JournalEntry] = []
+        self.backups: Dict[str, str] = {}
+
+    def backup(self, path: str):
+        directory, file_name = os.path.split(path)
+        backup = os.path.join(directory, f".{file_name}.{uuid.uuid4().hex[:12]}.bak")
+        self.provider.link_file(path, backup)
+        self.backups[path] = backup
+        self.entries.append(JournalEntry("backup", path, backup))
+
+    def commit(self, temp_path: str, path: str):
+        # A file is only overwritten when it has been backed up, anything else already at a new path is left alone
+        backup = self.backups.get(path, None)
+        if backup is not None:
+            self.provider.replace_file(temp_path, path)
+        else:
+            self.provider.move_file(temp_path, path)
+        self.entries.append(JournalEntry("commit", path, backup))
+
+    def remove(self, path: str):
+        self.provider.remove_file(path)
+        self.entries.append(JournalEntry("remove", path, self.backups[path]))
+
+    def rollback(self) -> List[Tuple[str, Exception]]:
+        """
+        Undo every entry in reverse order, returning the paths which couldn't be restored. The backup of a path which
+        couldn't be restored is kept, since it's then the only copy of the original file.
+        """
+        failures = []
+        kept = set()
+        while self.entries:
+            entry = self.entries.pop()
+            if entry.action == "backup":
+                if entry.backup not in kept:
+                    self._discard(entry.backup)
+                continue
+            try:
+                if entry.backup is None:
+                    self.provider.remove_file(entry.path)
+                else:
+                    self.provider.replace_file(entry.backup, entry.path)
+            except Exception as e:
+                failures.append((entry.path, e))
+                kept.add(entry.backup)
+        self.backups.clear()
+        return failures
+
+    def finish(self):
+        """ Remove the backups once every file has been committed. A backup which can't be removed is left behind. """
+        for entry in self.entries:
+            if entry.action == "backup":
+                self._discard(entry.backup)
+        self.entries.clear()
+        self.backups.clear()
+
+    def _discard(self, backup: str):
+        try:
+            self.provider.remove_file(backup)
+        except Exception:
+            pass
+
+
+def apply_changes(provider: FileSystemProvider, changes: Iterable[FileChange], workers: Optional[int] = None,
+                  on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Apply a set of file changes in two phases, returning the number of files written. First every new file is rendered
+    and staged to a temporary file next to its destination on a thread pool, and flushed to disk. If that succeeds,
+    the existing files are linked to backups and the staged files renamed into place, recording each step in a journal.
+    A failure in either phase removes the staged files and rolls back the journal before raising ApplyError, so the
+    files are left either all changed or all as they were.
+
+    The staged files for new paths are committed first and those which overwrite an existing path after, and the
+    originals which were moved away are only removed at the end, so if the process dies part way through every note is
+    still at its old path or its new one, with any backups left next to it. The changes can move notes onto each
+    other's paths (such as swapping two file names), since every original file is backed up before any is overwritten.
+    A new path which is taken by some other file fails the apply rather than overwriting that file.
+    """
+    changes = list(changes)
+    writer = ParallelWriter(provider, workers=workers, on_progress=on_progress)
+    staged = writer.stage(((moved, render) for _, moved, render in changes),
+                          mode_from={moved: original for original, moved, _ in changes})
+    temps: Dict[str, str] = dict(staged.staged)
+
+    if staged.failed:
+        for temp in temps.values():
+            writer.discard(temp)
+        raise ApplyError(f"Failed to stage {len(staged.failed)} of {len(changes)} files, nothing was changed",
+                         staged.failed, [])
+
+    originals = dict.fromkeys(original for original, _, _ in changes)
+    destinations = [moved for _, moved, _ in changes]
+    replaced = set(destinations)
+    vacated = [original for original in originals if original not in replaced]
+    journal = Journal(provider)
+    step = ""
+    try:
+        for step in originals:
+            journal.backup(step)
+        for step in sorted(destinations, key=lambda d: d in originals):
+            journal.commit(temps[step], step)
+            del temps[step]
+        for step in vacated:
+            journal.remove(step)
+    except Exception as e:
+        rollback_failures = journal.rollback()
+        for temp in temps.values():
+            writer.discard(temp)
+        restored = "and was rolled back" if not rollback_failures else \
+            f"and {len(rollback_failures)} files could not be restored"
+        raise ApplyError(f"Applying the changes failed ({e}) {restored}", [(step, e)], rollback_failures) from e
+
+    journal.finish()
+    return len(changes)
@@ -4,15 +4,22 @@
 
 import json
 from datetime import datetime as DateTime
-from mnotes.notes.markdown_notes import MetaData
+from mnotes.notes.markdown_notes import MetaData, LinkKind
+
+# Enumerations which may appear in serialized note information, encoded as "<EnumName>.<member name>"
+_ENUMS = {"MetaData": MetaData, "LinkKind": LinkKind}
+
+# Keys whose string values are ISO formatted datetimes. Other string values are never converted, since free text
+# (titles, link targets, etc) can easily contain something that looks like a date
+_DATETIME_KEYS = {"created"}
 
 
 class MNotesEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, DateTime):
             return o.isoformat()
-        elif isinstance(o, MetaData):
-            return f"MetaData.{o.name}"
+        elif isinstance(o, (MetaData, LinkKind)):
+            return f"{type(o).__name__}.{o.name}"
 
         return json.JSONEncoder.default(self, o)
 
@@ -25,15 +32,18 @@ class MNotesDecoder(json.JSONDecoder):
     def try_decode_others(d):
         decoded = {}
         for k, v in d.items():
-            if isinstance(v, str) and v.startswith("MetaData."):
+            if isinstance(v, str) and "." in v and v.split(".", 1)[0] in _ENUMS:
+                enum_name, member = v.split(".", 1)
                 try:
-                    decoded[k] = MetaData[v.replace("MetaData.", "")]
+                    decoded[k] = _ENUMS[enum_name][member]
                 except KeyError:
                     decoded[k] = v
-            else:
+            elif k in _DATETIME_KEYS:
                 try:
                     decoded[k] = DateTime.fromisoformat(v)
                 except (ValueError, TypeError):
                     decoded[k] = v
+            else:
+                decoded[k] = v
 
         return decoded
@@ -0,0 +1,130 @@
+"""
+    Writing a set of files in parallel, where each file is replaced atomically so that a crash part way through leaves
+    every file either as it was or fully updated, never half written.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .file_system import FileSystemProvider
+
+# A file to write, and the function which renders its new content or returns None if it doesn't need to change
+WriteJob = Tuple[str, Callable[[], Optional[str]]]
+
+
+@dataclass
+class WriteResult:
+    written: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, Exception]] = field(default_factory=list)
+
+
+@dataclass
+class StageResult:
+    # Each file to write paired with the temporary file its new content was staged in
+    staged: List[Tuple[str, str]] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, Exception]] = field(default_factory=list)
+
+
+class ParallelWriter:
+    """
+    Renders and writes files on a thread pool. The jobs are split into batches, and each worker renders every file in
+    its batch to a temporary file in the same directory as the file it replaces, flushes the whole batch to disk with
+    one pass of fsync calls, and then renames the temporary files into place. A job which fails to render or write is
+    recorded in the result and its temporary file removed, and doesn't stop the others.
+    """
+
+    def __init__(self, provider: FileSystemProvider, workers: Optional[int] = None, batch_size: int = 32,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.provider = provider
+        self.workers = workers if workers is not None else min(32, (os.cpu_count() or 1) + 4)
+        self.batch_size = max(batch_size, 1)
+        self.on_progress = on_progress
+
+    def write(self, jobs: Iterable[WriteJob]) -> WriteResult:
+        result = WriteResult()
+        for written, unchanged, failed in self._run(jobs, self._write_batch):
+            result.written.extend(written)
+            result.unchanged.extend(unchanged)
+            result.failed.extend(failed)
+        return result
+
+    def stage(self, jobs: Iterable[WriteJob], mode_from: Optional[Dict[str, str]] = None) -> StageResult:
+        """
+        Render and stage every file in parallel and flush the temporary files to disk, but leave them for the caller to
+        rename into place (or remove) so that a set of files can be replaced all together or not at all. A file which is
+        being moved can be mapped to its old path in mode_from, so that it keeps the old file's permissions.
+        """
+        result = StageResult()
+        for staged, unchanged, failed in self._run(jobs, partial(self._stage_batch, mode_from=mode_from or {})):
+            result.staged.extend(staged)
+            result.unchanged.extend(unchanged)
+            result.failed.extend(failed)
+        return result
+
+    def _run(self, jobs: Iterable[WriteJob], work: Callable[[List[WriteJob]], Tuple[List, List, List]]):
+        jobs = list(jobs)
+        batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+        done = 0
+
+        # Progress is reported from this thread as each batch finishes, so the callback doesn't need to be thread safe
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(work, batch) for batch in batches]
+            for future in as_completed(futures):
+                finished = future.result()
+                yield finished
+                done += sum(len(part) for part in finished)
+                if self.on_progress is not None:
+                    self.on_progress(done, len(jobs))
+
+    def _stage_batch(self, batch: List[WriteJob], mode_from: Optional[Dict[str, str]] = None):
+        staged: List[Tuple[str, str]] = []
+        unchanged: List[str] = []
+        failed: List[Tuple[str, Exception]] = []
+
+        for path, render in batch:
+            try:
+                content = render()
+                if content is None:
+                    unchanged.append(path)
+                else:
+                    source = mode_from.get(path, None) if mode_from else None
+                    staged.append((path, self.provider.stage_file(path, content, source)))
+            except Exception as e:
+                failed.append((path, e))
+
+        try:
+            self.provider.sync_files([temp for _, temp in staged])
+        except Exception as e:
+            for path, temp in staged:
+                self.discard(temp)
+                failed.append((path, e))
+            return [], unchanged, failed
+
+        return staged, unchanged, failed
+
+    def _write_batch(self, batch: List[WriteJob]):
+        staged, unchanged, failed = self._stage_batch(batch)
+
+        written: List[str] = []
+        for path, temp in staged:
+            try:
+                self.provider.replace_file(temp, path)
+                written.append(path)
+            except Exception as e:
+                self.discard(temp)
+                failed.append((path, e))
+
+        return written, unchanged, failed
+
+    def discard(self, temp_path: str):
+        """ Remove a staged temporary file, ignoring any error since there is nothing more to be done about it """
+        try:
+            self.provider.remove_file(temp_path)
+        except OSError:
+            pass
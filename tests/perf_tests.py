@@ -1,10 +1,38 @@
+import os
+import re
+import math
+import sys
 import time
+import shutil
+import tempfile
 import random
 import uuid
+import tracemalloc
+from copy import deepcopy
+from itertools import islice
+from datetime import datetime as DateTime, timedelta
+from dateutil import tz
 from mnotes.utility.file_system import FileInfo
+from mnotes.notes.markdown_notes import ID_LINK_PATTERN, CONTENT_SCAN_PATTERN, NoteBuilder, _scan_links, \
+    _strip_mnote_section
+from mnotes.notes.search import SearchIndex, TrigramIndex
+from mnotes.notes.graph import LinkGraph
+from mnotes.notes.index import NoteIndex, GlobalIndices, IndexBuilder
+from mnotes.notes.titles import TitleIndex
+from mnotes.notes.note_cache import NoteCache
+from mnotes.notes.query import CompiledQuery
+from mnotes.notes.export import GRAPH_FORMATS, export_graph
+from mnotes.notes.markdown_notes import NoteInfo, Note, NoteHeading
+from mnotes.utility.file_system import FileSystem
+from mnotes.utility.writer import ParallelWriter
+from mnotes.utility.change import ChangeTransaction, IdAllocator
+from mnotes.fix.common import IdFixer, CreationFixer, AuthorFixer, TitleFixer, FilenameFixer, run_batch
+from tests.tools.file_system_mocks import TestFileSystemProvider
+from mnotes.dev.sample_data_generator import random_note, render_note, add_link_to, get_random_words
 
 _n_runs = 1_000_000
 _n_corpus = 10_000
+_n_grep_corpus = 100_000
 
 
 def perf_file_info_to_dict():
@@ -21,5 +49,670 @@ def perf_file_info_to_dict():
     print(f"To dictionary: {each * 1000.0:0.3f}ms each, {each * _n_corpus:0.3f}s for est corpus")
 
 
+def perf_link_scanner():
+    # Generate note bodies with a handful of links in each, and a code block in some of them
+    bodies = []
+    ids = [random_note()["id"] for _ in range(100)]
+    for n in range(_n_corpus):
+        note = random_note()
+        for _ in range(random.randint(0, 5)):
+            add_link_to(note, random.choice(ids))
+        if n % 10 == 0:
+            note["content"] += f"\n```\nsome code [[{random.choice(ids)}]]\n```\n"
+        bodies.append(note["content"])
+
+    start = time.time()
+    for body in bodies:
+        ID_LINK_PATTERN.findall(_strip_mnote_section(body))
+    end = time.time()
+    each = (end - start) / _n_corpus
+    print(f"ID_LINK_PATTERN: {each * 1000.0:0.3f}ms each, {end - start:0.3f}s for est corpus")
+
+    # The combined pattern alone, and then the whole scan, which also records the headings and the offsets and context
+    # of every link
+    start = time.time()
+    for body in bodies:
+        for _ in CONTENT_SCAN_PATTERN.finditer("\n" + _strip_mnote_section(body)):
+            pass
+    end = time.time()
+    each = (end - start) / _n_corpus
+    print(f"CONTENT_SCAN_PATTERN: {each * 1000.0:0.3f}ms each, {end - start:0.3f}s for est corpus")
+
+    start = time.time()
+    for body in bodies:
+        _scan_links(_strip_mnote_section(body))
+    end = time.time()
+    each = (end - start) / _n_corpus
+    print(f"Combined link scanner: {each * 1000.0:0.3f}ms each, {end - start:0.3f}s for est corpus")
+
+
+def perf_parse_date_time():
+    # Created values for 100k notes, a third of which come from bulk imported batches sharing the same timestamp
+    start_time = DateTime(2015, 1, 1, tzinfo=tz.tzutc())
+    values = []
+    for n in range(100_000):
+        if n % 3 == 0:
+            stamp = start_time + timedelta(days=random.randint(0, 50))
+        else:
+            stamp = start_time + timedelta(seconds=random.randint(0, 200_000_000))
+        values.append(stamp.astimezone(tz.tzoffset(None, -5 * 3600)).isoformat())
+
+    builder = NoteBuilder(None, tz.tzlocal())
+    start = time.time()
+    for value in values:
+        builder._parse_date_time_uncached(value)
+    end = time.time()
+    print(f"Uncached: {(end - start) / len(values) * 1000.0:0.4f}ms each, {end - start:0.3f}s for 100k notes")
+
+    start = time.time()
+    for value in values:
+        builder.parse_date_time(value)
+    end = time.time()
+    print(f"Cached, first load: {(end - start) / len(values) * 1000.0:0.4f}ms each, {end - start:0.3f}s for 100k notes")
+
+    start = time.time()
+    for value in values:
+        builder.parse_date_time(value)
+    end = time.time()
+    print(f"Cached, reload: {(end - start) / len(values) * 1000.0:0.4f}ms each, {end - start:0.3f}s for 100k notes")
+    print(f"  {builder._parse_iso_cached.cache_info()}")
+
+
+def perf_search_index():
+    bodies = {f"/notes/note-{n:05d}.md": random_note()["content"] for n in range(_n_corpus)}
+
+    start = time.time()
+    search = SearchIndex()
+    for path, body in bodies.items():
+        search.add(path, path, body)
+    end = time.time()
+    print(f"Build: {(end - start) / _n_corpus * 1000.0:0.3f}ms each, {end - start:0.3f}s for est corpus")
+
+    start = time.time()
+    encoded = search.serialize()
+    end = time.time()
+    print(f"Serialize: {end - start:0.3f}s, {len(encoded) / 1024 / 1024:0.1f} MB")
+
+    start = time.time()
+    loaded = SearchIndex.deserialize(encoded)
+    end = time.time()
+    print(f"Load: {end - start:0.3f}s")
+
+    for query in ("lorem", "faucibus pellentesque", '"mauris cursus mattis"', "turpis zyzzyva"):
+        start = time.time()
+        results = loaded.search(query)
+        end = time.time()
+        print(f"Query '{query}' (first, decodes postings): {(end - start) * 1000:0.2f}ms, {len(results)} results")
+
+        start = time.time()
+        loaded.search(query)
+        end = time.time()
+        print(f"Query '{query}' (repeated): {(end - start) * 1000:0.2f}ms")
+
+    start = time.time()
+    for path in list(bodies.keys())[:100]:
+        loaded.add(path, "changed", bodies[path] + " changed")
+    end = time.time()
+    print(f"Update 100 notes: {(end - start) * 1000:0.2f}ms")
+
+
+def perf_grep():
+    # Write a corpus of notes to disk, with a part number in one of every hundred
+    root = tempfile.mkdtemp()
+    provider = FileSystem()
+    bodies = {}
+    try:
+        for n in range(_n_grep_corpus):
+            note = random_note()
+            if n % 100 == 0:
+                note["content"] += f"\nReplaced with PN-{random.randint(10000, 99999)}-{random.choice('ABC')}\n"
+            path = os.path.join(root, f"note-{n:06d}.md")
+            with open(path, "w") as handle:
+                handle.write(render_note(note))
+            bodies[path] = note["content"]
+
+        start = time.time()
+        trigrams = TrigramIndex()
+        for path, body in bodies.items():
+            trigrams.add(path, path, body)
+        end = time.time()
+        print(f"Build trigram index: {end - start:0.3f}s for {_n_grep_corpus} notes")
+
+        start = time.time()
+        encoded = trigrams.serialize()
+        end = time.time()
+        print(f"Serialize: {end - start:0.3f}s, {len(encoded) / 1024 / 1024:0.1f} MB")
+
+        start = time.time()
+        trigrams = TrigramIndex.deserialize(encoded)
+        end = time.time()
+        print(f"Load: {end - start:0.3f}s")
+
+        for pattern in (r"PN-4\d{4}-[AB]", r"PN-\d+", "lorem ipsum dolor"):
+            compiled = re.compile(pattern)
+
+            start = time.time()
+            scanned = 0
+            for path in bodies.keys():
+                with provider.read_file(path) as handle:
+                    if compiled.search(handle.read()):
+                        scanned += 1
+            end = time.time()
+            scan_time = end - start
+
+            start = time.time()
+            found = 0
+            candidates = trigrams.candidate_paths(pattern)
+            for path in candidates:
+                with provider.read_file(path) as handle:
+                    if compiled.search(handle.read()):
+                        found += 1
+            end = time.time()
+            print(f"'{pattern}': scan {scan_time:0.3f}s, trigram {end - start:0.3f}s "
+                  f"({scan_time / max(end - start, 1e-6):0.0f}x), read {len(candidates)} notes, "
+                  f"matched {found} (scan matched {scanned})")
+    finally:
+        shutil.rmtree(root)
+
+
+def perf_link_graph():
+    # A million links between 100k notes, half of them to uniformly random notes and half to a heavy tailed set of hubs
+    n_notes, n_links = 100_000, 1_000_000
+    ids = [f"{20000000000000 + i}" for i in range(n_notes)]
+    links = [[] for _ in range(n_notes)]
+    for _ in range(n_links):
+        target = int(random.paretovariate(1.2)) % n_notes if random.random() < 0.5 else random.randrange(n_notes)
+        links[random.randrange(n_notes)].append(ids[target])
+    notes = [NoteInfo(f"/notes/{i}.md", None, ids[i], None, None, links_to=links[i]) for i in range(n_notes)]
+
+    start = time.time()
+    graph = LinkGraph.build(notes)
+    end = time.time()
+    print(f"Build: {end - start:0.3f}s for {graph.node_count} notes and {graph.edge_count} distinct links")
+
+    for name, action in (("Orphans", graph.orphans), ("Hubs", lambda: graph.hubs(10)),
+                         ("Components", graph.components), ("PageRank", graph.pagerank)):
+        start = time.time()
+        action()
+        end = time.time()
+        print(f"{name}: {end - start:0.3f}s")
+
+
+def perf_path_lookup():
+    # 100k notes spread through a tree of directories 12 levels deep, and 1000 indices rooted at the same depth
+    n_notes, depth = 100_000, 12
+    index = NoteIndex(name="perf", path="/notes")
+    directories = []
+    for i in range(n_notes // 10):
+        parts = [f"d{random.randrange(4)}" for _ in range(random.randrange(1, depth))]
+        directories.append("/notes/" + "/".join(parts) + f"/leaf{i}")
+    for i in range(n_notes):
+        path = f"{random.choice(directories)}/{i}.md"
+        index.notes[path] = NoteInfo(path, None, None, None, None)
+
+    queries = random.sample(directories, 1000)
+    start = time.time()
+    linear = [[n for n in index.notes.values() if n.file_path.startswith(q + "/")] for q in queries]
+    end = time.time()
+    print(f"notes_in_path, linear scan: {(end - start) * 1000 / len(queries):0.3f} ms per lookup")
+
+    start = time.time()
+    index.notes_in_path("/notes")
+    end = time.time()
+    print(f"notes_in_path, first lookup (sorts paths): {(end - start) * 1000:0.1f} ms")
+
+    start = time.time()
+    found = [index.notes_in_path(q) for q in queries]
+    end = time.time()
+    print(f"notes_in_path, bisect: {(end - start) * 1000 / len(queries):0.3f} ms per lookup")
+    assert [len(f) for f in found] == [len(f) for f in linear]
+
+    master = GlobalIndices(None)
+    for i in range(1000):
+        root = "/" + "/".join(f"r{random.randrange(10)}" for _ in range(depth)) + f"/index{i}"
+        master.indices[f"index{i}"] = NoteIndex(name=f"index{i}", path=root)
+    paths = [f"{index.path}/" + "/".join(f"s{j}" for j in range(depth)) + "/note.md"
+             for index in random.sample(list(master.indices.values()), 1000)]
+
+    start = time.time()
+    for path in paths:
+        next(i for i in master.indices.values() if os.path.abspath(path).startswith(os.path.abspath(i.path)))
+    end = time.time()
+    print(f"index of path, linear scan: {(end - start) * 1000 / len(paths):0.3f} ms per lookup")
+
+    start = time.time()
+    for path in paths:
+        master.index_of_path(path)
+    end = time.time()
+    print(f"index of path, ancestor walk: {(end - start) * 1000 / len(paths):0.3f} ms per lookup")
+
+
+def perf_title_index():
+    # 100k titles of 2 to 7 words from a vocabulary of 20k made up words, the lorem ipsum word list is too small to give
+    # realistic trigram postings
+    vocabulary = ["".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(3, 10))) for _ in range(20_000)]
+    titles = {f"/notes/note-{n:06d}.md": " ".join(random.choices(vocabulary, k=random.randint(2, 7)))
+              for n in range(100_000)}
+
+    start = time.time()
+    index = TitleIndex()
+    for path, title in titles.items():
+        index.add(path, title)
+    end = time.time()
+    print(f"Build: {end - start:0.3f}s for {len(titles)} titles, {len(index.postings)} trigrams")
+
+    misspelled = [t.replace(t[len(t) // 2], "x", 1) for t in random.sample(list(titles.values()), 2)]
+    for query in random.sample(list(titles.values()), 3) + misspelled:
+        start = time.time()
+        matches = index.find(query)
+        end = time.time()
+        print(f"Find '{query}': {(end - start) * 1000:0.1f}ms, best {matches[0].score:0.2f}")
+
+    start = time.time()
+    for path in list(titles.keys())[:1000]:
+        index.add(path, "changed " + titles[path])
+    end = time.time()
+    print(f"Retitle 1000 notes: {(end - start) * 1000:0.1f}ms")
+
+
+def perf_creation_index():
+    # 100k notes over 20 years, with a tenth of them bulk imported in batches that share a few seconds
+    start_time = DateTime(2001, 1, 1, tzinfo=tz.tzutc())
+    notes = {}
+    for i in range(100_000):
+        if i % 10 == 0:
+            created = start_time + timedelta(days=2000, seconds=i // 10000 * 3600 + i // 10 % 1000)
+        else:
+            created = start_time + timedelta(seconds=random.randrange(20 * 365 * 86400))
+        notes[f"/notes/{i}.md"] = NoteInfo(f"/notes/{i}.md", created, None, None, None)
+
+    index = NoteIndex(name="perf", path="/notes")
+    for note in notes.values():
+        index.notes[note.file_path] = note
+    start = time.time()
+    index.created = sorted((math.floor(n.created.timestamp()), n.file_path) for n in notes.values())
+    end = time.time()
+    print(f"Rebuild from notes (cache without the index): {end - start:0.3f}s")
+
+    master = GlobalIndices(None)
+    master.indices["perf"] = index
+    master.by_path = index.notes
+    since = start_time + timedelta(days=3000)
+    start = time.time()
+    for _ in range(100):
+        list(islice(master.created_between(since), 20))
+    end = time.time()
+    print(f"First page of 20 after a date: {(end - start) * 10:0.3f}ms")
+
+    batch = start_time + timedelta(days=2000)
+    start = time.time()
+    taken = {math.floor(n.created.timestamp()) for n in notes.values()}
+    epoch = math.floor(batch.timestamp())
+    while epoch in taken:
+        epoch += 1
+    end = time.time()
+    print(f"Free second after a batch import, building a set and stepping: {(end - start) * 1000:0.3f}ms")
+
+    start = time.time()
+    allocator = IdAllocator([])
+    allocator.block_created(master.created_seconds, batch.tzinfo)
+    allocator.next_free(batch)
+    end = time.time()
+    print(f"Free second after a batch import, creation index blocked in an ID allocator: {(end - start) * 1000:0.3f}ms")
+
+    start = time.time()
+    for path in list(notes.keys())[:1000]:
+        changed = NoteInfo(path, notes[path].created + timedelta(days=1), None, None, None)
+        index.add_note(changed)
+    end = time.time()
+    print(f"Move 1000 creation times: {(end - start) * 1000:0.1f}ms")
+
+    # 20k notes imported in the same second, where the free second is looked up once per note being fixed
+    crowded = NoteIndex(name="crowded", path="/crowded")
+    for i in range(20_000):
+        crowded.add_note(NoteInfo(f"/crowded/{i}.md", batch, None, None, None))
+    allocator = IdAllocator([])
+    allocator.block_created(lambda: (t for t, _ in crowded.created), batch.tzinfo)
+    start = time.time()
+    for _ in range(1000):
+        allocator.next_free(batch)
+    end = time.time()
+    print(f"Free second after 20k notes created in one second: {(end - start) * 1000:0.2f}us per lookup")
+
+
+def perf_query():
+    # 100k notes in 10 indices, each with a random author, a tag on one in a hundred, and creation times over 20 years
+    start_time = DateTime(2001, 1, 1, tzinfo=tz.tzutc())
+    authors = ["Alice Allison", "Bob Bobertsmith", "Charles Charleston", "Dave Davidson", "Eva Evanston"]
+    master = GlobalIndices(None)
+    for i in range(10):
+        index = NoteIndex(name=f"index{i}", path=f"/notes/index{i}")
+        for j in range(10_000):
+            path = f"/notes/index{i}/{j // 100}/{j}.md"
+            created = start_time + timedelta(seconds=random.randrange(20 * 365 * 86400))
+            index.add_note(NoteInfo(path, created, f"{i}-{j}", f"Note {j}", random.choice(authors),
+                                    tags=["rare"] if random.random() < 0.01 else None))
+        master.indices[index.name] = index
+    for index in master.indices.values():
+        for note in index.notes.values():
+            master.register(note)
+
+    for text in ("author:eva title:none", "author:eva tag:rare", "author:bob created:2010-06-01",
+                 "path:/notes/index3/42 or path:/notes/index7/13", "index:index2 not author:eva"):
+        query = CompiledQuery(text, master, tz.tzutc())
+        start = time.time()
+        notes, plan = query.run()
+        end = time.time()
+        used = plan.access.description if plan.access else "scan"
+        print(f"'{text}': {(end - start) * 1000:0.1f}ms, {len(notes)} matches, {plan.candidates} checked via {used}")
+
+
+def perf_graph_export():
+    # 100k notes with 500k links between them, exported to a temporary file in each format
+    n_notes, n_links = 100_000, 500_000
+    ids = [f"{20000000000000 + i}" for i in range(n_notes)]
+    links = [[] for _ in range(n_notes)]
+    for _ in range(n_links):
+        links[random.randrange(n_notes)].append(ids[random.randrange(n_notes)])
+    created = DateTime(2020, 1, 1, tzinfo=tz.tzutc())
+    notes = [NoteInfo(f"/notes/{i}.md", created, ids[i], get_random_words(5), None, links_to=links[i])
+             for i in range(n_notes)]
+
+    root = tempfile.mkdtemp()
+    try:
+        for name, writer in GRAPH_FORMATS.items():
+            path = os.path.join(root, f"graph.{name}")
+            start = time.time()
+            with open(path, "w", encoding="utf-8") as handle:
+                node_count, edge_count = export_graph(lambda: iter(notes), lambda n: "perf", writer(handle))
+            end = time.time()
+
+            # Memory is measured on a second run, since tracing slows the export down a lot
+            tracemalloc.start()
+            with open(path, "w", encoding="utf-8") as handle:
+                export_graph(lambda: iter(notes), lambda n: "perf", writer(handle))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size = os.path.getsize(path) / 1024 / 1024
+            print(f"{name}: {end - start:0.2f}s for {node_count} nodes and {edge_count} edges, {size:0.1f} MB file, "
+                  f"{peak / 1024 / 1024:0.1f} MB peak memory")
+    finally:
+        shutil.rmtree(root)
+
+
+def perf_backlink_writer():
+    # 10k notes given a new backlink section, written serially in place and then in parallel with atomic replacement
+    n_notes = 10_000
+    builder = NoteBuilder(FileSystem(), tz.tzlocal())
+    section = "\n" + "\n".join(f" * [[{20000000000000 + i}]] {get_random_words(5)}" for i in range(5)) + "\n"
+
+    def render(path: str) -> str:
+        note = builder.load_note(path)
+        note.set_mnote_section(section)
+        return note.to_file_text()
+
+    root = tempfile.mkdtemp()
+    try:
+        paths = [os.path.join(root, f"note-{i:05d}.md") for i in range(n_notes)]
+
+        def reset():
+            for path in paths:
+                with open(path, "w") as handle:
+                    handle.write(render_note(random_note()))
+
+        reset()
+        start = time.time()
+        for path in paths:
+            text = render(path)
+            with builder.provider.write_file(path) as handle:
+                handle.write(text)
+        print(f"serial in place: {time.time() - start:0.2f}s for {n_notes} notes (no fsync)")
+
+        for workers in (1, 4, 8, 16):
+            reset()
+            writer = ParallelWriter(builder.provider, workers=workers)
+            start = time.time()
+            result = writer.write([(p, lambda p=p: render(p)) for p in paths])
+            print(f"parallel atomic, {workers} threads: {time.time() - start:0.2f}s for {len(result.written)} notes")
+    finally:
+        shutil.rmtree(root)
+
+
+def perf_transaction_views():
+    # Four fixers each fetching the state of every one of 5k notes from a transaction, with full deep copies as the
+    # transaction used to make compared to the copy-on-write views it makes now
+    builder = NoteBuilder(FileSystem(), tz.tzlocal())
+    root = tempfile.mkdtemp()
+    try:
+        notes = {}
+        for i in range(5_000):
+            path = os.path.join(root, f"note-{i:05d}.md")
+            with open(path, "w") as handle:
+                handle.write(render_note(random_note()))
+            notes[path] = builder.load_note(path)
+    finally:
+        shutil.rmtree(root)
+
+    def run(transaction: ChangeTransaction, fetch):
+        start = time.time()
+        for _ in range(4):
+            for path in notes:
+                note = fetch(transaction, path)
+                note.info.author = "Someone Else"
+        return time.time() - start
+
+    def transaction():
+        return ChangeTransaction(set(), notes.__contains__, notes.get, lambda p: notes[p].info)
+
+    deep = run(transaction(), lambda t, p: deepcopy(t._get_note_from_index(p)))
+    views = run(transaction(), ChangeTransaction.get_note_state)
+    print(f"deep copies: {deep:0.2f}s, copy-on-write views: {views:0.3f}s for {4 * len(notes)} fetches")
+
+
+def perf_transaction_moves():
+    # Renaming 20 notes in a corpus of 200k, where the transaction only holds the notes it changes
+    n_notes = 200_000
+    infos = {f"/notes/note-{i:06d}.md": NoteInfo(f"/notes/note-{i:06d}.md", None, f"{20000000000000 + i}", None, None)
+             for i in range(n_notes)}
+    ids = {info.id for info in infos.values()}
+
+    start = time.time()
+    transaction = ChangeTransaction(ids, infos.__contains__, lambda p: Note(info=infos[p], front_matter={}, content=""),
+                                    infos.get)
+    for i in range(20):
+        note = transaction.get_note_state(f"/notes/note-{i:06d}.md")
+        note.info.file_path = f"/notes/renamed-{i:06d}.md"
+        assert transaction.verify(f"/notes/note-{i:06d}.md", note)
+        transaction.add_change(f"/notes/note-{i:06d}.md", note)
+    print(f"created a transaction and moved 20 of {n_notes} notes in {(time.time() - start) * 1000:0.2f} ms")
+
+
+def perf_note_cache():
+    # Loading each of 5k notes four times in a row, as the fixers in 'fix all' do, with and without the note cache
+    builder = NoteBuilder(FileSystem(), tz.tzlocal())
+    root = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(5_000):
+            paths.append(os.path.join(root, f"note-{i:05d}.md"))
+            with open(paths[-1], "w") as handle:
+                handle.write(render_note(random_note()))
+        sums = {p: builder.provider.checksum(p) for p in paths}
+
+        start = time.time()
+        for path in paths:
+            for _ in range(4):
+                builder.load_note(path)
+        uncached = time.time() - start
+
+        cache = NoteCache()
+        start = time.time()
+        for path in paths:
+            for _ in range(4):
+                cache.get(path, sums[path], os.path.getsize(path), builder.load_note)
+        cached = time.time() - start
+        stats = cache.stats()
+        print(f"uncached: {uncached:0.2f}s, cached: {cached:0.2f}s ({stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['notes']} notes in {stats['bytes'] / 1024:0.0f} KiB)")
+    finally:
+        shutil.rmtree(root)
+
+
+def perf_id_allocator():
+    # A bulk import where every note shares one creation time and has no ID, each given the next free ID in turn by the
+    # ID fixer, with only the taken IDs in the allocator and then also with the creation times of the notes blocked
+    created = DateTime(2021, 6, 1, 12, 0, 0, tzinfo=tz.tzlocal())
+    for n_notes in (2_000, 8_000):
+        files = {}
+        for i in range(n_notes):
+            data = random_note()
+            del data["id"]
+            data["created"] = created
+            files[f"/notes/import-{i:05d}.md"] = {"content": render_note(data), "modified": 0}
+
+        provider = TestFileSystemProvider(files)
+        note_builder = NoteBuilder(provider, tz.tzlocal())
+        master = GlobalIndices(IndexBuilder(provider, note_builder), directory={"notes": {"path": "/notes"}})
+        master.load_all()
+        paths = list(master.by_path)
+        # Parse every note into the note cache first, so both runs time only the conflict resolution
+        for path in paths:
+            master.get_note(path)
+
+        for name, kwargs in (("IDs only", {}), ("blocked creation times", {"created_seconds": master.created_seconds})):
+            fixer = IdFixer(note_builder, True, **kwargs)
+            transaction = master.create_empty_transaction()
+            start = time.time()
+            for path in paths:
+                result = fixer.try_change(path, transaction)
+                transaction.ids.add(result.change.info.id)
+            print(f"{name}: {time.time() - start:0.3f}s for {n_notes} conflicting notes")
+
+
+def perf_fix_batch():
+    # The 'fix all --batch' pipeline over an imported collection in memory, where every note is missing its ID and
+    # author, and the notes were imported in groups of 100 which share a creation time
+    for n_notes in (10_000, 100_000):
+        files = {}
+        for i in range(n_notes):
+            data = random_note()
+            del data["id"]
+            del data["author"]
+            data["created"] = DateTime(2021, 6, 1, tzinfo=tz.tzlocal()) + timedelta(hours=i // 100)
+            files[f"/notes/import-{i:06d}.md"] = {"content": render_note(data), "modified": 0}
+
+        provider = TestFileSystemProvider(files)
+        note_builder = NoteBuilder(provider, tz.tzlocal())
+        index_builder = IndexBuilder(provider, note_builder)
+        master = GlobalIndices(index_builder, directory={"notes": {"path": "/notes"}})
+        master.load_all()
+        pipeline = [
+            CreationFixer(note_builder, tz.tzlocal()),
+            IdFixer(note_builder, True, created_seconds=master.created_seconds),
+            AuthorFixer(note_builder, "Irene Irenski"),
+            TitleFixer(note_builder),
+            FilenameFixer(note_builder, False),
+        ]
+
+        start = time.time()
+        result = run_batch(pipeline, list(master.indices["notes"].notes.values()), master.create_empty_transaction())
+        print(f"{n_notes} notes: {time.time() - start:0.2f}s, {result.changed} changed, "
+              f"{sum(result.failed.values())} failures")
+
+
+def perf_apply_transaction():
+    # Renaming and rewriting 5k notes on disk, one at a time in place as apply_transaction used to, and then staged in
+    # parallel and committed with the journal
+    n_notes = 5_000
+    root = tempfile.mkdtemp()
+    try:
+        for i in range(n_notes):
+            with open(os.path.join(root, f"note-{i:05d}.md"), "w") as handle:
+                handle.write(render_note(random_note()))
+
+        note_builder = NoteBuilder(FileSystem(), tz.tzlocal())
+        master = GlobalIndices(IndexBuilder(note_builder.provider, note_builder), directory={"n": {"path": root}})
+
+        def transaction(suffix: str) -> ChangeTransaction:
+            master.load_all()
+            t = master.create_empty_transaction()
+            for path in list(master.by_path):
+                note = t.get_note_state(path)
+                note.info.author = "Someone Else"
+                note.info.file_path = os.path.join(root, f"{note.info.id}-{suffix}.md")
+                t.add_change(path, note)
+            return t
+
+        t = transaction("serial")
+        start = time.time()
+        for original, moved in t.file_moves.items():
+            note_builder.provider.move_file(original, moved)
+            with note_builder.provider.write_file(moved) as handle:
+                handle.write(t.by_path[original].to_file_text())
+        print(f"serial in place: {time.time() - start:0.2f}s for {n_notes} notes (no fsync, no rollback)")
+
+        for workers in (1, 8):
+            t = transaction(f"staged-{workers}")
+            start = time.time()
+            master.apply_transaction(t, workers=workers)
+            print(f"staged with journal, {workers} threads: {time.time() - start:0.2f}s for {n_notes} notes")
+    finally:
+        shutil.rmtree(root)
+
+
+def perf_index_after_apply():
+    # Fixing 10k notes on disk which are missing their author, and then loading the index again as the next command
+    # would, from the cache as it was before the fix and from the index updated in place by the applied transaction
+    n_notes = 10_000
+    root = tempfile.mkdtemp()
+    try:
+        for i in range(n_notes):
+            data = random_note()
+            del data["author"]
+            with open(os.path.join(root, f"note-{i:05d}.md"), "w") as handle:
+                handle.write(render_note(data))
+
+        note_builder = NoteBuilder(FileSystem(), tz.tzlocal())
+        index_builder = IndexBuilder(note_builder.provider, note_builder)
+        master = GlobalIndices(index_builder, directory={"n": {"path": root}})
+        master.load_all()
+        before = master.indices["n"].serialize()
+
+        t = master.create_empty_transaction()
+        run_batch([AuthorFixer(note_builder, "Irene Irenski")], list(master.by_path.values()), t)
+        start = time.time()
+        master.apply_transaction(t)
+        print(f"applied {len(t.file_moves)} changes and updated the index in {time.time() - start:0.2f}s")
+
+        for name, cached in (("stale cache", NoteIndex.deserialize(before)),
+                             ("updated index", NoteIndex.deserialize(master.indices["n"].serialize()))):
+            start = time.time()
+            changed = index_builder.update(cached)
+            print(f"next update from the {name}: {time.time() - start:0.2f}s, re-parsed {len(changed)} files")
+    finally:
+        shutil.rmtree(root)
+
+
+
+def perf_unregister_shared_tags():
+    # Unregistering every note, as applying a large transaction does for the notes it changes, when all of them share
+    # one tag and one heading
+    for n_notes in (2_000, 8_000):
+        master = GlobalIndices(None)
+        notes = [NoteInfo(f"/notes/{i}.md", None, None, None, None, tags=["inbox"],
+                          headings=[NoteHeading(2, "Summary")]) for i in range(n_notes)]
+        for note in notes:
+            master.register(note)
+
+        start = time.time()
+        for note in notes:
+            master.unregister(note)
+        print(f"{n_notes} notes: {time.time() - start:0.3f}s")
+
 if __name__ == '__main__':
-    perf_file_info_to_dict()
\ No newline at end of file
+    # Run specific benchmarks by giving their names (without the 'perf_' prefix) on the command line, or all of them
+    selected = sys.argv[1:]
+    for name, function in list(globals().items()):
+        if name.startswith("perf_") and (not selected or name[5:] in selected):
+            print(f"{name}:")
+            function()
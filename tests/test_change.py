@@ -2,10 +2,11 @@ from copy import deepcopy
 from typing import Dict
 
 import pytest
-from datetime import datetime as DateTime
+from datetime import datetime as DateTime, timedelta as TimeDelta
 
 from mnotes.notes.index import IndexBuilder, GlobalIndices
 from mnotes.notes.markdown_notes import Note, ID_TIME_FORMAT, NoteBuilder
+from mnotes.utility.change import IdAllocator
 from tests.tools.file_system_mocks import TestFileSystemProvider
 from tests.test_index import local_tz
 import tests.tools.sample_data as sample
@@ -83,6 +84,27 @@ def test_simple_transaction_changing_fetched_does_not_update(transact_fixture):
     assert t.get_note_state(f0).info.author == "Replaced Author"
 
 
+def test_transaction_views_share_content(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+
+    f0 = "/alpha/note-00.md"
+    note = t.get_note_state(f0)
+    note.info.author = "Replaced Author"
+    note.info.created = None
+    t.add_change(f0, note)
+
+    view = t.get_note_state(f0)
+    assert view is not note and view.info is not note.info
+    assert view.content is note.content and view.front_matter is note.front_matter
+
+    view.info.title = "Changed"
+    assert t.get_note_state(f0).info.title == note.info.title
+    assert t.get_note_info_state(f0).created is None
+    assert master.by_path[f0].created is not None
+
+
 def test_simple_transaction_applies(transact_fixture):
     provider, index_builder, master = transact_fixture
     copy = deepcopy(provider)
@@ -144,6 +166,67 @@ def test_transaction_build_errors_on_conflict(transact_fixture):
         t.add_change(f1, note)
 
 
+def test_transaction_leaves_index_ids(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    ids = set(master.all_ids)
+    t = master.create_empty_transaction()
+
+    f0 = "/alpha/note-00.md"
+    note = t.get_note_state(f0)
+    note.info.id = "12345678901234"
+    t.add_change(f0, note)
+
+    assert "12345678901234" in t.ids and "20240102080135" not in t.ids
+    assert master.all_ids == ids
+
+
+def test_transaction_only_holds_changes(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+    assert not t.by_path and not t.file_moves
+
+    f0 = "/alpha/note-00.md"
+    note = t.get_note_state(f0)
+    note.info.author = "Replaced Author"
+    t.add_change(f0, note)
+    assert list(t.file_moves.items()) == [(f0, f0)]
+
+    with pytest.raises(KeyError):
+        t.get_note_state("/alpha/not-a-note.md")
+
+
+def test_transaction_path_conflicts(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+    f0, f1, f2 = "/alpha/note-00.md", "/alpha/note-01.md", "/alpha/note-02.md"
+
+    # Moving onto a file which isn't moving conflicts
+    note = t.get_note_state(f0)
+    note.info.file_path = f1
+    assert not t.verify(f0, note)
+
+    # Once that file has moved away its path is free, and the path it moved to is taken
+    note = t.get_note_state(f1)
+    note.info.file_path = "/alpha/moved.md"
+    t.add_change(f1, note)
+    note = t.get_note_state(f0)
+    note.info.file_path = f1
+    assert t.verify(f0, note)
+    note.info.file_path = "/alpha/moved.md"
+    assert not t.verify(f0, note)
+
+    # Moving the note again releases the path it was going to
+    note = t.get_note_state(f1)
+    note.info.file_path = "/alpha/moved-again.md"
+    t.add_change(f1, note)
+    note = t.get_note_state(f2)
+    note.info.file_path = "/alpha/moved.md"
+    assert t.verify(f2, note)
+
+
 def test_hetrogenous_transaction_with_move(transact_fixture):
     provider, index_builder, master = transact_fixture
     copy = deepcopy(provider)
@@ -179,3 +262,136 @@ def test_hetrogenous_transaction_with_move(transact_fixture):
     assert master.by_path[fr].id == "20150430174927"
     assert master.by_path[fr].created == DateTime(2015, 4, 30, 17, 49, 27)
     assert but_for(copy, f0, f1) == but_for(provider, f1, fr)
+
+
+
+def _assert_matches_fresh_load(provider, index_builder, master):
+    # The index updated in place by an applied transaction is the same as one built again from the files
+    fresh = GlobalIndices(index_builder, directory=master.index_directory)
+    fresh.load_all()
+    assert {p: n.to_dict() for p, n in master.by_path.items()} == {p: n.to_dict() for p, n in fresh.by_path.items()}
+    assert set(master.by_id) == set(fresh.by_id)
+    assert set(master.conflicts) == set(fresh.conflicts)
+    assert master.broken == fresh.broken
+    for name, index in master.indices.items():
+        assert index.files == fresh.indices[name].files
+        assert index.created == fresh.indices[name].created
+        assert index.linked_from == fresh.indices[name].linked_from
+        assert index_builder.update(index) == []
+
+
+def test_applied_transaction_updates_index_in_place(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+
+    f0 = "/alpha/note-00.md"
+    note = t.get_note_state(f0)
+    note.info.author = "Replaced Author"
+    note.info.file_path = "/alpha/note-renamed.md"
+    t.add_change(f0, note)
+
+    f1 = "/alpha/note-01.md"
+    note = t.get_note_state(f1)
+    note.info.id = "12345678901234"
+    note.info.backlink = True
+    note.set_mnote_section("\n * [[20240102080135]]\n")
+    t.add_change(f1, note)
+
+    f2 = "/fix/author.md"
+    note = t.get_note_state(f2)
+    note.info.author = "Irene Irenski"
+    t.add_change(f2, note)
+
+    master.apply_transaction(t)
+
+    assert f0 not in master.by_path
+    assert master.by_path["/alpha/note-renamed.md"].author == "Replaced Author"
+    assert master.by_id["12345678901234"].mnote_section is not None
+    assert "19990907012114" not in master.all_ids
+    _assert_matches_fresh_load(provider, index_builder, master)
+
+
+def test_applied_transaction_moves_onto_vacated_path(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+
+    # note-01 moves away, and note-00 takes its place
+    f0, f1, f2 = "/alpha/note-00.md", "/alpha/note-01.md", "/alpha/note-moved.md"
+    ids = master.by_path[f0].id, master.by_path[f1].id
+    second = t.get_note_state(f1)
+    second.info.file_path = f2
+    t.add_change(f1, second)
+    first = t.get_note_state(f0)
+    first.info.file_path = f1
+    t.add_change(f0, first)
+
+    master.apply_transaction(t)
+
+    assert f0 not in master.by_path
+    assert (master.by_path[f1].id, master.by_path[f2].id) == ids
+    _assert_matches_fresh_load(provider, index_builder, master)
+
+
+def _ids(start: DateTime, *offsets: int):
+    return [(start + TimeDelta(seconds=o)).strftime(ID_TIME_FORMAT) for o in offsets]
+
+
+def test_id_allocator_skips_runs():
+    start = DateTime(2021, 3, 1, 23, 59, 58, tzinfo=local_tz)
+    allocator = IdAllocator(_ids(start, 0, 1, 2, 3, 5) + ["12345678901234", "not an id"])
+
+    assert allocator.next_free(start) == start + TimeDelta(seconds=4)
+    assert allocator.next_free(start + TimeDelta(seconds=4)) == start + TimeDelta(seconds=4)
+    assert allocator.next_free(start + TimeDelta(seconds=5)) == start + TimeDelta(seconds=6)
+    assert allocator.next_free(start - TimeDelta(seconds=1)) == start - TimeDelta(seconds=1)
+
+
+def test_id_allocator_add_and_remove():
+    start = DateTime(2021, 3, 1, 12, 0, 0, tzinfo=local_tz)
+    allocator = IdAllocator(_ids(start, 0, 1, 3))
+
+    allocator.add(_ids(start, 2)[0])
+    assert allocator.next_free(start) == start + TimeDelta(seconds=4)
+    allocator.remove(_ids(start, 1)[0])
+    assert allocator.next_free(start) == start + TimeDelta(seconds=1)
+    assert allocator.next_free(start + TimeDelta(seconds=2)) == start + TimeDelta(seconds=4)
+    allocator.remove(_ids(start, 0)[0])
+    allocator.remove(_ids(start, 3)[0])
+    assert allocator.next_free(start + TimeDelta(seconds=2)) == start + TimeDelta(seconds=3)
+
+
+def test_id_allocator_blocked_creation_times():
+    start = DateTime(2021, 3, 1, 12, 0, 0, tzinfo=local_tz)
+    allocator = IdAllocator(_ids(start, 0))
+    epochs = [int((start + TimeDelta(seconds=o)).timestamp()) for o in (1, 2, 4)]
+
+    allocator.block_created(lambda: epochs, local_tz)
+    assert allocator.next_free(start) == start + TimeDelta(seconds=3)
+
+    # A blocked creation time stays taken even when no ID uses it, and the seconds are only merged in once per zone
+    allocator.remove(_ids(start, 1)[0])
+    allocator.block_created(lambda: pytest.fail("blocked again"), local_tz)
+    assert allocator.next_free(start + TimeDelta(seconds=1)) == start + TimeDelta(seconds=3)
+    allocator.remove(_ids(start, 0)[0])
+    assert allocator.next_free(start) == start
+
+
+def test_id_allocator_matches_transaction_ids(transact_fixture):
+    provider, index_builder, master = transact_fixture
+    master.load_all()
+    t = master.create_empty_transaction()
+    allocator = t.ids.allocator
+
+    f0 = "/alpha/note-00.md"
+    note = t.get_note_state(f0)
+    taken = note.info.created
+    assert allocator.next_free(taken) != taken
+
+    # Changing the ID frees the old one and takes the new one
+    free = allocator.next_free(taken + TimeDelta(days=1))
+    note.info.id = free.strftime(ID_TIME_FORMAT)
+    t.add_change(f0, note)
+    assert allocator.next_free(taken) == taken
+    assert allocator.next_free(free) == free + TimeDelta(seconds=1)
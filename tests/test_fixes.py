@@ -9,10 +9,10 @@ from mnotes.notes.markdown_notes import NoteBuilder, NoteInfo
 from mnotes.utility.change import ChangeTransaction
 from tests.test_index import local_tz
 
-from mnotes.fix.common import CreationFixer, IdFixer, AuthorFixer, TitleFixer, FilenameFixer
+from mnotes.fix.common import CreationFixer, IdFixer, AuthorFixer, TitleFixer, FilenameFixer, run_batch
 from mnotes.notes.markdown_notes import ID_TIME_FORMAT
 from tests.tools.file_system_mocks import TestFileSystemProvider
-from datetime import datetime as DateTime
+from datetime import datetime as DateTime, timedelta as TimeDelta
 
 
 @dataclass
@@ -154,6 +154,59 @@ def test_id_resolve_existing_conflict(fixture):
     assert copy.content == note2.content
 
 
+def test_id_resolve_conflict_skips_taken_times(fixture):
+    file = "/fix/missing-id-conflict.md"
+    note = fixture.master.get_note_info(file)
+
+    # Every second for the next minute is already the creation time of another note
+    for i in range(1, 60):
+        taken = NoteInfo(f"/fix/taken-{i}.md", note.created + TimeDelta(seconds=i), None, None, None)
+        fixture.master.indices["fix"].add_note(taken)
+
+    fixer = IdFixer(fixture.index_builder.note_builder, True, created_seconds=fixture.master.created_seconds)
+    result = fixer.try_change(file, fixture.transact)
+
+    assert result.is_ok
+    assert result.change.info.created == note.created + TimeDelta(seconds=60)
+    assert result.change.info.id == result.change.info.created.strftime(ID_TIME_FORMAT)
+
+
+def test_id_resolve_conflicts_in_bulk(fixture):
+    # Notes sharing one creation time each get the next free ID after the ones resolved before them
+    file = "/fix/missing-id-conflict.md"
+    note = fixture.master.get_note_info(file)
+    fixer = IdFixer(fixture.index_builder.note_builder, True, created_seconds=fixture.master.created_seconds)
+
+    ids = []
+    for _ in range(20):
+        result = fixer.try_change(file, fixture.transact)
+        ids.append(result.change.info.id)
+        fixture.transact.ids.add(result.change.info.id)
+
+    expected = [(note.created + TimeDelta(seconds=i)).strftime(ID_TIME_FORMAT) for i in range(1, 21)]
+    assert expected == ids
+
+
+def test_id_resolve_fills_gaps_between_creation_times(fixture):
+    # Every second after the note's creation time is another note's creation time except every third one
+    file = "/fix/missing-id-conflict.md"
+    note = fixture.master.get_note_info(file)
+    for i in range(1, 30):
+        if i % 3 != 0:
+            taken = NoteInfo(f"/fix/taken-{i}.md", note.created + TimeDelta(seconds=i), None, None, None)
+            fixture.master.indices["fix"].add_note(taken)
+
+    fixer = IdFixer(fixture.index_builder.note_builder, True, created_seconds=fixture.master.created_seconds)
+    ids = []
+    for _ in range(10):
+        result = fixer.try_change(file, fixture.transact)
+        ids.append(result.change.info.id)
+        fixture.transact.ids.add(result.change.info.id)
+
+    expected = [(note.created + TimeDelta(seconds=i)).strftime(ID_TIME_FORMAT) for i in range(3, 31, 3)]
+    assert expected == ids
+
+
 def test_filename_check_true(fixture):
     note = fixture.master.get_note_info("/alpha/note-00.md")
     fixer = FilenameFixer(fixture.index_builder.note_builder, False)
@@ -256,6 +309,13 @@ def test_author_fix(fixture):
     assert copy.content == note2.content
 
 
+def test_author_fix_without_author_fails(fixture):
+    fixer = AuthorFixer(fixture.index_builder.note_builder, None)
+    result = fixer.try_change("/fix/author.md", fixture.transact)
+
+    assert result.is_failed
+
+
 def test_title_check_true(fixture):
     note = fixture.master.get_note_info("/fix/no-title-but-heading.md")
     fixer = TitleFixer(fixture.index_builder.note_builder)
@@ -292,3 +352,85 @@ def test_title_cant_fix_no_heading(fixture):
     result = fixer.try_change(file, fixture.transact)
 
     assert result.is_failed
+
+
+def _pipeline(fixture: Fixture):
+    builder = fixture.index_builder.note_builder
+    return [
+        CreationFixer(builder, local_zone=local_tz),
+        IdFixer(builder, True, created_seconds=fixture.master.created_seconds),
+        AuthorFixer(builder, "Irene Irenski"),
+        TitleFixer(builder),
+        FilenameFixer(builder, False),
+    ]
+
+
+def test_run_batch_adds_changes(fixture):
+    notes = list(fixture.master.indices["fix"].notes.values())
+    failures = []
+    result = run_batch(_pipeline(fixture), notes, fixture.transact, lambda n, f, r: failures.append((n.file_path, f)))
+
+    assert result.checked == len(notes)
+    assert result.changed == len(fixture.transact.by_path)
+    assert result.fixed["missing an author"] >= 1
+    assert fixture.transact.get_note_info_state("/fix/author.md").author == "Irene Irenski"
+    failed = [(p, f.description) for p, f in failures]
+    assert ("/fix/no-title-or-heading.md", "missing the title in the metadata") in failed
+    # A note whose creation time can't be fixed fails at the ID instead of stopping the batch
+    assert ("/fix/timestamp-wrong-20130434025112.md", "missing an id") in failed
+    assert sum(result.failed.values()) == len(failures)
+    # Every note is counted once for each fixer, including the notes its check passed over
+    for d in result.fixed:
+        assert result.checked == result.fixed[d] + result.failed[d] + result.unchanged[d] + result.skipped[d]
+    assert sum(result.skipped.values()) > 0
+
+
+def test_run_batch_conflicting_change_fails(fixture):
+    # Another note is already being moved to the path the filename fixer would give note-00
+    file = "/alpha/note-00.md"
+    other = fixture.transact.get_note_state("/alpha/missing-created.md")
+    other.info.file_path = "/alpha/20240102080135-note-00.md"
+    fixture.transact.add_change("/alpha/missing-created.md", other)
+
+    pipeline = [FilenameFixer(fixture.index_builder.note_builder, False)]
+    result = run_batch(pipeline, [fixture.master.get_note_info(file)], fixture.transact)
+
+    assert result.failed[pipeline[0].description] == 1
+    assert result.changed == 0
+    assert fixture.transact.get_note_info_state(file).file_path == file
+
+
+def test_run_batch_skips_unparsable_front_matter(fixture):
+    # A note whose front matter can't be parsed fails every fix instead of failing the transaction when it's applied
+    bad = "/fix/bad-yaml.md"
+    fixture.provider.internal[bad] = {"content": "---\ntitle: [unclosed\n---\n# Heading\n", "modified": 0}
+    fixture.master.load_all()
+    transact = fixture.master.create_empty_transaction()
+    original = fixture.provider.internal[bad]["content"]
+
+    failures = []
+    notes = list(fixture.master.indices["fix"].notes.values())
+    pipeline = _pipeline(fixture)
+    result = run_batch(pipeline, notes, transact, lambda n, f, r: failures.append((n.file_path, f)))
+    assert bad in [path for path, _ in failures]
+    for d in (fixer.description for fixer in pipeline):
+        assert result.checked == result.fixed[d] + result.failed[d] + result.unchanged[d] + result.skipped[d]
+    assert bad not in transact.by_path
+    assert result.changed > 0
+
+    fixture.master.apply_transaction(transact)
+    assert fixture.provider.internal[bad]["content"] == original
+    assert all(fixture.master.get_note_info(transact.file_moves.get(p, p)).id for p in transact.by_path)
+
+
+def test_run_batch_applied_index_needs_no_update(fixture):
+    notes = [n for index in fixture.master.indices.values() for n in index.notes.values()]
+    run_batch(_pipeline(fixture), notes, fixture.transact)
+    fixture.master.apply_transaction(fixture.transact)
+
+    fresh = GlobalIndices(fixture.index_builder, directory=fixture.master.index_directory)
+    fresh.load_all()
+    assert {p: n.to_dict() for p, n in fixture.master.by_path.items()} == \
+           {p: n.to_dict() for p, n in fresh.by_path.items()}
+    for index in fixture.master.indices.values():
+        assert fixture.index_builder.update(index) == []
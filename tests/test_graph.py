@@ -0,0 +1,125 @@
+import io
+import json
+import xml.etree.ElementTree as ElementTree
+from copy import deepcopy
+
+import pytest
+
+import tests.tools.sample_data as sample
+from mnotes.notes.export import GRAPH_FORMATS, GraphWriter, export_graph
+from mnotes.notes.graph import LinkGraph
+from mnotes.notes.index import IndexBuilder, GlobalIndices
+from mnotes.notes.markdown_notes import NoteBuilder, NoteInfo
+from tests.test_index import local_tz
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+def _note(id_, *links):
+    return NoteInfo(file_path=f"/{id_}.md", created=None, id=id_, title=None, author=None,
+                    links_to=list(links) if links else None)
+
+
+@pytest.fixture
+def small_graph():
+    # a -> b -> c -> a is a cycle, d -> a, e is an orphan, f -> g is a separate component, and the link from b to x
+    # doesn't refer to any note
+    notes = [_note("a", "b", "b"), _note("b", "c", "x", "b"), _note("c", "a"), _note("d", "a"), _note("e"),
+             _note("f", "g"), _note("g"), NoteInfo("/no-id.md", None, None, None, None, links_to=["a"])]
+    return LinkGraph.build(notes)
+
+
+def test_graph_structure(small_graph):
+    assert ["a", "b", "c", "d", "e", "f", "g"] == small_graph.ids
+    assert 5 == small_graph.edge_count
+    assert 1 == small_graph.dangling
+    assert ["b"] == [small_graph.ids[i] for i in small_graph.successors(small_graph.index_of["a"])]
+    assert ["c", "d"] == sorted(small_graph.ids[i] for i in small_graph.predecessors(small_graph.index_of["a"]))
+
+
+def test_graph_orphans_and_hubs(small_graph):
+    assert ["e"] == small_graph.orphans()
+    assert ("a", 2, 1) == small_graph.hubs(1)[0]
+
+
+def test_graph_components(small_graph):
+    assert [["a", "b", "c", "d"], ["f", "g"], ["e"]] == small_graph.components()
+
+
+def test_graph_pagerank(small_graph):
+    ranks = small_graph.pagerank()
+    assert abs(sum(ranks.values()) - 1.0) < 1e-6
+    assert ranks["a"] > ranks["d"]
+    assert ranks["g"] > ranks["f"]
+    assert abs(ranks["e"] - ranks["f"]) < 1e-9
+
+
+def test_graph_matches_backlinks():
+    provider = TestFileSystemProvider(deepcopy(sample.INDEX_WITH_LINKS))
+    index_builder = IndexBuilder(provider, NoteBuilder(provider, local_tz))
+    master = GlobalIndices(index_builder, directory={"home": {"path": "/"}})
+    master.load_all()
+
+    graph = master.graph
+    for id_, sources in master.backlinks().items():
+        if id_ not in graph.index_of:
+            continue
+        expected = sorted(set(s for s in sources if s != id_))
+        assert expected == sorted(graph.ids[i] for i in graph.predecessors(graph.index_of[id_]))
+
+
+def _export(notes, format_):
+    handle = io.StringIO()
+    counts = export_graph(lambda: iter(notes), lambda n: "home", GRAPH_FORMATS[format_](handle))
+    return counts, handle.getvalue()
+
+
+def _graph_edges(graph):
+    return sorted((graph.ids[s], graph.ids[t]) for s in range(graph.node_count) for t in graph.successors(s))
+
+
+@pytest.fixture
+def export_notes():
+    return [_note("a", "b", "b"), _note("b", "c", "x", "b"), _note("c", "a"), _note("d", "a"),
+            NoteInfo("/e.md", None, "e", 'Title with <"markup"> & stuff', None, links_to=["d"])]
+
+
+def test_export_jsonl(export_notes):
+    (nodes, edges), text = _export(export_notes, "jsonl")
+    records = [json.loads(line) for line in text.splitlines()]
+
+    assert ["a", "b", "c", "d", "e"] == [r["id"] for r in records if r["type"] == "node"]
+    exported = sorted((r["source"], r["target"]) for r in records if r["type"] == "edge")
+    assert _graph_edges(LinkGraph.build(export_notes)) == exported
+    assert (5, len(exported)) == (nodes, edges)
+
+
+@pytest.mark.parametrize("format_", ["graphml", "gexf"])
+def test_export_xml(export_notes, format_):
+    (nodes, edges), text = _export(export_notes, format_)
+    root = ElementTree.fromstring(text)
+
+    elements = {e.tag.split("}")[1]: [] for e in root.iter()}
+    for e in root.iter():
+        elements[e.tag.split("}")[1]].append(e)
+    assert ["a", "b", "c", "d", "e"] == [n.get("id") for n in elements["node"]]
+    assert _graph_edges(LinkGraph.build(export_notes)) == sorted((e.get("source"), e.get("target"))
+                                                                 for e in elements["edge"])
+    titles = [x.text for x in elements.get("data", [])] + [n.get("label") for n in elements["node"]]
+    assert 'Title with <"markup"> & stuff' in titles
+
+
+@pytest.mark.parametrize("format_", ["graphml", "gexf", "jsonl"])
+def test_export_numeric_title(format_):
+    notes = [NoteInfo("/a.md", None, "a", 2021, None, links_to=None)]
+    _, text = _export(notes, format_)
+
+    assert "2021" in text
+
+
+def test_graph_writer_requires_overrides():
+    class NodesOnly(GraphWriter):
+        def node(self, id_, attributes):
+            pass
+
+    with pytest.raises(TypeError):
+        NodesOnly(io.StringIO())
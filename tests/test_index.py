@@ -1,3 +1,4 @@
+import json
 import pytest
 from copy import deepcopy
 from dateutil import tz
@@ -5,7 +6,7 @@ import tests.tools.sample_data as sample
 from tests.tools.file_system_mocks import TestFileSystemProvider
 
 from mnotes.notes.markdown_notes import NoteBuilder, MetaData
-from mnotes.notes.index import IndexBuilder, NoteIndex, GlobalIndices
+from mnotes.notes.index import IndexBuilder, NoteIndex, GlobalIndices, INDEX_CACHE_VERSION
 
 local_tz = tz.gettz("Africa/Harare")
 
@@ -61,6 +62,29 @@ def test_index_serialize_round_trip(five_normal_notes):
     assert index.notes == loaded.notes
 
 
+def test_index_serialize_round_trip_keeps_stats(five_normal_notes):
+    provider, index_builder = five_normal_notes
+
+    index = index_builder.create("test", "/")
+    loaded = NoteIndex.deserialize(index.serialize())
+
+    assert all(n.stats is not None for n in loaded.notes.values())
+    assert [n.stats for n in index.notes.values()] == [n.stats for n in loaded.notes.values()]
+    assert [n.headings for n in index.notes.values()] == [n.headings for n in loaded.notes.values()]
+
+
+def test_index_outdated_cache_is_rebuilt(five_normal_notes):
+    provider, index_builder = five_normal_notes
+
+    index = index_builder.create("test", "/")
+    serialized = index.serialize().replace(f'"version": {INDEX_CACHE_VERSION}', '"version": 0')
+    loaded = NoteIndex.deserialize(serialized)
+
+    assert not loaded.notes
+    index_builder.update(loaded)
+    assert index.notes == loaded.notes
+
+
 def test_index_detect_files_removed(five_normal_notes):
     provider, index_builder = five_normal_notes
     index = index_builder.create("test", "/")
@@ -140,6 +164,84 @@ def test_index_detect_all_changes(five_normal_notes):
     assert sorted(f"/home/note-{i:02d}.md" for i in range(1, 6)) == sorted(f.full_path for f in index.files.values())
 
 
+def _set_tags(provider, path: str, tags: str):
+    text: str = provider.internal[path]["content"]
+    lines = [line for line in text.split("\n") if not line.startswith("tags:")]
+    lines.insert(1, f"tags: {tags}")
+    provider.internal[path]["content"] = "\n".join(lines)
+    provider.internal[path]["modified"] += 1
+
+
+def test_index_tags_updated_incrementally(five_normal_notes):
+    provider, index_builder = five_normal_notes
+    _set_tags(provider, "/home/note-00.md", "[alpha, beta]")
+    _set_tags(provider, "/home/note-01.md", "alpha")
+    index = index_builder.create("test", "/")
+
+    assert {"alpha": {"/home/note-00.md", "/home/note-01.md"}, "beta": {"/home/note-00.md"}} == index.tags
+
+    _set_tags(provider, "/home/note-01.md", "gamma")
+    del provider.internal["/home/note-00.md"]
+    index_builder.update(index)
+
+    assert {"gamma": {"/home/note-01.md"}} == index.tags
+    assert ["gamma"] == index.notes["/home/note-01.md"].tags
+
+
+def test_index_serialize_round_trip_keeps_tags(five_normal_notes):
+    provider, index_builder = five_normal_notes
+    _set_tags(provider, "/home/note-02.md", "[alpha, '#beta']")
+    index = index_builder.create("test", "/")
+
+    loaded = NoteIndex.deserialize(index.serialize())
+    assert {"alpha": {"/home/note-02.md"}, "beta": {"/home/note-02.md"}} == loaded.tags
+    assert index.notes == loaded.notes
+
+    # A cache without the tag index has it rebuilt from the notes
+    data = json.loads(index.serialize())
+    del data["tags"]
+    assert loaded.tags == NoteIndex.deserialize(json.dumps(data)).tags
+
+
+def test_index_creation_times(five_normal_notes):
+    provider, index_builder = five_normal_notes
+    index = index_builder.create("test", "/")
+    expected = sorted((int(n.created.timestamp()), n.file_path) for n in index.notes.values())
+    assert expected == index.created
+
+    # Changing the creation time of a note moves it, and removing a note drops it
+    text = provider.internal["/home/note-00.md"]["content"]
+    provider.internal["/home/note-00.md"]["content"] = text.replace("created: 2011-01-24", "created: 1990-01-24")
+    provider.internal["/home/note-00.md"]["modified"] += 1
+    del provider.internal["/home/note-01.md"]
+    index_builder.update(index)
+
+    assert "/home/note-00.md" == index.created[0][1]
+    assert "/home/note-01.md" not in [p for _, p in index.created]
+    assert index.created == sorted(index.created)
+    assert index.created == NoteIndex.deserialize(index.serialize()).created
+
+    data = json.loads(index.serialize())
+    del data["created"]
+    assert index.created == NoteIndex.deserialize(json.dumps(data)).created
+
+
+def test_global_created_between(dual_folders):
+    provider, index_builder = dual_folders
+    master = GlobalIndices(index_builder, directory={"home": {"path": "/home"}, "alpha": {"path": "/alpha"}})
+    master.load_all()
+
+    everything = list(master.created_between())
+    assert [n.created for n in everything] == sorted(n.created for n in master.by_path.values() if n.created)
+
+    since, until = everything[2].created, everything[5].created
+    assert everything[2:5] == list(master.created_between(since, until))
+    assert everything[:2] == list(master.created_between(until=since))
+
+    seconds = list(master.created_seconds())
+    assert sorted(seconds) == sorted({int(n.created.timestamp()) for n in everything})
+
+
 def test_global_build_index(dual_folders):
     provider, index_builder = dual_folders
 
@@ -158,6 +260,59 @@ def test_global_build_index(dual_folders):
     assert master.indices["alpha"].notes["/alpha/missing-created.md"].state == MetaData.NO_ID
 
 
+def test_index_notes_in_path(dual_folders):
+    provider, index_builder = dual_folders
+    index = index_builder.create("root", "/")
+
+    expected = sorted(p for p in provider.internal.keys() if p.startswith("/alpha/"))
+    assert expected == [n.file_path for n in index.notes_in_path("/alpha")]
+    assert [n.file_path for n in index.notes_in_path("/alpha/")] == [n.file_path for n in index.notes_in_path("/alpha")]
+    assert ["/home/note-01.md"] == [n.file_path for n in index.notes_in_path("/home/note-01.md")]
+    assert [] == index.notes_in_path("/alp")
+    assert [] == index.notes_in_path("/home/note-0")
+    assert len(index.notes) == len(index.notes_in_path("/"))
+
+    del provider.internal["/alpha/note-00.md"]
+    index_builder.update(index)
+    assert "/alpha/note-00.md" not in [n.file_path for n in index.notes_in_path("/alpha")]
+
+
+def test_global_index_of_path(dual_folders):
+    provider, index_builder = dual_folders
+    master = GlobalIndices(index_builder, directory={"home": {"path": "/home"}, "alpha": {"path": "/alpha"}})
+    master.load_all()
+
+    assert "alpha" == master.index_of_path("/alpha").name
+    assert "alpha" == master.index_of_path("/alpha/a/b/c/d/note.md").name
+    assert "home" == master.index_of_path("/home/note-00.md").name
+    assert master.index_of_path("/alphabet/note.md") is None
+    assert master.index_of_path("/") is None
+
+    assert ["alpha", "home"] == [i.name for i in master.indices_in_path("/")]
+    assert ["home"] == [i.name for i in master.indices_in_path("/home")]
+    assert [] == master.indices_in_path("/hom")
+
+
+def test_global_tag_index(dual_folders):
+    provider, index_builder = dual_folders
+    _set_tags(provider, "/home/note-00.md", "[alpha, beta]")
+    _set_tags(provider, "/alpha/note-00.md", "alpha")
+    _set_tags(provider, "/alpha/missing-id.md", "alpha")
+
+    master = GlobalIndices(index_builder, directory={"home": {"path": "/home"}, "alpha": {"path": "/alpha"}})
+    master.load_all()
+
+    assert {"alpha": 3, "beta": 1} == master.tag_counts()
+    assert ["20110124063336", "20240102080135"] == sorted(master.tag_ids("#alpha"))
+    assert ["/home/note-00.md"] == [n.file_path for n in master.notes_with_tag("beta")]
+    assert [] == master.notes_with_tag("gamma")
+
+    # Unregistering a note removes only that note from the tags it shares, and drops the tags only it carried
+    master.unregister(master.by_path["/home/note-00.md"])
+    assert {"alpha": 2} == master.tag_counts()
+    assert ["/alpha/missing-id.md", "/alpha/note-00.md"] == sorted(n.file_path for n in master.notes_with_tag("alpha"))
+
+
 def test_global_index_detects_conflicts(conflict_data):
     provider, index_builder = conflict_data
     directory = {
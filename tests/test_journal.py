@@ -0,0 +1,206 @@
+"""
+    Tests of applying a set of file changes in two phases with a journal to roll them back
+"""
+from copy import deepcopy
+
+import os
+
+import pytest
+
+from mnotes.notes.index import IndexBuilder, GlobalIndices
+from mnotes.notes.markdown_notes import NoteBuilder
+from mnotes.utility.file_system import FileSystem
+from mnotes.utility.journal import ApplyError, Journal, apply_changes
+from tests.test_index import local_tz
+from tests.tools.file_system_mocks import TestFileSystemProvider
+import tests.tools.sample_data as sample
+
+
+class FailingProvider(TestFileSystemProvider):
+    """
+    Provider which raises an error from the nth change to the committed files (linking, moving, replacing or removing
+    one), counting from zero
+    """
+
+    def __init__(self, internal, fail_at: int, error: type = OSError):
+        super().__init__(internal)
+        self.fail_at = fail_at
+        self.error = error
+        self.steps = 0
+
+    def _step(self, path: str):
+        self.steps += 1
+        if self.steps - 1 == self.fail_at:
+            raise self.error(f"could not change {path}")
+
+    def link_file(self, source: str, dest: str):
+        self._step(dest)
+        super().link_file(source, dest)
+
+    def move_file(self, source: str, dest: str):
+        self._step(dest)
+        super().move_file(source, dest)
+
+    def replace_file(self, source: str, dest: str):
+        self._step(dest)
+        super().replace_file(source, dest)
+
+    def remove_file(self, path: str):
+        self._step(path)
+        super().remove_file(path)
+
+
+class Crash(BaseException):
+    """ Stands in for the process dying, which nothing in apply_changes catches """
+
+
+def _files(n: int):
+    return {f"/notes/{i}.md": {"content": f"old {i}", "modified": 0} for i in range(n)}
+
+
+def _render(text):
+    return lambda: text
+
+
+def _fail():
+    raise ValueError("could not render")
+
+
+def test_apply_changes_writes_and_moves():
+    provider = TestFileSystemProvider(_files(3))
+    changes = [("/notes/0.md", "/notes/0.md", _render("new 0")), ("/notes/1.md", "/notes/moved.md", _render("new 1"))]
+
+    assert apply_changes(provider, changes, workers=2) == 2
+    assert provider.internal["/notes/0.md"]["content"] == "new 0"
+    assert provider.internal["/notes/moved.md"]["content"] == "new 1"
+    # No temporary or backup files are left behind
+    assert sorted(provider.internal) == ["/notes/0.md", "/notes/2.md", "/notes/moved.md"]
+
+
+def test_apply_changes_swaps_paths():
+    provider = TestFileSystemProvider(_files(2))
+    changes = [("/notes/0.md", "/notes/1.md", _render("was 0")), ("/notes/1.md", "/notes/0.md", _render("was 1"))]
+    apply_changes(provider, changes)
+
+    assert provider.internal["/notes/0.md"]["content"] == "was 1"
+    assert provider.internal["/notes/1.md"]["content"] == "was 0"
+    assert len(provider.internal) == 2
+
+
+def test_apply_changes_swaps_files_on_disk(tmp_path):
+    paths = [str(tmp_path / f"{i}.md") for i in range(2)]
+    for i, path in enumerate(paths):
+        with open(path, "w") as handle:
+            handle.write(f"old {i}")
+
+    apply_changes(FileSystem(), [(paths[0], paths[1], _render("was 0")), (paths[1], paths[0], _render("was 1"))])
+
+    assert sorted(os.listdir(tmp_path)) == ["0.md", "1.md"]
+    for path, expected in zip(paths, ["was 1", "was 0"]):
+        with open(path, "r") as handle:
+            assert handle.read() == expected
+
+
+def test_apply_changes_moved_file_keeps_mode(tmp_path):
+    source, dest = str(tmp_path / "a.md"), str(tmp_path / "b.md")
+    with open(source, "w") as handle:
+        handle.write("old")
+    os.chmod(source, 0o640)
+
+    apply_changes(FileSystem(), [(source, dest, _render("new"))])
+
+    assert os.listdir(tmp_path) == ["b.md"]
+    assert os.stat(dest).st_mode & 0o777 == 0o640
+
+
+def test_apply_changes_staging_failure_changes_nothing():
+    provider = TestFileSystemProvider(_files(4))
+    original = deepcopy(provider.internal)
+    changes = [(f"/notes/{i}.md", f"/notes/{i}.md", _render("new") if i != 2 else _fail) for i in range(4)]
+
+    with pytest.raises(ApplyError) as e:
+        apply_changes(provider, changes, workers=2)
+
+    assert [path for path, _ in e.value.failures] == ["/notes/2.md"]
+    assert provider.internal == original
+
+
+def _renaming_changes():
+    # Four changes make four backups, two moves to new paths, two commits which overwrite a backed up path, and two
+    # removals of the paths which were moved away from
+    return [(f"/notes/{i}.md", f"/notes/{i}-renamed.md" if i % 2 else f"/notes/{i}.md", _render(f"new {i}"))
+            for i in range(4)]
+
+
+@pytest.mark.parametrize("fail_at", range(10))
+def test_apply_changes_commit_failure_rolls_back(fail_at):
+    provider = FailingProvider(_files(5), fail_at)
+    original = deepcopy(provider.internal)
+
+    with pytest.raises(ApplyError) as e:
+        apply_changes(provider, _renaming_changes())
+
+    assert not e.value.rollback_failures
+    assert provider.internal == original
+
+
+@pytest.mark.parametrize("crash_at", range(10))
+def test_apply_changes_interrupted_commit_keeps_every_note(crash_at):
+    provider = FailingProvider(_files(5), crash_at, Crash)
+    changes = _renaming_changes()
+
+    with pytest.raises(Crash):
+        apply_changes(provider, changes)
+
+    # Nothing was rolled back, but every note is whole at its old path or its new one
+    for i, (original, moved, _) in enumerate(changes):
+        at_original = provider.internal.get(original, {}).get("content")
+        at_moved = provider.internal.get(moved, {}).get("content")
+        assert at_original == f"old {i}" or at_moved == f"new {i}"
+    assert provider.internal["/notes/4.md"]["content"] == "old 4"
+
+
+def test_apply_changes_refuses_to_overwrite_other_file():
+    provider = TestFileSystemProvider(_files(3))
+    original = deepcopy(provider.internal)
+    changes = [("/notes/0.md", "/notes/0.md", _render("new 0")), ("/notes/1.md", "/notes/2.md", _render("new 1"))]
+
+    with pytest.raises(ApplyError) as e:
+        apply_changes(provider, changes)
+
+    assert e.value.failures[0][0] == "/notes/2.md"
+    assert provider.internal == original
+
+
+def test_journal_rollback_reports_unrestored_files():
+    provider = TestFileSystemProvider(_files(1))
+    journal = Journal(provider)
+    journal.backup("/notes/0.md")
+    journal.commit(provider.stage_file("/notes/0.md", "new 0"), "/notes/0.md")
+    backup = journal.entries[0].backup
+    del provider.internal[backup]
+
+    failures = journal.rollback()
+
+    assert [path for path, _ in failures] == ["/notes/0.md"]
+    assert provider.internal["/notes/0.md"]["content"] == "new 0"
+    assert not journal.entries
+
+
+def test_apply_transaction_rolls_back_on_failure():
+    provider = FailingProvider(deepcopy(sample.INDEX_WITH_MISSING_ATTRS), fail_at=3)
+    note_builder = NoteBuilder(provider, local_tz)
+    master = GlobalIndices(IndexBuilder(provider, note_builder), directory={"alpha": {"path": "/alpha"}})
+    master.load_all()
+    original = deepcopy(provider.internal)
+
+    t = master.create_empty_transaction()
+    for path in ["/alpha/note-00.md", "/alpha/note-01.md"]:
+        note = t.get_note_state(path)
+        note.info.author = "Replaced Author"
+        t.add_change(path, note)
+
+    with pytest.raises(ApplyError):
+        master.apply_transaction(t)
+
+    assert provider.internal == original
@@ -3,8 +3,9 @@ from copy import deepcopy
 import pytest
 
 import tests.tools.sample_data as sample
-from mnotes.notes.index import IndexBuilder, GlobalIndices
-from mnotes.notes.markdown_notes import NoteBuilder
+from mnotes.notes.index import IndexBuilder, GlobalIndices, NoteIndex
+from mnotes.notes.markdown_notes import NoteBuilder, NoteLink, LinkKind, ID_LINK_PATTERN, _scan_links, NoteInfo, \
+    MetaData
 from tests.test_index import local_tz
 from tests.tools.file_system_mocks import TestFileSystemProvider
 
@@ -41,3 +42,228 @@ def test_generate_backlinks(link_index):
     backlinks = master.backlinks()
 
     assert sorted(backlinks["20160227182247"]) == sorted(["20031127103717", "19910802211642"])
+
+
+def test_backlinks_of_matches_backlinks(link_index):
+    provider, builder = link_index
+    master = GlobalIndices(builder, directory={"home": {"path": "/"}})
+    master.load_all()
+
+    assert ["19910802211642", "20031127103717"] == master.backlinks_of("20160227182247")
+    assert [] == master.backlinks_of("20170609083841")
+    assert [] == master.check_backlinks()
+
+
+def test_reverse_links_updated_incrementally(link_index):
+    provider, builder = link_index
+    index = builder.create("linked", "/")
+    assert {"/links/note-01.md", "/links/note-04.md"} == index.linking_to("20160227182247")
+
+    # Note 04 now links to note 00 instead of note 03, and note 01 is removed
+    text = provider.internal["/links/note-04.md"]["content"]
+    provider.internal["/links/note-04.md"]["content"] = text.replace("20160227182247", "20170609083841")
+    provider.internal["/links/note-04.md"]["modified"] += 1
+    del provider.internal["/links/note-01.md"]
+    builder.update(index)
+
+    assert set() == index.linking_to("20160227182247")
+    assert {"/links/note-04.md"} == index.linking_to("20170609083841")
+    assert all("/links/note-01.md" not in paths for paths in index.linked_from.values())
+
+    rebuilt = NoteIndex.deserialize(index.serialize())
+    assert index.linked_from == rebuilt.linked_from
+    rebuilt.rebuild_links()
+    assert index.linked_from == rebuilt.linked_from
+
+
+def test_broken_links_follow_registry(link_index):
+    provider, builder = link_index
+    master = GlobalIndices(builder, directory={"home": {"path": "/"}})
+    master.load_all()
+    assert [] == master.broken_links()
+
+    # A second note with the ID of note 03 makes both links to it ambiguous, and its own link to an unknown ID is missing
+    duplicate = NoteInfo("/other/duplicate.md", None, "20160227182247", None, None, links_to=["20000101000000"])
+    master.register(duplicate)
+    assert "20160227182247" not in master.by_id
+    broken = [(b.source.file_path, b.target, b.ambiguous) for b in master.broken_links()]
+    assert [("/links/note-01.md", "20160227182247", True),
+            ("/links/note-04.md", "20160227182247", True),
+            ("/other/duplicate.md", "20000101000000", False)] == broken
+
+    master.unregister(duplicate)
+    assert [] == master.broken_links()
+    assert MetaData.OK == master.by_id["20160227182247"].state
+
+    # Removing note 03 entirely leaves the links to it missing
+    master.unregister(master.by_id["20160227182247"])
+    broken = [(b.source.file_path, b.target, b.ambiguous) for b in master.broken_links()]
+    assert [("/links/note-01.md", "20160227182247", False), ("/links/note-04.md", "20160227182247", False)] == broken
+
+
+def test_broken_links_on_load(link_index):
+    provider, builder = link_index
+    del provider.internal["/links/note-02.md"]
+    master = GlobalIndices(builder, directory={"home": {"path": "/"}})
+    master.load_all()
+
+    missing = master.by_id.keys() ^ set(sample.INDEX_WITH_LINKS_LINKS.keys())
+    expected = sorted((n.file_path, t) for n in master.by_path.values() for t in n.links_to or [] if t in missing)
+    assert expected
+    assert expected == [(b.source.file_path, b.target) for b in master.broken_links()]
+
+
+@pytest.fixture
+def mixed_builder():
+    provider = TestFileSystemProvider({"/mixed.md": {"content": sample.MD_SAMPLE_WITH_MIXED_LINKS, "modified": 100}})
+    return NoteBuilder(provider, local_tz)
+
+
+def test_mixed_links_typed(mixed_builder):
+    note = mixed_builder.load_note("/mixed.md")
+
+    expected = [
+        NoteLink(LinkKind.ID, "20210213160641"),
+        NoteLink(LinkKind.ID, "20210213172911"),
+        NoteLink(LinkKind.FILE, "other-note.md"),
+        NoteLink(LinkKind.RESOURCE, "images/diagram.png"),
+        NoteLink(LinkKind.RESOURCE, "resources/paper.pdf"),
+        NoteLink(LinkKind.FILE, "Some Other Note"),
+    ]
+    assert expected == note.info.links
+
+
+def test_mixed_links_to_skips_code(mixed_builder):
+    note = mixed_builder.load_note("/mixed.md")
+    assert sorted(note.info.links_to) == sorted(["20210213160641", "20210213172911"])
+
+
+def test_scan_unterminated_fence_runs_to_end():
+    content = "Before [[20210213160641]]\n```\ncode [[20210213172911]]\n\nmore 20200101010101\n"
+    assert [NoteLink(LinkKind.ID, "20210213160641")] == _scan_links(content)
+
+
+def test_scan_matches_id_link_pattern():
+    content = "text [[20210213160641]] and [[surrounded20210213172911with-some-stuff]] and [[no id]]"
+    ids = [link.target for link in _scan_links(content) if link.kind == LinkKind.ID]
+    assert ID_LINK_PATTERN.findall(content) == ids
+
+
+def test_typed_links_serialize_round_trip(mixed_builder):
+    index = IndexBuilder(mixed_builder.provider, mixed_builder).create("mixed", "/")
+    loaded = NoteIndex.deserialize(index.serialize())
+
+    assert index.notes == loaded.notes
+
+
+def test_scan_fence_at_start_of_content():
+    content = "```\n[[20210213160641]]\n```\nAfter the fence [[20210213172911]]"
+    assert [NoteLink(LinkKind.ID, "20210213172911")] == _scan_links(content)
+
+
+def test_scan_bare_number_which_is_not_a_time_ignored():
+    content = "Call me at 12025550123456 or order 20231231999999, not on 20210230120000 but see 20210213160641"
+    assert ["20210213160641"] == [link.target for link in _scan_links(content)]
+
+
+def test_scan_bare_id_inside_word_ignored():
+    content = "abc20210213160641 120210213160641 20210213172911"
+    assert [NoteLink(LinkKind.ID, "20210213172911")] == _scan_links(content)
+
+
+def test_link_offsets_and_context():
+    content = "# Heading\n\n * See [[20210213160641]] for more. Then [text](20210213172911) é [[20200101010101]].\n"
+    links = _scan_links(content)
+
+    expected = [content.encode("utf-8").index(t) for t in (b"[[2021", b"[text]", b"[[2020")]
+    assert expected == [link.offset for link in links]
+    assert links[0].context == "See [[20210213160641]] for more."
+    assert links[1].context == "Then [text](20210213172911) é [[20200101010101]]."
+
+
+def test_link_context_cut_at_width():
+    content = "start " + "word " * 30 + "[[20210213160641]]" + " word" * 30 + " end"
+    context = _scan_links(content)[0].context
+
+    assert context.startswith("...word word") and context.endswith("word word...")
+    assert "[[20210213160641]]" in context
+    assert "start" not in context and "end" not in context
+
+
+def test_link_context_survives_cache(mixed_builder):
+    index = IndexBuilder(mixed_builder.provider, mixed_builder).create("mixed", "/")
+    loaded = NoteIndex.deserialize(index.serialize())
+
+    original = index.notes["/mixed.md"].links
+    assert [(x.offset, x.context) for x in original] == [(x.offset, x.context) for x in loaded.notes["/mixed.md"].links]
+    assert original[0].context is not None
+
+
+def test_incoming_links(link_index):
+    provider, builder = link_index
+    master = GlobalIndices(builder, directory={"home": {"path": "/"}})
+    master.load_all()
+
+    incoming = master.incoming_links("20160227182247")
+    assert sorted({note.id for note, _ in incoming}) == master.backlinks_of("20160227182247")
+    assert all(link.target == "20160227182247" and "20160227182247" in link.context for _, link in incoming)
+    assert [] == master.incoming_links("20170609083841")
+
+
+@pytest.fixture
+def section_index():
+    provider = TestFileSystemProvider({
+        "/sections/with-sections.md": {"content": sample.MD_SAMPLE_WITH_SECTIONS, "modified": 100},
+        "/sections/target.md": {"content": sample.MD_SAMPLE_SECTION_TARGET, "modified": 100},
+    })
+    builder = IndexBuilder(provider, NoteBuilder(provider, local_tz))
+    master = GlobalIndices(builder, directory={"sections": {"path": "/sections"}})
+    master.load_all()
+    return provider, master
+
+
+def test_heading_offsets(section_index):
+    provider, master = section_index
+    note = master.index_builder.note_builder.load_note("/sections/target.md")
+    body = note.content.encode("utf-8")
+
+    assert [h.text for h in note.info.headings] == ["Section Target", "Section One", "Section Two"]
+    for heading in note.info.headings:
+        assert body[heading.offset:].startswith(b"#" * heading.level + b" " + heading.text.encode("utf-8"))
+
+
+def test_headings_skip_mnote_section(section_index):
+    provider, master = section_index
+    note = master.get_note_info("/sections/with-sections.md")
+
+    assert ["Note With Sections", "Budget Review", "Meeting Notes"] == [h.text for h in note.headings]
+    assert not master.find_headings("Generated Heading")
+
+
+def test_link_anchor_parsed(section_index):
+    provider, master = section_index
+    note = master.get_note_info("/sections/with-sections.md")
+
+    assert NoteLink(LinkKind.ID, "20210213160641", "Section Two") in note.links
+    assert note.links_to == ["20210213160641", "20210213160641"]
+
+
+def test_resolve_link_with_anchor(section_index):
+    provider, master = section_index
+    note, heading = master.resolve_link(NoteLink(LinkKind.ID, "20210213160641", "section-two"))
+
+    assert note.file_path == "/sections/target.md"
+    assert heading.text == "Section Two"
+    assert master.resolve_link(NoteLink(LinkKind.ID, "20210213160641", "Nope")) is None
+    assert master.resolve_link(NoteLink(LinkKind.ID, "20210213160641"))[1] is None
+
+
+def test_find_headings(section_index):
+    provider, master = section_index
+
+    exact = master.find_headings("meeting notes")
+    assert [(n.file_path, h.text) for n, h in exact] == [("/sections/with-sections.md", "Meeting Notes")]
+
+    partial = master.find_headings("section", exact=False)
+    assert sorted(h.text for _, h in partial) == ["Note With Sections", "Section One", "Section Target",
+                                                   "Section Two"]
@@ -7,7 +7,9 @@ import tests.tools.sample_data as sample
 from tests.tools.file_system_mocks import TestFileSystemProvider
 from datetime import datetime as DateTime
 from mnotes.notes.markdown_notes import (NoteBuilder, MetaData, FailedMetadataException, _extract_yaml_front_matter,
-                                         NoteInfo, _strip_mnote_section, _end_with_two_blank_lines)
+                                         NoteInfo, _strip_mnote_section, _end_with_two_blank_lines,
+                                         NoteHeading, _scan_content, _normalize_tags, body_lines,
+                                         mnote_section_fingerprint)
 from dateutil import tz
 
 
@@ -85,6 +87,8 @@ def test_note_to_content_round_trip_works(mock_builder):
     text = note.to_file_text()
     _, meta, loaded_content = _extract_yaml_front_matter(text)
     meta["file_path"] = "/ok.md"
+    meta["headings"] = note.info.headings
+    meta["stats"] = note.info.stats
 
     assert note.info.to_dict() == NoteInfo(**meta).to_dict()
     assert loaded_content == note.content
@@ -101,6 +105,26 @@ def test_note_to_content_preserves_extra_keys(mock_builder):
     assert sorted(meta["tags"]) == sorted(["synergy", "upcycle"])
 
 
+def test_note_to_content_leaves_front_matter(mock_builder):
+    note = mock_builder.load_note("/extra.md")
+    original = dict(note.front_matter)
+    note.info.title = "A New Title"
+    note.info.backlink = True
+
+    assert "A New Title" in note.to_file_text()
+    assert note.front_matter == original
+
+
+def test_note_copy_is_independent(mock_builder):
+    note = mock_builder.load_note("/ok.md")
+    copied = note.copy()
+    copied.info.title = "A New Title"
+
+    assert note.info.title != "A New Title"
+    assert "A New Title" not in note.to_file_text()
+    assert "A New Title" in copied.to_file_text()
+
+
 def test_note_with_links_0(mock_builder):
     note = mock_builder.load_note("/links_0.md")
     assert sorted(note.info.links_to) == sorted(["20210213160641", "20210213172911"])
@@ -206,6 +230,95 @@ def test_updates_mnote_section(mock_builder):
     assert "THIS IS THE REPLACEMENT" in note.to_file_text()
 
 
+def test_mnote_section_fingerprint_missing(mock_builder):
+    assert mock_builder.load_info("/ok.md").mnote_section is None
+
+
+def test_mnote_section_fingerprint_matches_written_section(mock_builder):
+    note = mock_builder.load_note("/with_mnote.md")
+    assert note.info.mnote_section is not None
+    assert note.info.mnote_section != mnote_section_fingerprint("\n * [[12345]] A Note\n")
+
+    note.set_mnote_section("\n * [[12345]] A Note\n")
+    mock_builder.provider.internal["/with_mnote.md"]["content"] = note.to_file_text()
+    info = mock_builder.load_info("/with_mnote.md")
+    assert info.mnote_section == mnote_section_fingerprint("\n * [[12345]] A Note\n")
+
+
+def test_note_stats_computed(mock_builder):
+    info = mock_builder.load_info("/links_0.md")
+
+    assert info.stats.words == 32
+    assert info.stats.bytes == 206
+    assert info.stats.headings == 1
+    assert info.stats.id_links == 2
+    assert info.stats.file_links == 0
+    assert info.stats.resource_links == 0
+
+
+def test_note_stats_ignore_mnote_section(mock_builder):
+    info = mock_builder.load_info("/with_mnote.md")
+
+    assert info.stats.words == 17
+    assert info.stats.id_links == 0
+    assert ["Note Sample that has M-Note Magic Section"] == [h.text for h in info.headings]
+
+
+def test_note_heading_outline():
+    content = "# Title\n\nText\n\n## Section One ##\n```\n# Not a heading\n```\n### Deeper [[20210213160641]]\n#NotOne"
+    _, headings = _scan_content(content)
+
+    assert [NoteHeading(1, "Title", 0), NoteHeading(2, "Section One", 15),
+            NoteHeading(3, "Deeper [[20210213160641]]", 57)] == headings
+
+
+def test_parse_date_time_cache_matches_uncached_across_dst(mock_builder):
+    # Instants on both sides of the 2021 spring forward and fall back transitions in America/New_York, including the
+    # repeated hour in November where only the fold distinguishes the two local times
+    values = ["2021-03-14T01:59:59-05:00", "2021-03-14T07:00:00+00:00", "2021-03-14T03:00:00-04:00",
+              "2021-11-07T01:30:00-04:00", "2021-11-07T01:30:00-05:00", "2021-11-07T05:30:00+00:00",
+              "2021-11-07T06:30:00+00:00", "2021-11-07 02:00:00-05:00", "2021-07-01T12:00:00"]
+
+    for _ in range(2):
+        for value in values:
+            cached = mock_builder.parse_date_time(value)
+            uncached = mock_builder._parse_date_time_uncached(value)
+            assert cached == uncached
+            assert cached.isoformat() == uncached.isoformat()
+            assert cached.utcoffset() == uncached.utcoffset()
+            assert cached.tzname() == uncached.tzname()
+            assert cached.fold == uncached.fold
+            assert cached.tzinfo is uncached.tzinfo
+
+    info = mock_builder._parse_iso_cached.cache_info()
+    assert info.hits == len(values)
+    assert info.misses == len(values)
+
+
+def test_parse_date_time_passes_through_datetimes(mock_builder):
+    value = DateTime(2021, 11, 7, 1, 30, tzinfo=tz.gettz("America/Denver"))
+    assert mock_builder.parse_date_time(value) is value
+    assert mock_builder.parse_date_time(None) is None
+    with pytest.raises(ValueError):
+        mock_builder.parse_date_time(12)
+
+
+def test_normalize_tags():
+    assert _normalize_tags(None) is None
+    assert _normalize_tags([]) is None
+    assert ["a", "b"] == _normalize_tags(["a", "#b", "a", " ", None])
+    assert ["a", "b", "c"] == _normalize_tags("a, b #c")
+    assert ["2021"] == _normalize_tags(2021)
+
+
+def test_body_lines_skip_front_matter_and_mnote_section():
+    lines = body_lines(sample.MD_SAMPLE_MNOTE_SECTION)
+    assert [(8, "# Note Sample that has M-Note Magic Section"), (9, ""),
+            (10, "This is some text in the sample note 1")] == lines
+    assert [(1, "no front"), (2, "matter")] == body_lines("no front\nmatter")
+    assert [(1, "---"), (2, "never closed")] == body_lines("---\nnever closed")
+
+
 def test_end_with_two_blank_lines_0():
     text = "this is some text"
     assert text + "\n\n" == _end_with_two_blank_lines(text)
@@ -0,0 +1,91 @@
+"""
+    Tests of the bounded cache of parsed notes
+"""
+from copy import deepcopy
+
+import tests.tools.sample_data as sample
+from mnotes.notes.index import IndexBuilder, GlobalIndices
+from mnotes.notes.markdown_notes import Note, NoteInfo, NoteBuilder
+from mnotes.notes.note_cache import NoteCache
+from tests.test_index import local_tz
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+class _Loader:
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, path: str) -> Note:
+        self.loaded.append(path)
+        return Note(info=NoteInfo(path, None, None, path, None), front_matter={}, content=path)
+
+
+def test_cache_hits_and_misses():
+    cache = NoteCache(1000)
+    load = _Loader()
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/b.md", "sum-b", 100, load)
+
+    assert load.loaded == ["/a.md", "/b.md"]
+    assert (cache.hits, cache.misses, cache.size) == (1, 2, 200)
+    assert cache.stats() == {"hits": 1, "misses": 2, "notes": 2, "bytes": 200}
+
+    cache.invalidate("/a.md")
+    assert cache.stats() == {"hits": 1, "misses": 2, "notes": 1, "bytes": 100}
+
+
+def test_cache_reloads_changed_checksum():
+    cache = NoteCache(1000)
+    load = _Loader()
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/a.md", "sum-changed", 150, load)
+    cache.get("/a.md", None, 150, load)
+
+    assert load.loaded == ["/a.md"] * 3
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_cache_evicts_least_recently_used():
+    cache = NoteCache(250)
+    load = _Loader()
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/b.md", "sum-b", 100, load)
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/c.md", "sum-c", 100, load)
+    cache.get("/big.md", "sum-big", 300, load)
+
+    assert cache.size == 200
+    cache.get("/a.md", "sum-a", 100, load)
+    cache.get("/b.md", "sum-b", 100, load)
+    assert load.loaded == ["/a.md", "/b.md", "/c.md", "/big.md", "/b.md"]
+
+
+def test_cache_returns_copies():
+    cache = NoteCache(1000)
+    note = cache.get("/a.md", "sum-a", 100, _Loader())
+    note.info.title = "Changed"
+
+    assert cache.get("/a.md", "sum-a", 100, _Loader()).info.title == "/a.md"
+
+
+def test_get_note_cached_until_changed():
+    provider = TestFileSystemProvider(deepcopy(sample.INDEX_WITH_MISSING_ATTRS))
+    builder = IndexBuilder(provider, NoteBuilder(provider, local_tz))
+    master = GlobalIndices(builder, directory={"alpha": {"path": "/alpha"}})
+    master.load_all()
+
+    f0 = "/alpha/note-00.md"
+    assert master.get_note(f0).info.author == "Alice Allison"
+    assert master.get_note(f0).info.author == "Alice Allison"
+    assert (master.note_cache.hits, master.note_cache.misses) == (1, 1)
+
+    t = master.create_empty_transaction()
+    note = t.get_note_state(f0)
+    note.info.author = "Replaced Author"
+    t.add_change(f0, note)
+    master.apply_transaction(t)
+    master.load_all()
+
+    assert master.get_note(f0).info.author == "Replaced Author"
+    assert (master.note_cache.hits, master.note_cache.misses) == (2, 2)
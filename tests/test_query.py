@@ -0,0 +1,104 @@
+from copy import deepcopy
+
+import pytest
+
+import tests.tools.sample_data as sample
+from mnotes.notes.index import IndexBuilder, GlobalIndices
+from datetime import datetime as DateTime
+
+from mnotes.notes.markdown_notes import NoteBuilder, MetaData, NoteInfo
+from mnotes.notes.query import CompiledQuery, QueryError
+from tests.test_index import local_tz, _set_tags
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+@pytest.fixture
+def master():
+    data = deepcopy(sample.INDEX_FIVE_NORMAL_NOTES)
+    data.update(deepcopy(sample.INDEX_WITH_MISSING_ATTRS))
+    provider = TestFileSystemProvider(data)
+    _set_tags(provider, "/home/note-00.md", "[project]")
+    _set_tags(provider, "/alpha/note-02.md", "[project, review]")
+    master = GlobalIndices(IndexBuilder(provider, NoteBuilder(provider, local_tz)),
+                           directory={"home": {"path": "/home"}, "alpha": {"path": "/alpha"}})
+    master.load_all()
+    return master
+
+
+def _run(master, text):
+    notes, plan = CompiledQuery(text, master, local_tz).run()
+    scanned = [n.file_path for n in master.by_path.values() if CompiledQuery(text, master, local_tz).matches(n)]
+    assert sorted(scanned) == [n.file_path for n in notes]
+    return [n.file_path for n in notes], plan
+
+
+def test_query_text_fields(master):
+    paths, plan = _run(master, "author:EVA")
+    assert paths == sorted(n.file_path for n in master.by_path.values() if n.author and "Eva" in n.author)
+    assert plan.access is None
+
+    paths, _ = _run(master, "index:alpha title:none")
+    assert ["/alpha/missing-title.md"] == paths
+
+
+def test_query_uses_most_selective_index(master):
+    paths, plan = _run(master, "index:alpha tag:project")
+    assert ["/alpha/note-02.md"] == paths
+    assert plan.access.description.startswith("tag index")
+    assert 2 == plan.candidates
+
+    paths, plan = _run(master, "path:/home created>=2005-01-01")
+    assert all(p.startswith("/home/") for p in paths) and paths
+    assert 2 == len(plan.considered)
+
+
+def test_query_boolean_operators(master):
+    paths, plan = _run(master, "tag:review or path:/home")
+    assert ["/alpha/note-02.md"] + sorted(p for p in master.by_path if p.startswith("/home/")) == paths
+    assert plan.access is not None
+
+    paths, plan = _run(master, "state:ok and not (author:eva or author:bob)")
+    assert all(master.by_path[p].state == MetaData.OK for p in paths)
+    assert plan.access.description.startswith("id registry")
+
+    # An 'or' with a branch that can't use an index has to scan
+    _, plan = _run(master, "tag:review or author:bob")
+    assert plan.access is None
+
+
+def test_query_created_ranges(master):
+    note = master.get_note_info("/home/note-03.md")
+    day = note.created.astimezone(local_tz).strftime("%Y-%m-%d")
+
+    assert "/home/note-03.md" in _run(master, f"created:{day}")[0]
+    before = set(_run(master, f"created<{day}")[0])
+    after = set(_run(master, f"created>{day}")[0])
+    assert "/home/note-03.md" not in before | after
+    assert before | after | set(_run(master, f"created:{day}")[0]) == set(_run(master, "not created:none")[0])
+
+
+def test_query_created_naive_time(master):
+    # A creation time without a zone is read as local time instead of failing to compare with the range
+    note = NoteInfo("/home/naive.md", DateTime(2010, 5, 5, 12, 0, 0), None, None, None)
+    master.indices["home"].add_note(note)
+    master.register(note)
+
+    assert "/home/naive.md" in _run(master, "created:2010-05-05")[0]
+    assert "/home/naive.md" not in _run(master, "created>=2010-05-06")[0]
+
+
+def test_query_text_fields_of_other_types(master):
+    # Front matter can give a title as a number or an author as a list, which match as text instead of failing
+    note = NoteInfo("/home/numbers.md", None, None, 2021, ["Eva Evanston", "Bob"])
+    master.indices["home"].add_note(note)
+    master.register(note)
+
+    assert ["/home/numbers.md"] == _run(master, "title:2021")[0]
+    assert "/home/numbers.md" in _run(master, "author:bob")[0]
+
+
+@pytest.mark.parametrize("text", ["", "author", "bogus:1", "state:sleepy", "state:failed", "created>=yesterday",
+                                  "(tag:a", "tag:a or", "title>b", "index:nope", "backlink:maybe"])
+def test_query_errors(master, text):
+    with pytest.raises(QueryError):
+        CompiledQuery(text, master, local_tz)
@@ -0,0 +1,178 @@
+from copy import deepcopy
+
+import pytest
+
+import tests.tools.sample_data as sample
+from mnotes.notes.index import IndexBuilder, ContentIndex
+from mnotes.notes.markdown_notes import NoteBuilder
+from mnotes.notes.search import SearchIndex, SearchQuery, TrigramIndex, search_indices, tokenize, regex_trigrams
+from tests.test_index import local_tz
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+@pytest.fixture
+def five_normal_notes():
+    provider = TestFileSystemProvider(deepcopy(sample.INDEX_FIVE_NORMAL_NOTES))
+    note_builder = NoteBuilder(provider, local_tz)
+    index_builder = IndexBuilder(provider, note_builder)
+    return provider, index_builder
+
+
+@pytest.fixture
+def small_index():
+    search = SearchIndex()
+    search.add("/a.md", "a", "The quick brown fox jumps over the lazy dog. Quick thinking!")
+    search.add("/b.md", "b", "A brown dog and a quick fox.")
+    search.add("/c.md", "c", "Nothing to see here, move along")
+    return search
+
+
+@pytest.fixture
+def small_trigrams():
+    trigrams = TrigramIndex()
+    trigrams.add("/a.md", "a", "Replaced bearing PN-41234-A last week")
+    trigrams.add("/b.md", "b", "Ordered PN-51234-B and some Foobar")
+    trigrams.add("/c.md", "c", "def foo(bar): return bar")
+    return trigrams
+
+
+def _paths(results):
+    return [r.path for r in results]
+
+
+def test_tokenize_and_parse_query():
+    assert ["part", "no", "4140", "a_b"] == tokenize("Part No. 4140 a_b")
+    query = SearchQuery.parse('Quick "brown  FOX" ball-bearing "unterminated phrase')
+    assert [["quick"], ["brown", "fox"], ["ball", "bearing"], ["unterminated", "phrase"]] == query.phrases
+
+
+def test_search_requires_all_terms(small_index):
+    assert ["/a.md", "/b.md"] == sorted(_paths(small_index.search("quick fox")))
+    assert [] == small_index.search("quick nothing")
+    assert ["/a.md", "/b.md", "/c.md"] == sorted(_paths(small_index.search("quick nothing", match_all=False)))
+
+
+def test_search_phrase(small_index):
+    assert ["/a.md"] == _paths(small_index.search('"brown fox"'))
+    assert ["/b.md"] == _paths(small_index.search('"quick fox"'))
+    assert ["/a.md"] == _paths(small_index.search('"lazy dog quick"'))
+
+
+def test_search_ranks_by_term_frequency(small_index):
+    results = small_index.search("quick")
+    assert ["/a.md", "/b.md"] == _paths(results)
+    assert results[0].score > results[1].score
+
+
+def test_search_index_remove_and_replace(small_index):
+    small_index.add("/a.md", "a2", "Completely different text")
+    small_index.remove("/c.md")
+
+    assert ["/b.md"] == _paths(small_index.search("quick"))
+    assert ["/a.md"] == _paths(small_index.search("different"))
+    assert [] == small_index.search("nothing")
+    assert 2 == small_index.doc_count
+
+
+def test_search_index_serialize_round_trip(small_index):
+    loaded = SearchIndex.deserialize(small_index.serialize())
+    assert small_index.checksums == loaded.checksums
+    assert small_index.search("quick fox") == loaded.search("quick fox")
+    assert small_index.search('"brown fox"') == loaded.search('"brown fox"')
+
+    # Removing more notes than remain compacts the document numbers when serialized
+    loaded.remove("/a.md")
+    loaded.remove("/c.md")
+    compacted = SearchIndex.deserialize(loaded.serialize())
+    assert ["/b.md"] == compacted.paths
+    assert ["/b.md"] == _paths(compacted.search("quick fox"))
+
+
+def test_search_across_indices(small_index):
+    other = SearchIndex()
+    other.add("/d.md", "d", "Quick quick quick")
+    assert ["/d.md", "/a.md", "/b.md"] == _paths(search_indices([small_index, other], "quick"))
+    assert ["/d.md"] == _paths(search_indices([small_index, other], "quick", limit=1))
+
+
+def test_attached_search_index_follows_update(five_normal_notes):
+    provider, index_builder = five_normal_notes
+    index = index_builder.create("test", "/")
+    search = SearchIndex()
+    index.content["search"] = search
+
+    assert 5 == index_builder.sync_content(index, search)
+    assert ["/home/note-00.md"] == _paths(search.search('"sed mauris auctor"'))
+
+    text: str = provider.internal["/home/note-01.md"]["content"]
+    provider.internal["/home/note-01.md"]["content"] = text.replace("Consectetur", "Zyzzyva")
+    del provider.internal["/home/note-00.md"]
+    index_builder.update(index)
+
+    assert ["/home/note-01.md"] == _paths(search.search("zyzzyva"))
+    assert [] == search.search('"sed mauris auctor"')
+    assert 0 == index_builder.sync_content(index, search)
+
+
+def test_sync_content_catches_up_detached_index(five_normal_notes):
+    provider, index_builder = five_normal_notes
+    index = index_builder.create("test", "/")
+    search = SearchIndex()
+    index_builder.sync_content(index, search)
+    search = SearchIndex.deserialize(search.serialize())
+
+    # The index is updated while the search index isn't attached, so only the changed note needs to be re-read
+    text: str = provider.internal["/home/note-02.md"]["content"]
+    provider.internal["/home/note-02.md"]["content"] = text.replace("Mauris cursus", "Mauris zyzzyva")
+    index_builder.update(index)
+
+    assert 1 == index_builder.sync_content(index, search)
+    assert ["/home/note-02.md"] == _paths(search.search('"mauris zyzzyva"'))
+
+
+def test_regex_trigrams():
+    assert "abc" == regex_trigrams("abc")
+    assert regex_trigrams("ab") is None
+    assert regex_trigrams(r"\d+\s*") is None
+    assert ("and", ["n-4", "pn-"]) == regex_trigrams(r"PN-4\d{4}-[AB]")
+    assert ("and", ["xxx", "xxy", "xyz"]) == regex_trigrams("x{3}yz")
+    assert ("and", ["abc", ("or", ["def", "xyz"])]) == regex_trigrams("abc.*(def|xyz)")
+    assert regex_trigrams("abc|de") is None
+    assert regex_trigrams("(?:abc)?") is None
+    assert ("and", ["ass", "ras", "sse", "str", "tra"]) == regex_trigrams("STRAßE")
+
+
+def test_trigram_candidates(small_trigrams):
+    assert ["/a.md"] == small_trigrams.candidate_paths(r"PN-4\d{4}")
+    assert ["/a.md", "/b.md"] == small_trigrams.candidate_paths("pn-", 0)
+    assert ["/b.md", "/c.md"] == small_trigrams.candidate_paths("foo(bar|xyz)")
+    assert [] == small_trigrams.candidate_paths("not present")
+    assert ["/a.md", "/b.md", "/c.md"] == small_trigrams.candidate_paths(r"\w+")
+
+
+def test_trigram_index_serialize_round_trip(small_trigrams):
+    loaded = TrigramIndex.deserialize(small_trigrams.serialize())
+    assert small_trigrams.checksums == loaded.checksums
+    assert ["/a.md", "/b.md"] == loaded.candidate_paths("pn-")
+
+    loaded.add("/d.md", "d", "PN-49999-C")
+    loaded.remove("/a.md")
+    assert ["/d.md"] == loaded.candidate_paths("PN-4")
+
+    # Adding to trigrams which were already saved, and compacting after removing more notes than remain
+    loaded = TrigramIndex.deserialize(loaded.serialize())
+    assert ["/b.md", "/d.md"] == loaded.candidate_paths("pn-")
+    loaded.remove("/b.md")
+    loaded.remove("/c.md")
+    compacted = TrigramIndex.deserialize(loaded.serialize())
+    assert ["/d.md"] == compacted.paths
+    assert ["/d.md"] == compacted.candidate_paths("pn-")
+
+
+def test_content_index_requires_overrides():
+    class Incomplete(ContentIndex):
+        def _add(self, path: str, body: str):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,67 @@
+from copy import deepcopy
+
+import tests.tools.sample_data as sample
+from mnotes.notes.index import IndexBuilder, GlobalIndices
+from mnotes.notes.markdown_notes import NoteBuilder, NoteInfo
+from mnotes.notes.titles import TitleIndex, title_grams
+from tests.test_index import local_tz
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+def test_title_grams_padded():
+    assert {" q3", "q3 "} == title_grams("Q3")
+    assert title_grams("Budget, meeting") == title_grams("meeting budget")
+
+
+def test_title_index_ranks_matches():
+    index = TitleIndex()
+    index.add("/a.md", "Q3 Budget Meeting")
+    index.add("/b.md", "Budget Planning for Q4")
+    index.add("/c.md", "Meeting Notes")
+    index.add("/d.md", "Unrelated Topic")
+
+    matches = index.find("meeting budget q3")
+    assert ["/a.md", "/c.md", "/b.md"] == [m.path for m in matches]
+    assert matches[0].score > matches[1].score
+    assert "/a.md" == index.find("budjet meting")[0].path
+    assert [] == index.find("zzzz")
+
+
+def test_title_index_add_and_remove():
+    index = TitleIndex()
+    index.add("/a.md", "Old Title")
+    index.add("/a.md", "New Heading")
+    assert [] == index.find("old title")
+    assert ["/a.md"] == [m.path for m in index.find("new heading")]
+
+    index.remove("/a.md")
+    assert {} == index.postings
+    assert [] == index.find("new heading")
+
+
+def test_global_titles_follow_registry():
+    provider = TestFileSystemProvider(deepcopy(sample.INDEX_FIVE_NORMAL_NOTES))
+    master = GlobalIndices(IndexBuilder(provider, NoteBuilder(provider, local_tz)), directory={"home": {"path": "/"}})
+    master.load_all()
+
+    note = master.get_note_info("/home/note-03.md")
+    assert note.file_path == master.titles.find(note.title, 1)[0].path
+
+    renamed = NoteInfo(note.file_path, note.created, note.id, "Quarterly Budget Review", note.author)
+    master.unregister(note)
+    master.register(renamed)
+    assert note.file_path == master.titles.find("budget review", 1)[0].path
+    assert all(m.path != note.file_path for m in master.titles.find(note.title))
+
+
+def test_global_titles_index_numeric_title():
+    provider = TestFileSystemProvider(deepcopy(sample.INDEX_FIVE_NORMAL_NOTES))
+    text = provider.internal["/home/note-03.md"]["content"]
+    lines = ["title: 2021" if line.startswith("title:") else line for line in text.split("\n")]
+    provider.internal["/home/note-03.md"]["content"] = "\n".join(lines)
+    master = GlobalIndices(IndexBuilder(provider, NoteBuilder(provider, local_tz)), directory={"home": {"path": "/"}})
+    master.load_all()
+
+    assert master.get_note_info("/home/note-03.md").title == 2021
+    match = master.titles.find("2021", 1)[0]
+    assert (match.path, match.title) == ("/home/note-03.md", "2021")
@@ -0,0 +1,84 @@
+"""
+    Tests of the parallel writer and the atomic file replacement it uses
+"""
+import os
+
+from mnotes.utility.file_system import FileSystem, text_checksum, NEW_FILE_MODE
+from mnotes.utility.writer import ParallelWriter
+from tests.tools.file_system_mocks import TestFileSystemProvider
+
+
+def _render(text):
+    return lambda: text
+
+
+def _fail():
+    raise ValueError("could not render")
+
+
+def test_parallel_writer_writes_and_skips():
+    provider = TestFileSystemProvider({f"/notes/{i}.md": {"content": "old", "modified": 0} for i in range(10)})
+    jobs = [(f"/notes/{i}.md", _render(f"new {i}" if i % 2 else None)) for i in range(10)]
+    result = ParallelWriter(provider, workers=4, batch_size=3).write(jobs)
+
+    assert sorted(result.written) == [f"/notes/{i}.md" for i in range(1, 10, 2)]
+    assert sorted(result.unchanged) == [f"/notes/{i}.md" for i in range(0, 10, 2)]
+    assert not result.failed
+    assert provider.internal["/notes/3.md"]["content"] == "new 3"
+    assert provider.internal["/notes/4.md"]["content"] == "old"
+    # Only the notes themselves are left, the temporary files were all renamed into place
+    assert sorted(provider.internal) == sorted(f"/notes/{i}.md" for i in range(10))
+    assert len(provider.synced) == 5
+
+
+def test_parallel_writer_failure_leaves_note():
+    provider = TestFileSystemProvider({f"/notes/{i}.md": {"content": "old", "modified": 0} for i in range(3)})
+    jobs = [("/notes/0.md", _render("new")), ("/notes/1.md", _fail), ("/notes/2.md", _render("new"))]
+    result = ParallelWriter(provider, batch_size=2).write(jobs)
+
+    assert sorted(result.written) == ["/notes/0.md", "/notes/2.md"]
+    assert [path for path, _ in result.failed] == ["/notes/1.md"]
+    assert provider.internal["/notes/1.md"]["content"] == "old"
+
+
+def test_parallel_writer_reports_progress():
+    provider = TestFileSystemProvider({f"/notes/{i}.md": {"content": "old", "modified": 0} for i in range(7)})
+    reported = []
+    writer = ParallelWriter(provider, batch_size=2, on_progress=lambda done, total: reported.append((done, total)))
+    writer.write([(f"/notes/{i}.md", _render("new")) for i in range(7)])
+
+    assert len(reported) == 4
+    assert reported[-1] == (7, 7)
+    assert [d for d, _ in reported] == sorted(d for d, _ in reported)
+
+
+def test_file_system_replace_keeps_permissions(tmp_path):
+    path = str(tmp_path / "note.md")
+    with open(path, "w") as handle:
+        handle.write("old")
+    os.chmod(path, 0o640)
+
+    result = ParallelWriter(FileSystem()).write([(path, _render("new"))])
+
+    assert result.written == [path]
+    with open(path, "r") as handle:
+        assert handle.read() == "new"
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["note.md"]
+
+
+def test_file_system_staged_file_matches_text_checksum(tmp_path):
+    path = str(tmp_path / "note.md")
+    content = "# Caf\u00e9 \u2014 notes\r\nline\n"
+    provider = FileSystem()
+
+    temp = provider.stage_file(path, content)
+    provider.replace_file(temp, path)
+
+    assert provider.checksum(path) == text_checksum(content)
+
+
+def test_file_system_staged_new_file_has_default_mode(tmp_path):
+    temp = FileSystem().stage_file(str(tmp_path / "new.md"), "content")
+
+    assert os.stat(temp).st_mode & 0o777 == NEW_FILE_MODE
@@ -1,5 +1,6 @@
 import os
 import io
+import uuid
 import hashlib
 from copy import deepcopy
 from datetime import datetime as DateTime
@@ -35,6 +36,7 @@ class TestFileSystemProvider(FileSystemProvider):
 
     def __init__(self, internal: Dict):
         self.internal = internal
+        self.synced: List[str] = []
 
     def get_all(self, path: str, predicate: Optional[Callable[[str], bool]] = None) -> List[FileInfo]:
         def _check(s: str) -> bool:
@@ -65,10 +67,35 @@ class TestFileSystemProvider(FileSystemProvider):
         sha = hashlib.sha1(self.internal[path]["content"].encode())
         return sha.hexdigest()
 
+    def file_info(self, path: str) -> FileInfo:
+        directory, name = os.path.split(path)
+        return FileInfo(directory, name, self.internal[path]["modified"], len(self.internal[path]["content"]))
+
     def file_c_time(self, file_path: str) -> Tuple[DateTime, bool]:
         return DateTime.fromtimestamp(self.internal[file_path]['modified']), False
 
     def move_file(self, source: str, dest: str):
+        if dest in self.internal:
+            raise FileExistsError(f"The file {dest} already exists! Aborting rather than overwrite")
         self.internal[dest] = deepcopy(self.internal[source])
         del self.internal[source]
 
+    def stage_file(self, path: str, content: str, mode_from: Optional[str] = None) -> str:
+        directory, file_name = os.path.split(path)
+        temp_path = os.path.join(directory, f".{file_name}.{uuid.uuid4().hex}.tmp")
+        self.internal[temp_path] = {"content": content, "modified": 0}
+        return temp_path
+
+    def sync_files(self, paths: List[str]):
+        self.synced.extend(paths)
+
+    def replace_file(self, source: str, dest: str):
+        self.internal[dest] = self.internal.pop(source)
+
+    def link_file(self, source: str, dest: str):
+        if dest in self.internal:
+            raise FileExistsError(f"The file {dest} already exists")
+        self.internal[dest] = deepcopy(self.internal[source])
+
+    def remove_file(self, path: str):
+        del self.internal[path]
@@ -96,6 +96,78 @@ And here is a link to another note [[20210213160641]]
 And another link [[surrounded20210213172911with-some-stuff]] to a different note
 """
 
+MD_SAMPLE_WITH_MIXED_LINKS = """
+...
+title: Linked Note With Many Kinds Of Links
+author: Gary Garrison
+created: '2021-02-14T09:12:44.102938-05:00'
+id: 20210214091244
+...
+# Linked Note With Many Kinds Of Links
+
+A wiki link [[20210213160641]], a bare ID 20210213172911 and a markdown link to [a file](other-note.md).
+
+![an image](images/diagram.png) and [a pdf](resources/paper.pdf "The Paper") and [a website](https://example.com/20200101010101)
+
+Inline code does not link `[[20200101010102]]` to anything
+
+```python
+# Neither does a fenced code block
+link = "[[20200101010103]]"
+```
+
+~~~
+Or a tilde fence 20200101010104
+~~~
+
+The end of the note links to [[Some Other Note]]
+"""
+
+MD_SAMPLE_WITH_SECTIONS = """
+---
+title: Note With Sections
+author: Gary Garrison
+created: '2021-02-15T10:00:00.000000-05:00'
+id: '20210215100000'
+---
+# Note With Sections
+
+Links to a section in another note [[20210213160641#Section Two]] and to a missing one [[20210213160641#Nope]]
+
+## Budget Review
+
+Some text about the Q3 budget
+
+## Meeting Notes ##
+
+More text
+
+---
+# M-Note References
+
+## Generated Heading
+"""
+
+MD_SAMPLE_SECTION_TARGET = """
+---
+title: Section Target
+author: Gary Garrison
+created: '2021-02-13T16:06:41.000000-05:00'
+id: '20210213160641'
+---
+# Section Target
+
+## Section One
+
+Ünïcode text before the second section
+
+## Section Two
+
+```
+## Not A Section
+```
+"""
+
 MD_SAMPLE_MNOTE_SECTION = """
 ...
 title: Note Sample With M-Note Section